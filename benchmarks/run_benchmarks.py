@@ -0,0 +1,292 @@
+#!/usr/bin/env python
+"""Time higgstables on a synthetic production, and compare across commits.
+
+    python benchmarks/run_benchmarks.py --events 100000 --processes 8
+    python benchmarks/run_benchmarks.py --compare results/abc1234.json results/def5678.json
+
+Each benchmark runs in a fresh process, such that its peak memory (max RSS)
+is not influenced by the others. The best time of `--repeat` runs is kept.
+The results are written to `benchmarks/results/<commit>.json`.
+"""
+import argparse
+import concurrent.futures
+import json
+import multiprocessing
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+import yaml
+
+results_dir = Path(__file__).parent / "results"
+
+
+def _config_dict(**fields) -> Dict:
+    from higgstables.config.load_config import _load_config_dict
+
+    config_dict = _load_config_dict(None)
+    config_dict["higgstables"].update(fields)
+    return config_dict
+
+
+def _config(**fields):
+    from higgstables.config import Config
+
+    return Config(_config_dict(**fields), no_cs=True)
+
+
+def _new_dir(workdir: Path, name: str) -> Path:
+    out = workdir / name
+    shutil.rmtree(out, ignore_errors=True)
+    out.mkdir()
+    return out
+
+
+def bench_counts(source: Path, workdir: Path) -> None:
+    """`FileToCounts` on a single file."""
+    from higgstables.handle_root_files import FileToCounts
+
+    rootfile = next(source.glob("*/*/simple_event_vector.root"))
+    FileToCounts(rootfile, _config())
+
+
+def bench_tables(source: Path, workdir: Path) -> None:
+    from higgstables.handle_root_files import TablesFromFiles
+
+    TablesFromFiles(source, _new_dir(workdir, "tables"), _config())
+
+
+def bench_df(source: Path, workdir: Path) -> None:
+    from higgstables.handle_root_files import DfFromFiles
+
+    DfFromFiles(source, _new_dir(workdir, "df"), _config())
+
+
+def bench_parquet_tables(source: Path, workdir: Path) -> None:
+    """The count tables from the parquet files of `_prepare_parquet_input`."""
+    from higgstables.handle_root_files import TablesFromFiles
+
+    config = _config()
+    for parquet_file in sorted((workdir / "parquet_input").glob("*.parquet")):
+        TablesFromFiles(parquet_file, _new_dir(workdir, parquet_file.stem), config)
+
+
+def bench_cli(source: Path, workdir: Path) -> None:
+    """The full `higgstables` command, including the interpreter start-up."""
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "higgstables.cli.cli",
+            str(source),
+            "-d",
+            str(_new_dir(workdir, "cli")),
+            "--config",
+            str(workdir / "higgstables-config.yaml"),
+            "--no_cs",
+        ],
+        check=True,
+        capture_output=True,
+    )
+
+
+benchmarks: Dict[str, Callable[[Path, Path], None]] = {
+    "counts": bench_counts,
+    "tables": bench_tables,
+    "df": bench_df,
+    "parquet_tables": bench_parquet_tables,
+    "cli": bench_cli,
+}
+
+
+def _prepare_parquet_input(source: Path, workdir: Path) -> None:
+    """The selected events with all the variables that the selection needs."""
+    from higgstables.config import Config
+    from higgstables.handle_root_files import DfFromFiles
+
+    config_dict = _config_dict(format="parquet")
+    config_dict["higgstables"]["df"] = {
+        "simple_event_vector": None,
+        "z_variables": ["m_z", "m_recoil", "cos_theta_miss"],
+    }
+    DfFromFiles(
+        source, _new_dir(workdir, "parquet_input"), Config(config_dict, no_cs=True)
+    )
+
+
+def _max_rss_bytes(who: int) -> int:
+    max_rss = resource.getrusage(who).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return max_rss if platform.system() == "Darwin" else max_rss * 1024
+
+
+def _peak_memory_bytes() -> int:
+    """The peak RSS of this process (or of its largest child process).
+
+    On Linux, `ru_maxrss` survives `exec`: The spawned process would report
+    the peak of its parent. `VmHWM` does not.
+    """
+    peak = _max_rss_bytes(resource.RUSAGE_SELF)
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    peak = int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return max(peak, _max_rss_bytes(resource.RUSAGE_CHILDREN))
+
+
+def _run_once(name: str, source: Path, workdir: Path) -> Tuple[float, int]:
+    """Executed in a fresh process: The time and the peak memory of the benchmark."""
+    import higgstables  # noqa: F401 Not part of the timing.
+
+    start_time = time.perf_counter()
+    benchmarks[name](source, workdir)
+    elapsed = time.perf_counter() - start_time
+    return elapsed, _peak_memory_bytes()
+
+
+def run_benchmark(name: str, source: Path, workdir: Path, repeat: int) -> Dict:
+    times: List[float] = []
+    peaks: List[int] = []
+    context = multiprocessing.get_context("spawn")
+    for _ in range(repeat):
+        with concurrent.futures.ProcessPoolExecutor(1, mp_context=context) as pool:
+            elapsed, peak = pool.submit(_run_once, name, source, workdir).result()
+        times.append(elapsed)
+        peaks.append(peak)
+    return {
+        "time_s": min(times),
+        "times_s": times,
+        "peak_memory_mb": max(peaks) / 1e6,
+    }
+
+
+def _git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        dirty = subprocess.run(
+            ["git", "status", "--porcelain", "--untracked-files=no"],
+            cwd=Path(__file__).parent,
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+    return f"{commit}-dirty" if dirty else commit
+
+
+def run(args: argparse.Namespace) -> Path:
+    from higgstables.synthetic import write_synthetic_production
+
+    names = args.benchmarks or list(benchmarks)
+    unknown = set(names) - set(benchmarks)
+    if unknown:
+        raise SystemExit(
+            f"Unknown benchmarks {unknown}. Choose from {list(benchmarks)}."
+        )
+    results = {
+        "commit": _git_commit(),
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "events": args.events,
+        "processes": args.processes,
+        "benchmarks": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        workdir = Path(tmp)
+        source = workdir / "data_source"
+        write_synthetic_production(source, args.events, args.processes)
+        with (workdir / "higgstables-config.yaml").open("w") as f:
+            yaml.safe_dump(_config_dict(), f)
+        if "parquet_tables" in names:
+            _prepare_parquet_input(source, workdir)
+        for name in names:
+            result = run_benchmark(name, source, workdir, args.repeat)
+            results["benchmarks"][name] = result
+            print(
+                f"{name:>16}: {result['time_s']:8.3f} s "
+                f"{result['peak_memory_mb']:8.1f} MB peak"
+            )
+
+    output = args.output or results_dir / f"{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with output.open("w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {output}.")
+    return output
+
+
+def compare(baseline_path: Path, contender_path: Path) -> None:
+    """Print the ratios (contender / baseline) of time and peak memory."""
+    with baseline_path.open() as f:
+        baseline = json.load(f)
+    with contender_path.open() as f:
+        contender = json.load(f)
+    for key in ["events", "processes"]:
+        if baseline[key] != contender[key]:
+            print(f"Warning: Different {key} ({baseline[key]} vs {contender[key]}).")
+    print(f"{'':>16}  {baseline['commit']:>12} -> {contender['commit']:<12}")
+    for name, new in contender["benchmarks"].items():
+        old = baseline["benchmarks"].get(name)
+        if old is None:
+            print(f"{name:>16}: only in {contender['commit']}")
+            continue
+        print(
+            f"{name:>16}: time {old['time_s']:8.3f} s -> {new['time_s']:8.3f} s "
+            f"(x{new['time_s'] / old['time_s']:.2f}), "
+            f"memory {old['peak_memory_mb']:7.1f} MB -> "
+            f"{new['peak_memory_mb']:7.1f} MB "
+            f"(x{new['peak_memory_mb'] / old['peak_memory_mb']:.2f})"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "benchmarks", nargs="*", help=f"A subset of {list(benchmarks)}."
+    )
+    parser.add_argument(
+        "--events", type=int, default=100_000, help="Events per synthetic file."
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=4,
+        help="Processes per polarization (each is one file).",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark.")
+    parser.add_argument("--output", type=Path, help="Instead of results/<commit>.json.")
+    parser.add_argument(
+        "--compare",
+        type=Path,
+        nargs=2,
+        metavar=("BASELINE", "CONTENDER"),
+        help="Compare two result files instead of running the benchmarks.",
+    )
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+    else:
+        run(args)
+
+
+if __name__ == "__main__":
+    main()
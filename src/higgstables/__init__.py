@@ -6,21 +6,52 @@ Further information:
 * alldecays: https://github.com/LLR-ILD/alldecays
 * Higgs-BR-classes: https://github.com/LLR-ILD/Higgs-BR-classes
 """
+import importlib
 import logging
+from typing import TYPE_CHECKING, Any, List
 
-from .config import Config
-from .handle_root_files import FileToCounts, TablesFromFiles
-from .ild_specific import CrossSections
 from .version import __version__
 
+if TYPE_CHECKING:
+    from .config import Config
+    from .handle_root_files import (
+        FileToCounts,
+        InMemoryDfs,
+        InMemoryTables,
+        TablesFromFiles,
+    )
+    from .ild_specific import CrossSections
+
 _version_info = f"{__name__} version {__version__} at {__file__[:-len('/__init__.py')]}"
 logger = logging.getLogger(__name__)
 logger.debug(_version_info)
 
+# Imported on first access: `higgstables --help` and `--version` stay fast.
+_lazy_names = {
+    "Config": ".config",
+    "CrossSections": ".ild_specific",
+    "FileToCounts": ".handle_root_files",
+    "InMemoryDfs": ".handle_root_files",
+    "InMemoryTables": ".handle_root_files",
+    "TablesFromFiles": ".handle_root_files",
+}
+
 __all__ = [
     "Config",
     "CrossSections",
     "FileToCounts",
+    "InMemoryDfs",
+    "InMemoryTables",
     "TablesFromFiles",
     "__version__",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_names:
+        return getattr(importlib.import_module(_lazy_names[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_lazy_names))
@@ -1,5 +1,8 @@
 """The higgstables command line interface."""
 from .cli import main as cli
 from .cli import make_selected_event_dfs_instead_of_count_tables as cli_df
+from .cli import merge as cli_merge
+from .serve import query as cli_query
+from .serve import serve as cli_serve
 
-__all__ = ["cli", "cli_df"]
+__all__ = ["cli", "cli_df", "cli_merge", "cli_query", "cli_serve"]
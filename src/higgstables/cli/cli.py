@@ -1,13 +1,18 @@
-"""The higgstables command line interface."""
+"""The higgstables command line interface.
+
+The heavy dependencies (numpy, pandas, uproot, ...) are only imported
+once the arguments are parsed: `--help` and `--version` return at once.
+"""
 import argparse
+import contextlib
 import logging
 import sys
 from pathlib import Path
+from typing import Iterator, Optional, Tuple, Union
 
 import higgstables
 
-from ..config import ConfigFromArgs
-from ..handle_root_files import DfFromFiles, TablesFromFiles
+from ..config.from_args import ConfigFromArgs
 
 
 def prepare_cli_logging(parser):
@@ -33,14 +38,16 @@ def set_cli_logging(args):
     logging.basicConfig(format=FORMAT, level=args.loglevel)
 
     # Additionally log to a logfile at the same level.
-    file_handler = logging.FileHandler(args.data_dir / "higgstables.log")
-    file_handler.setFormatter(fmt=logging.Formatter(fmt=FORMAT))
-    logging.getLogger().addHandler(file_handler)  # Added to the root logger.
+    if getattr(args, "data_dir", None) is not None:
+        file_handler = logging.FileHandler(args.data_dir / "higgstables.log")
+        file_handler.setFormatter(fmt=logging.Formatter(fmt=FORMAT))
+        logging.getLogger().addHandler(file_handler)  # Added to the root logger.
 
     # Do some first logging.
     logger = logging.getLogger(__name__)
     logger.warning(higgstables._version_info)
-    logger.warning(f"Rootfiles taken from {args.data_source.absolute()}.")
+    if getattr(args, "data_source", None) is not None:
+        logger.warning(f"Rootfiles taken from {args.data_source.absolute()}.")
     logger.debug(f"Arguments as interpreted by the parser: {args=}.")
     logger.debug(f"Python executable used: {sys.executable}.")
 
@@ -61,7 +68,46 @@ def data_to_dir(data_dir):
     return data_dir
 
 
-def main(TablesFromFiles=TablesFromFiles):
+def step_size(value: str) -> Union[int, str]:
+    """An integer number of entries, or a memory size like `100 MB`."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+
+def shard(value: str) -> Tuple[int, int]:
+    """`i/N`: The `i`-th (counted from 0) of `N` shards."""
+    try:
+        index, n_shards = map(int, value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not of the form i/N.")
+    if not 0 <= index < n_shards:
+        raise argparse.ArgumentTypeError(f"{value!r} needs 0 <= i < N.")
+    return index, n_shards
+
+
+def memory_size(value: str) -> int:
+    """A memory size like `2 GB`, in bytes."""
+    from ..config.util import parse_memory_size
+
+    return parse_memory_size(value)
+
+
+def main(TablesFromFiles=None):
+    """With the default `TablesFromFiles=None`, the count tables are built."""
+    if TablesFromFiles is None:
+        builds_count_tables = True
+    else:
+        from .. import handle_root_files
+
+        builds_count_tables = issubclass(
+            TablesFromFiles, handle_root_files.TablesFromFiles
+        )
+    _main(builds_count_tables, TablesFromFiles)
+
+
+def _main(builds_count_tables: bool, TablesFromFiles=None):
     parser = argparse.ArgumentParser(
         description=higgstables.__doc__,
         formatter_class=argparse.RawDescriptionHelpFormatter,
@@ -97,16 +143,250 @@ def main(TablesFromFiles=TablesFromFiles):
         action="store_true",
         help="Toggle to not build the cross sections column.",
     )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        help="Number of worker processes for handling the files in parallel.",
+        default=1,
+    )
+    parser.add_argument(
+        "--step_size",
+        type=step_size,
+        help=(
+            "Read the trees in chunks of this many entries (e.g. 100000) "
+            "or of this memory size (e.g. '100 MB'), "
+            "to bound the memory usage. Overrides `step-size` from the config."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--max_memory",
+        type=memory_size,
+        help=(
+            "Evict the least recently used arrays of a file beyond e.g. `2 GB`, "
+            "re-reading them if needed. Overrides `max-memory` from the config."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help=(
+            "Dump the function call statistics (cProfile) of the run into "
+            "`data_dir/higgstables.pstats`. Worker processes are not included."
+        ),
+    )
+    if builds_count_tables:
+        parser.add_argument(
+            "--cache_dir",
+            type=Path,
+            help=(
+                "Cache the counts per file in this folder. "
+                "On a rerun, only new or changed files are processed "
+                "(or all files, if the selection in the config changed)."
+            ),
+            default=None,
+        )
+        parser.add_argument(
+            "--cache_max_size",
+            type=memory_size,
+            help="Evict least recently used cache entries beyond e.g. `1 GB`.",
+            default=None,
+        )
+        parser.add_argument(
+            "--sweep",
+            type=Path,
+            nargs="+",
+            metavar="CONFIG",
+            help=(
+                "Build the tables for each of these config files, "
+                "reading the data only once. Their fields override the ones "
+                "of the base `--config`. The tables of `my_cuts.yaml` "
+                "are written into `data_dir/my_cuts`."
+            ),
+            default=None,
+        )
+        parser.add_argument(
+            "--with_df",
+            action="store_true",
+            help=(
+                "Additionally write the DataFrames of the selected events "
+                "(as `higgstables-df`, with a category column) into `data_dir/df`, "
+                "from the same pass over the files."
+            ),
+        )
+        parser.add_argument(
+            "--shard",
+            type=shard,
+            metavar="i/N",
+            help=(
+                "Process only the i-th (from 0) of N disjoint subsets of the files. "
+                "Instead of the tables, the partial counts are written, "
+                "to be combined by `higgstables-merge`."
+            ),
+            default=None,
+        )
+        parser.add_argument(
+            "--scan",
+            action="store_true",
+            help=(
+                "Instead of the count tables, build one table per threshold "
+                "in the `scan` entry of the config (stacked per table)."
+            ),
+        )
     prepare_cli_logging(parser)
     args = parser.parse_args()
 
+    if builds_count_tables and args.sweep and args.cache_dir is not None:
+        parser.error("--cache_dir can not be combined with --sweep.")
+    if builds_count_tables and args.scan and (args.sweep or args.cache_dir):
+        parser.error("--scan can not be combined with --sweep or --cache_dir.")
+    if builds_count_tables and args.shard and (args.sweep or args.scan):
+        parser.error("--shard can not be combined with --sweep or --scan.")
+    if (
+        builds_count_tables
+        and args.with_df
+        and (args.sweep or args.scan or args.shard or args.cache_dir)
+    ):
+        parser.error(
+            "--with_df can not be combined with --sweep, --scan, --shard "
+            "or --cache_dir."
+        )
+
+    from ..handle_root_files import DfFromFiles
+    from ..handle_root_files import TablesFromFiles as CountTables
+    from ..handle_root_files.profiling import ProfileReport
+
+    if TablesFromFiles is None:
+        TablesFromFiles = CountTables if builds_count_tables else DfFromFiles
     set_cli_logging(args)
-    config = ConfigFromArgs(args).get_config()
-    TablesFromFiles(args.data_source, args.data_dir, config)
+    config_from_args = ConfigFromArgs(args)
+    config = config_from_args.get_config()
+    pstats_path = args.data_dir / "higgstables.pstats" if args.profile else None
+    with ProfileReport() as report, call_statistics(pstats_path):
+        build(
+            parser, args, config_from_args, config, TablesFromFiles, builds_count_tables
+        )
+    report.write(args.data_dir)
+    print(report.summary())
+
+
+@contextlib.contextmanager
+def call_statistics(pstats_path: Optional[Path]) -> Iterator[None]:
+    """Profile the function calls within this block with cProfile."""
+    if pstats_path is None:
+        yield
+        return
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(pstats_path)
+        logging.getLogger(__name__).warning(
+            f"Call statistics written to {pstats_path} "
+            f"(e.g. `python -m pstats {pstats_path}`)."
+        )
+
+
+def build(parser, args, config_from_args, config, TablesFromFiles, builds_count_tables):
+    """Build the tables (or DataFrames) as requested by the arguments."""
+    from ..handle_root_files import (
+        ScanTablesFromFiles,
+        ShardTablesFromFiles,
+        SweepTablesFromFiles,
+        TablesAndDfFromFiles,
+    )
+
+    if builds_count_tables and args.sweep:
+        sweep_configs = config_from_args.get_sweep_configs()
+        SweepTablesFromFiles(
+            args.data_source, args.data_dir, config, sweep_configs, n_jobs=args.jobs
+        )
+        return
+    if builds_count_tables and args.scan:
+        if config.scan is None:
+            parser.error("--scan needs a `scan` entry in the config.")
+        ScanTablesFromFiles(args.data_source, args.data_dir, config, n_jobs=args.jobs)
+        return
+    if builds_count_tables and args.with_df:
+        TablesAndDfFromFiles(args.data_source, args.data_dir, config, n_jobs=args.jobs)
+        return
+    kwargs = {}
+    if builds_count_tables:
+        kwargs = dict(cache_dir=args.cache_dir, cache_max_size=args.cache_max_size)
+    if builds_count_tables and args.shard:
+        ShardTablesFromFiles(
+            args.data_source,
+            args.data_dir,
+            config,
+            args.shard,
+            n_jobs=args.jobs,
+            **kwargs,
+        )
+        return
+    TablesFromFiles(args.data_source, args.data_dir, config, n_jobs=args.jobs, **kwargs)
 
 
 def make_selected_event_dfs_instead_of_count_tables():
-    main(TablesFromFiles=DfFromFiles)
+    _main(builds_count_tables=False)
+
+
+def merge():
+    """Sum the partial outputs of `higgstables --shard i/N` into the tables."""
+    parser = argparse.ArgumentParser(description=merge.__doc__)
+    parser.add_argument(
+        "-v", "--version", action="version", version=higgstables._version_info
+    )
+    parser.add_argument(
+        "partials",
+        type=Path,
+        nargs="+",
+        help="The partial outputs of all shards (files, or the folders with them).",
+    )
+    parser.add_argument(
+        "-d",
+        "--data_dir",
+        type=data_to_dir,
+        help="Folder to store tables into.",
+        default="data",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        help=(
+            "Path to the configuration file of the shards. "
+            "By default, the one copied next to the first partial output."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--no_cs",
+        dest="no_cs",
+        action="store_true",
+        help="Toggle to not build the cross sections column.",
+    )
+    prepare_cli_logging(parser)
+    args = parser.parse_args()
+    set_cli_logging(args)
+
+    import shutil
+
+    from ..config.load_config import _select_yaml_path, load_config
+    from ..handle_root_files import TablesFromShards
+
+    config_path = args.config
+    if config_path is None:
+        first = args.partials[0]
+        config_path = first if first.is_dir() else first.parent
+    config_path = _select_yaml_path(config_path)
+    shutil.copy(config_path, args.data_dir)
+    config = load_config(config_path, args.no_cs)
+    TablesFromShards(args.partials, args.data_dir, config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,244 @@
+"""A local server that keeps the arrays of a data source in memory.
+
+`higgstables-serve data_source` reads the files once and listens on a Unix socket.
+`higgstables-query my_cuts.yaml` sends a config to it and prints the tables.
+The fields of the query's config replace those of the server's config
+(as for `higgstables --sweep`). Only the branches that are new
+to the server are read: The tables are back within a fraction of a second.
+
+The messages are single lines of JSON. The client only needs the standard library.
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+import higgstables
+
+from .cli import memory_size, prepare_cli_logging, set_cli_logging
+
+_default_socket = "higgstables.sock"
+logger = logging.getLogger(__name__)
+
+
+def _send(sock_file: Any, message: Dict[str, Any]) -> None:
+    sock_file.write(json.dumps(message).encode() + b"\n")
+    sock_file.flush()
+
+
+def _receive(sock_file: Any) -> Dict[str, Any]:
+    line = sock_file.readline()
+    if not line:
+        raise ConnectionError("The connection was closed without a message.")
+    return json.loads(line)
+
+
+class _TablesServer(socketserver.UnixStreamServer):
+    """One request at a time: The warm arrays are not shared between threads."""
+
+    def __init__(
+        self, socket_path: Path, warm_tables: Any, base_dict: Dict, no_cs: bool
+    ) -> None:
+        self.warm_tables = warm_tables
+        self.base_dict = base_dict
+        self.no_cs = no_cs
+        # Only for the user that started the server, from the moment it is bound.
+        umask = os.umask(0o177)
+        try:
+            super().__init__(str(socket_path), _RequestHandler)
+        finally:
+            os.umask(umask)
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    server: _TablesServer
+
+    def handle(self) -> None:
+        try:
+            request = _receive(self.rfile)
+            response = self._respond(request)
+        except Exception as e:
+            logger.exception("The request failed.")
+            response = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        _send(self.wfile, response)
+
+    def _respond(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        if request.get("command") == "stop":
+            # `shutdown` waits for `serve_forever`, which waits for this handler.
+            threading.Thread(target=self.server.shutdown).start()
+            return {"ok": True}
+        import yaml
+
+        from ..config.load_config import Config, merge_config_dicts
+
+        start_time = time.perf_counter()
+        overrides = yaml.safe_load(request.get("config") or "") or {}
+        config_dict = merge_config_dicts(self.server.base_dict, overrides)
+        config = Config(config_dict, self.server.no_cs)
+        tables = self.server.warm_tables.tables(config)
+        selected = request.get("tables") or list(tables)
+        missing = set(selected) - set(tables)
+        if missing:
+            raise KeyError(f"No tables {sorted(missing)}, only {list(tables)}.")
+        csv = request.get("format") == "csv"
+        rendered = {
+            name: {
+                quantity: table.to_csv() if csv else table.to_string()
+                for quantity, table in tables[name].items()
+            }
+            for name in selected
+        }
+        seconds = time.perf_counter() - start_time
+        logger.info(f"Request answered in {seconds:.3f} s.")
+        return {"ok": True, "tables": rendered, "seconds": seconds}
+
+
+def _remove_stale_socket(socket_path: Path) -> None:
+    """A socket file that no server listens on is left over from a crash."""
+    if not socket_path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(str(socket_path))
+        except ConnectionRefusedError:
+            socket_path.unlink()
+            return
+    raise FileExistsError(f"A server already listens on {socket_path}.")
+
+
+def serve() -> None:
+    """Keep the arrays of a data source in memory and answer `higgstables-query`."""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        "-v", "--version", action="version", version=higgstables._version_info
+    )
+    parser.add_argument(
+        "data_source",
+        type=Path,
+        help="Rootfile with variables from simulated events, or folder thereof.",
+    )
+    parser.add_argument(
+        "--config",
+        type=Path,
+        help=(
+            "The base configuration file. It decides which files belong to "
+            "which table. By default, the one in the data source folder."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        help="The Unix socket to listen on.",
+        default=_default_socket,
+    )
+    parser.add_argument(
+        "--max_memory",
+        type=memory_size,
+        help=(
+            "Drop the arrays of the least recently used files beyond e.g. `8 GB`, "
+            "re-reading them if needed."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--no_cs",
+        dest="no_cs",
+        action="store_true",
+        help="Toggle to not build the cross sections column.",
+    )
+    prepare_cli_logging(parser)
+    args = parser.parse_args()
+    set_cli_logging(args)
+
+    from ..config.load_config import Config, _load_config_dict, _select_yaml_path
+    from ..handle_root_files.warm_tables import WarmTables
+
+    config_path = _select_yaml_path(args.config or args.data_source)
+    base_dict = _load_config_dict(config_path)
+    _remove_stale_socket(args.socket)
+    start_time = time.perf_counter()
+    warm_tables = WarmTables(
+        args.data_source, Config(base_dict, args.no_cs), args.max_memory
+    )
+    warm_tables.tables()
+    print(
+        f"{args.data_source} was read in {time.perf_counter() - start_time:.1f} s "
+        f"({warm_tables.n_bytes / 1e6:.0f} MB in memory). "
+        f"Listening on {args.socket}."
+    )
+    try:
+        with _TablesServer(args.socket, warm_tables, base_dict, args.no_cs) as server:
+            server.serve_forever()
+    finally:
+        if args.socket.exists():
+            args.socket.unlink()
+
+
+def request(socket_path: Path, message: Dict[str, Any]) -> Dict[str, Any]:
+    """Send a message to `higgstables-serve`, and return its answer."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        with sock.makefile("rwb") as sock_file:
+            _send(sock_file, message)
+            return _receive(sock_file)
+
+
+def query() -> None:
+    """Print the tables that `higgstables-serve` builds with a modified config."""
+    parser = argparse.ArgumentParser(description=query.__doc__)
+    parser.add_argument(
+        "config",
+        type=Path,
+        nargs="?",
+        help=(
+            "A configuration file. Its fields replace those of the server's config. "
+            "Without, the server's config is used."
+        ),
+        default=None,
+    )
+    parser.add_argument(
+        "--socket",
+        type=Path,
+        help="The Unix socket that the server listens on.",
+        default=_default_socket,
+    )
+    parser.add_argument(
+        "--table",
+        nargs="+",
+        help="Only print these tables (e.g. eLpR).",
+        default=None,
+    )
+    parser.add_argument("--csv", action="store_true", help="Print the tables as csv.")
+    parser.add_argument("--stop", action="store_true", help="Stop the server instead.")
+    args = parser.parse_args()
+
+    if args.stop:
+        message: Dict[str, Any] = {"command": "stop"}
+    else:
+        message = {
+            "config": args.config.read_text() if args.config else None,
+            "tables": args.table,
+            "format": "csv" if args.csv else "text",
+        }
+    try:
+        response = request(args.socket, message)
+    except (FileNotFoundError, ConnectionRefusedError):
+        sys.exit(
+            f"No server listens on {args.socket}. Start it with higgstables-serve."
+        )
+    if not response["ok"]:
+        sys.exit(response["error"])
+    for name, quantities in response.get("tables", {}).items():
+        for quantity, table in quantities.items():
+            title = name if quantity == "count" else f"{name} ({quantity})"
+            print(f"# {title}\n{table}\n")
+    if "seconds" in response:
+        print(f"# Built in {response['seconds']:.3f} s.", file=sys.stderr)
@@ -1,10 +1,38 @@
-"""The configuration module."""
-from .load_config import Config, ConfigFromArgs, _default_yaml_path
-from .triggers import Trigger
+"""The configuration module.
+
+The names are imported on first access, such that e.g. the CLI's `--help`
+does not wait for numpy, pandas and numexpr.
+"""
+import importlib
+from typing import TYPE_CHECKING, Any, List
+
+if TYPE_CHECKING:
+    from .from_args import ConfigFromArgs
+    from .load_config import Config, _default_yaml_path
+    from .triggers import Clause, Trigger
+
+_lazy_names = {
+    "Clause": ".triggers",
+    "Config": ".load_config",
+    "ConfigFromArgs": ".from_args",
+    "_default_yaml_path": ".load_config",
+    "Trigger": ".triggers",
+}
 
 __all__ = [
+    "Clause",
     "Config",
     "ConfigFromArgs",
     "_default_yaml_path",
     "Trigger",
 ]
+
+
+def __getattr__(name: str) -> Any:
+    if name in _lazy_names:
+        return getattr(importlib.import_module(_lazy_names[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(_lazy_names))
@@ -0,0 +1,94 @@
+"""Loading the configuration from the command line arguments.
+
+Only light imports at module level: The CLI's `--help` and `--version`
+do not need the (heavy) dependencies of the config handling.
+"""
+import argparse
+import logging
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+if TYPE_CHECKING:
+    from .load_config import Config
+
+
+class ConfigFromArgs:
+    """Load the configuration when using the command line interface."""
+
+    _default_config_cli = "in local folder"
+    _default_config_tag = "default"
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.config_path = args.config
+        self.data_source = args.data_source
+        self.data_destination = args.data_dir
+        self.no_cs = args.no_cs
+        self.step_size = getattr(args, "step_size", None)
+        self.max_memory = getattr(args, "max_memory", None)
+        self.sweep_paths: List[Path] = getattr(args, "sweep", None) or []
+        self._valid_config_path: Optional[Path] = None
+
+    def get_config(self) -> "Config":
+        """Return a Config object."""
+        from .load_config import _select_yaml_path, load_config
+        from .util import ConfigFileNotFoundError
+
+        try:
+            if self.config_path == self._default_config_tag:
+                valid_config_path = _select_yaml_path(None)
+            elif self.config_path == self._default_config_cli:
+                valid_config_path = _select_yaml_path(self.data_source)
+            else:
+                valid_config_path = _select_yaml_path(self.config_path)
+        except ConfigFileNotFoundError as e:
+            logging.error(
+                "If you intended to use the default config file, "
+                f"set `--config {self._default_config_tag}`."
+            )
+            raise e
+        shutil.copy(valid_config_path, self.data_destination)
+        self._valid_config_path = valid_config_path
+        config = load_config(valid_config_path, self.no_cs)
+        self._apply_overrides(config)
+        return config
+
+    def _apply_overrides(self, config: "Config") -> None:
+        """The command line options take precedence over the config file."""
+        if self.step_size is not None:
+            config.step_size = self.step_size
+        if self.max_memory is not None:
+            config.max_memory = self.max_memory
+
+    def get_sweep_configs(self) -> Dict[str, "Config"]:
+        """The configs from `sweep_paths`, each applied on top of the base config.
+
+        The name of each config (and of its output folder) is its file name stem.
+        """
+        from .load_config import (
+            Config,
+            _load_config_dict,
+            _select_yaml_path,
+            merge_config_dicts,
+        )
+        from .util import InvalidConfigurationError
+
+        if self._valid_config_path is None:
+            self.get_config()
+        base_dict = _load_config_dict(self._valid_config_path)
+        configs: Dict[str, "Config"] = {}
+        for sweep_path in self.sweep_paths:
+            sweep_path = _select_yaml_path(sweep_path)
+            name = sweep_path.stem
+            if name in configs:
+                raise InvalidConfigurationError(
+                    f"Two sweep configs share the name {name}: "
+                    "Please give the files unique names."
+                )
+            sweep_dir = self.data_destination / name
+            sweep_dir.mkdir(exist_ok=True)
+            shutil.copy(sweep_path, sweep_dir)
+            config_dict = merge_config_dicts(base_dict, _load_config_dict(sweep_path))
+            configs[name] = Config(config_dict, self.no_cs)
+            self._apply_overrides(configs[name])
+        return configs
@@ -1,25 +1,47 @@
 """Config file loader for `higgstables`."""
-import argparse
+import copy
+import hashlib
+import json
 import logging
-import shutil
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
+from typing import Dict, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
 
+import numpy as np
 import pandas as pd
 import yaml
 
 from ..ild_specific import CrossSectionException, CrossSections
-from .triggers import Trigger, Triggers
+from .scan import ThresholdScan
+from .triggers import Clause, Trigger, Triggers
 from .util import (
     CheckFields,
+    CompiledExpression,
     ConfigFileNotFoundError,
     InvalidConfigurationError,
     get_variables_from_expression,
+    is_memory_size,
+    parse_memory_size,
 )
 
 logger = logging.getLogger(__name__)
 
 
+# numexpr (with numpy<2) accepts at most 32 inputs: Leave room for two more.
+_max_masks_per_step = 30
+_default_compaction_threshold = 0.5
+
+
+class CategoryIndexStep(NamedTuple):
+    """Part of the first-match category assignment, see `Config`."""
+
+    clauses: List[Clause]
+    expression: CompiledExpression
+    with_keep_mask: CompiledExpression
+    # Categories with too many clauses for one expression: Their clause masks
+    # are combined beforehand, into a mask of this name.
+    combined: Dict[str, Trigger]
+
+
 class Config:
     """Configuration class.
 
@@ -28,6 +50,9 @@ class Config:
     should raise `InvalidConfigurationError`.
     """
 
+    keep_mask_variable = "_higgstables_keep_mask"
+    previous_index_variable = "_higgstables_previous_index"
+
     def __init__(self, config_dict: Optional[Dict] = None, no_cs: bool = False) -> None:
         """Configuration loading through a dictionary (of a specific schema)."""
         self.no_cs = no_cs
@@ -39,12 +64,17 @@ class Config:
             optional={
                 "anchors",
                 "categories-out-of-tree-variables",
+                "compaction-threshold",
                 "cross-section-zero",
                 "format",
                 "df",
                 "ignored-processes",
+                "max-memory",
                 "triggers",
                 "preselections",
+                "scan",
+                "step-size",
+                "weight",
             },
         ).by_name("higgstables", config_dict)
 
@@ -58,6 +88,11 @@ class Config:
         self.df_n_max = self.df.pop("n_max", None)
         if self.df_n_max is not None:
             self.df_n_max = int(self.df_n_max)
+        self.df_category_column = self.df.pop("category-column", False)
+        self.df_partitioned = self.df.pop("partitioned", False)
+        self.df_row_group_size = self.df.pop("row-group-size", None)
+        self.df_compression = self.df.pop("compression", "snappy")
+        self.df_sample_seed = self.df.pop("sample-seed", None)
 
         self.triggers = Triggers(conf.get("triggers", None))
         self.preselections = Triggers(
@@ -65,6 +100,19 @@ class Config:
             only_preselections=True,
         )
 
+        self.step_size = conf.get("step-size", None)
+        self.max_memory = conf.get("max-memory", None)
+        self.compaction_threshold = conf.get(
+            "compaction-threshold", _default_compaction_threshold
+        )
+        # Per clause key, the entries evaluated for the categories and passed.
+        # Orders the clauses of a category, see `compacted_category_index`.
+        self.clause_statistics: Dict[Tuple, List[int]] = {}
+        self.weight: Union[str, Dict[str, str], None] = conf.get("weight", None)
+        self.scan: Optional[ThresholdScan] = None
+        if conf.get("scan") is not None:
+            self.scan = ThresholdScan(conf["scan"], self._category_conditions)
+
         self._format = conf.get("format", "csv")
         self.save_df(pd.DataFrame(), Path(), "dummy_name", validate_only=True)
         self.tables = conf["tables"]
@@ -80,6 +128,7 @@ class Config:
                 )
                 raise e
         self._validate_parameters()
+        self._compile_categories()
 
     def _validate_parameters(self) -> None:
         try:
@@ -95,6 +144,26 @@ class Config:
             if self.df_n_max is not None:
                 assert type(self.df_n_max) == int
                 assert self.df_n_max >= -1
+            assert type(self.df_category_column) == bool
+            assert type(self.df_partitioned) == bool
+            if self.df_partitioned and self._format != "parquet":
+                raise InvalidConfigurationError(
+                    "`partitioned` under df requires `format: parquet`."
+                )
+            if self.df_row_group_size is not None:
+                assert type(self.df_row_group_size) == int
+                assert self.df_row_group_size > 0
+            assert self.df_compression is None or type(self.df_compression) == str
+            assert self.df_sample_seed is None or type(self.df_sample_seed) == int
+            if isinstance(self.weight, dict):
+                assert all(type(v) == str for v in self.weight.values())
+                for tree in self._weighted_trees():
+                    if tree not in self.weight:
+                        raise InvalidConfigurationError(
+                            f"A `weight` branch is needed for the tree {tree}."
+                        )
+            else:
+                assert self.weight is None or type(self.weight) == str
             assert type(self.df) == dict
             assert all(
                 v is None or all(type(v_i) == str for v_i in v)
@@ -103,6 +172,146 @@ class Config:
         except AssertionError:
             raise InvalidConfigurationError
 
+    @property
+    def step_size(self) -> Union[int, str, None]:
+        """Entries (int) or memory size (str, e.g. "100 MB") per chunk.
+
+        If None, each file is evaluated in one go.
+        """
+        return self._step_size
+
+    @step_size.setter
+    def step_size(self, step_size: Union[int, str, None]) -> None:
+        if isinstance(step_size, bool) or not (
+            step_size is None
+            or (isinstance(step_size, int) and step_size > 0)
+            or is_memory_size(step_size)
+        ):
+            raise InvalidConfigurationError(
+                f"{step_size=} is neither a positive number of entries "
+                "nor a memory size like `100 MB`."
+            )
+        self._step_size = step_size
+
+    @property
+    def max_memory(self) -> Optional[int]:
+        """Budget (bytes) for the arrays of a file that are held in memory.
+
+        Beyond it, the least recently used arrays are evicted (and re-read
+        if needed again). If None, the arrays are only released after use.
+        """
+        return self._max_memory
+
+    @max_memory.setter
+    def max_memory(self, max_memory: Union[int, str, None]) -> None:
+        if is_memory_size(max_memory):
+            max_memory = parse_memory_size(max_memory)
+        if isinstance(max_memory, bool) or not (
+            max_memory is None or (isinstance(max_memory, int) and max_memory > 0)
+        ):
+            raise InvalidConfigurationError(
+                f"{max_memory=} is neither a positive number of bytes "
+                "nor a memory size like `2 GB`."
+            )
+        self._max_memory = max_memory
+
+    @property
+    def compaction_threshold(self) -> Optional[float]:
+        """Compact the arrays once fewer entries are undecided (fraction).
+
+        During the category assignment, entries that are not kept or that
+        already found their category are dropped from the arrays.
+        If None, all categories are evaluated for all entries in one fused pass.
+        """
+        return self._compaction_threshold
+
+    @compaction_threshold.setter
+    def compaction_threshold(self, threshold: Optional[float]) -> None:
+        if threshold is False:
+            threshold = None
+        if isinstance(threshold, bool) or not (
+            threshold is None
+            or (isinstance(threshold, (int, float)) and 0 < threshold <= 1)
+        ):
+            raise InvalidConfigurationError(
+                f"{threshold=} is not a fraction in (0, 1] (or false)."
+            )
+        self._compaction_threshold = threshold
+
+    def weight_branch(self, tree: str) -> Optional[str]:
+        """The branch with the per-event weights in this tree (if any)."""
+        if isinstance(self.weight, dict):
+            return self.weight.get(tree)
+        return self.weight
+
+    def _weighted_trees(self) -> List[str]:
+        """The trees whose entries enter the weighted counts.
+
+        Failing a preselection is weighted by the categories tree's weight,
+        as the preselections act on its entries.
+        """
+        trees = [t.tree for t in self.triggers if t.type == Trigger._default_type]
+        trees.append(self.categories_tree)
+        return list(dict.fromkeys(trees))
+
+    def _selectors(self, with_categories: bool = True) -> List[Trigger]:
+        """The triggers, preselections and categories evaluated on the arrays."""
+        selectors: List[Trigger] = [
+            t for t in self.triggers if t.type == Trigger._default_type
+        ]
+        selectors.extend(self.preselections)
+        if with_categories:
+            selectors.extend(t for _, t in self.categories_wrapped_as_triggers())
+        return selectors
+
+    def variables_per_tree(
+        self, with_categories: bool = True, with_weights: bool = False
+    ) -> Dict[str, Set[str]]:
+        """The union of the variables needed from each tree for the selection."""
+        per_tree: Dict[str, Set[str]] = {}
+        for selector in self._selectors(with_categories):
+            for var in selector.variables:
+                var_tree = selector.out_of_tree_variables.get(var, selector.tree)
+                per_tree.setdefault(var_tree, set()).add(var)
+        if with_weights and self.weight is not None:
+            for tree in self._weighted_trees():
+                per_tree.setdefault(tree, set()).add(self.weight_branch(tree))
+        return per_tree
+
+    def branch_users(self, with_categories: bool = True) -> Dict[Tuple[str, str], Set]:
+        """Per (tree, branch), the keys of the unique clauses that read it.
+
+        Once all of them are evaluated, the branch is not needed anymore.
+        """
+        users: Dict[Tuple[str, str], Set] = {}
+        for selector in self._selectors(with_categories):
+            for clause in selector.clauses:
+                for var in clause.variables:
+                    var_tree = clause.out_of_tree_variables.get(var, clause.tree)
+                    users.setdefault((var_tree, var), set()).add(clause.key)
+        return users
+
+    def selection_fingerprint(self) -> str:
+        """A hash of all settings that determine the per-file category counts."""
+
+        def as_list(triggers: Iterable[Trigger]) -> List:
+            return [
+                [t.type, t.tree, t.condition, sorted(t.out_of_tree_variables.items())]
+                for t in triggers
+            ]
+
+        selection = {
+            "triggers": as_list(self.triggers),
+            "preselections": as_list(self.preselections),
+            "categories": list(self.categories.items()),
+            "categories-tree": self.categories_tree,
+            "weight": self.weight,
+            "categories-out-of-tree-variables": sorted(
+                self.categories_out_of_tree_variables.items()
+            ),
+        }
+        return hashlib.sha256(json.dumps(selection).encode()).hexdigest()
+
     @property
     def categories(self) -> Dict[str, str]:
         return self._categories
@@ -121,6 +330,11 @@ class Config:
             new_categories[key] = value
         self._category_variables = self._get_category_variables(new_categories)
         self._categories = new_categories
+        self._category_conditions = dict(category_dict)  # Keeps the clause lists.
+
+        n_categories = len(new_categories)
+        self.category_index_dtype = np.int8 if n_categories < 127 else np.int32
+        self._category_triggers: Optional[Dict[str, Trigger]] = None
 
     @property
     def category_variables(self) -> Set[str]:
@@ -140,16 +354,117 @@ class Config:
         logger.info(f"The variables used for category building are: {all_variables}")
         return all_variables
 
-    def categories_wrapped_as_triggers(self) -> Iterable[Tuple[str, Trigger]]:
-        for key, condition in self.categories.items():
-            yield key, Trigger(
-                {
-                    "condition": condition,
-                    "type": Trigger._default_type,
-                    "tree": self.categories_tree,
-                    "out-of-tree-variables": self.categories_out_of_tree_variables,
-                }
+    def _category_as_trigger(self, condition: Union[str, List[str]]) -> Trigger:
+        return Trigger(
+            {
+                "condition": condition,
+                "type": Trigger._default_type,
+                "tree": self.categories_tree,
+                "out-of-tree-variables": self.categories_out_of_tree_variables,
+            }
+        )
+
+    def _compile_categories(self) -> None:
+        """Build the selectors once, to be reused for every file."""
+        self._category_triggers = {
+            key: self._category_as_trigger(condition)
+            for key, condition in self._category_conditions.items()
+        }
+        if self.scan is not None:
+            self.scan.mark_clause(self._category_triggers[self.scan.category])
+        self._register_clauses()
+        self._category_index_steps = self._build_category_index_steps()
+
+    def _register_clauses(self) -> None:
+        """Common subexpression elimination: Share the masks of identical clauses."""
+        assert self._category_triggers is not None
+        selectors = [t for t in self.triggers if t.type == Trigger._default_type]
+        selectors.extend(self.preselections)
+        selectors.extend(self._category_triggers.values())
+        unique: Dict[Tuple, Clause] = {}
+        n_clauses = 0
+        for selector in selectors:
+            selector.clauses = [unique.setdefault(c.key, c) for c in selector.clauses]
+            n_clauses += len(selector.clauses)
+        for i, clause in enumerate(unique.values()):
+            clause.mask_name = f"_higgstables_clause_{i}"
+        logger.info(
+            f"{len(unique)} unique clauses are evaluated for the {n_clauses} "
+            "clauses in triggers, preselections and categories."
+        )
+
+    def _build_category_index_steps(self) -> List["CategoryIndexStep"]:
+        """First-match category assignment as nested `where` expressions.
+
+        Each expression combines the masks of as many categories as numexpr
+        accepts inputs. Most configurations are handled in a single (fused) step.
+        The steps are to be evaluated in order, the last one yields the index.
+        A category with more clauses than that enters with a single,
+        combined mask.
+        """
+        assert self._category_triggers is not None
+        triggers = list(self._category_triggers.values())
+        combined_names: Dict[int, str] = {}
+        for i, trigger in enumerate(triggers):
+            if len({c.mask_name for c in trigger.clauses}) > _max_masks_per_step:
+                combined_names[i] = f"_higgstables_category_{i}"
+
+        def masks_of(i: int) -> List[str]:
+            if i in combined_names:
+                return [combined_names[i]]
+            return [c.mask_name for c in triggers[i].clauses]
+
+        groups: List[List[int]] = []
+        group_masks: Set[str] = set()
+        for i in reversed(range(len(triggers))):
+            masks = set(masks_of(i))
+            if not groups or len(group_masks | masks) > _max_masks_per_step:
+                groups.append([])
+                group_masks = set()
+            groups[-1].insert(0, i)
+            group_masks |= masks
+
+        steps = []
+        for group in groups:
+            index_expression = "-1" if not steps else self.previous_index_variable
+            for i in reversed(group):
+                condition = " & ".join(masks_of(i))
+                index_expression = f"where({condition}, {i}, {index_expression})"
+            clauses = {
+                c.key: c
+                for i in group
+                if i not in combined_names
+                for c in triggers[i].clauses
+            }
+            combined = {
+                combined_names[i]: triggers[i] for i in group if i in combined_names
+            }
+            steps.append(
+                CategoryIndexStep(
+                    list(clauses.values()),
+                    CompiledExpression(index_expression),
+                    CompiledExpression(
+                        f"where({self.keep_mask_variable}, {index_expression}, -1)"
+                    ),
+                    combined,
+                )
             )
+        return steps
+
+    def categories_wrapped_as_triggers(self) -> Iterable[Tuple[str, Trigger]]:
+        if self._category_triggers is None:
+            self._compile_categories()
+        assert self._category_triggers is not None
+        yield from self._category_triggers.items()
+
+    def category_index_steps(self) -> List["CategoryIndexStep"]:
+        """Evaluate in order to get the index of the first category that applies.
+
+        With `keep_mask_variable`, only the last step's `with_keep_mask` is used.
+        """
+        if self._category_triggers is None:
+            self._compile_categories()
+        return self._category_index_steps
 
     def save_df(
         self, df: pd.DataFrame, folder: Path, name: str, validate_only: bool = False
@@ -198,6 +513,22 @@ def _load_config_dict(yaml_path: Union[Path, str, None]) -> Dict:
     return config_dict
 
 
+def merge_config_dicts(base: Dict, overrides: Dict) -> Dict:
+    """The base config dict, with the fields from `overrides` replacing its fields.
+
+    The replacement happens per field of each top level section:
+    Overriding `higgstables: {categories: ...}` replaces the whole categories block,
+    but keeps e.g. the triggers from `base`.
+    """
+    merged = copy.deepcopy(base)
+    for section, fields in overrides.items():
+        if isinstance(fields, dict) and isinstance(merged.get(section), dict):
+            merged[section].update(copy.deepcopy(fields))
+        else:
+            merged[section] = copy.deepcopy(fields)
+    return merged
+
+
 def load_config(
     yaml_path: Union[Path, str, None] = None, no_cs: bool = False
 ) -> "Config":
@@ -207,35 +538,3 @@ def load_config(
     >>> my_config = load_config("path/to/config.yaml")
     """
     return Config(_load_config_dict(yaml_path), no_cs)
-
-
-class ConfigFromArgs:
-    """Load the configuration when using the command line interface."""
-
-    _default_config_cli = "in local folder"
-    _default_config_tag = "default"
-
-    def __init__(self, args: argparse.Namespace) -> None:
-        self.config_path = args.config
-        self.data_source = args.data_source
-        self.data_destination = args.data_dir
-        self.no_cs = args.no_cs
-
-    def get_config(self) -> Config:
-        """Return a Config object."""
-        try:
-            if self.config_path == self._default_config_tag:
-                valid_config_path = _select_yaml_path(None)
-            elif self.config_path == self._default_config_cli:
-                valid_config_path = _select_yaml_path(self.data_source)
-            else:
-                valid_config_path = _select_yaml_path(self.config_path)
-        except ConfigFileNotFoundError as e:
-            logging.error(
-                "If you intended to use the default config file, "
-                f"set `--config {self._default_config_tag}`."
-            )
-            raise e
-        shutil.copy(valid_config_path, self.data_destination)
-        config = load_config(valid_config_path)
-        return config
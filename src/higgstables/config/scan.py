@@ -0,0 +1,98 @@
+"""A threshold scan: One cut of a category, evaluated for a grid of values."""
+import re
+from typing import Dict, List, Union
+
+import numpy as np
+
+from .triggers import Clause, Trigger
+from .util import CheckFields, InvalidConfigurationError
+
+_number = r"[-+]?(?:[0-9]+\.?[0-9]*|\.[0-9]+)(?:[eE][-+]?[0-9]+)?"
+_threshold_pattern = re.compile(
+    rf"^\s*(?:(?P<var>[A-Za-z_]\w*)\s*(?P<op>[<>]=?)\s*(?P<value>{_number})"
+    rf"|(?P<value_first>{_number})\s*(?P<op_first>[<>]=?)\s*(?P<var_last>[A-Za-z_]\w*))"
+    r"\s*$"
+)
+_flipped = {"<": ">", ">": "<", "<=": ">=", ">=": "<="}
+
+
+class ThresholdScan:
+    """The `scan` entry of the configuration.
+
+    The `clause` (e.g. `b_tag1 > 0.8`) must be one of the items
+    of the scanned `category`. Its threshold is replaced by each of the `values`.
+    """
+
+    _field_checker = CheckFields(required={"category", "clause", "values"})
+
+    def __init__(
+        self,
+        scan_dict: Dict,
+        category_conditions: Dict[str, Union[str, List[str]]],
+    ) -> None:
+        self._field_checker._check_dict_fields(scan_dict, "scan")
+        self.category: str = scan_dict["category"]
+        if self.category not in category_conditions:
+            raise InvalidConfigurationError(
+                f"The scanned category {self.category} is not in the categories."
+            )
+        self.category_position = list(category_conditions).index(self.category)
+
+        condition = category_conditions[self.category]
+        clauses = [condition] if isinstance(condition, str) else condition
+        self.clause_text = " ".join(str(scan_dict["clause"]).split())
+        if self.clause_text not in {" ".join(c.split()) for c in clauses}:
+            raise InvalidConfigurationError(
+                f"{self.clause_text} is not an item of the category {self.category}."
+            )
+        match = _threshold_pattern.match(self.clause_text)
+        if match is None:
+            raise InvalidConfigurationError(
+                f"Only clauses like `variable > 0.5` can be scanned, "
+                f"not {self.clause_text}."
+            )
+        if match["var"] is not None:
+            self.variable, self.operator = match["var"], match["op"]
+        else:
+            self.variable, self.operator = (
+                match["var_last"],
+                _flipped[match["op_first"]],
+            )
+
+        try:
+            self.values = np.asarray(scan_dict["values"], dtype=np.float64)
+            assert self.values.ndim == 1 and len(self.values) > 0
+        except (AssertionError, TypeError, ValueError):
+            raise InvalidConfigurationError(
+                f"The scan values must be a list of numbers, not {scan_dict['values']}."
+            )
+        # Set by `mark_clause`.
+        self.clause: Clause
+        self.other_clauses: List[Clause]
+
+    def mark_clause(self, category_trigger: Trigger) -> None:
+        """Give the scanned clause its own key, before the clauses are shared.
+
+        Otherwise other categories (or triggers) with the same clause
+        would be scanned too.
+        """
+        clauses = category_trigger.clauses
+        i = next(i for i, c in enumerate(clauses) if c.key[0] == self.clause_text)
+        self.clause = clauses[i]
+        self.clause.key = self.clause.key + ("scan",)
+        self.other_clauses = clauses[:i] + clauses[i + 1 :]
+
+    def n_passing(self, sorted_values: np.ndarray) -> np.ndarray:
+        """For each threshold, the number of (sorted, non-NaN) values passing the cut."""
+        if self.operator == ">":
+            return len(sorted_values) - np.searchsorted(
+                sorted_values, self.values, side="right"
+            )
+        if self.operator == ">=":
+            return len(sorted_values) - np.searchsorted(
+                sorted_values, self.values, side="left"
+            )
+        if self.operator == "<":
+            return np.searchsorted(sorted_values, self.values, side="left")
+        assert self.operator == "<="
+        return np.searchsorted(sorted_values, self.values, side="right")
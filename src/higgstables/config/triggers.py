@@ -1,7 +1,39 @@
 """The Preselector class, used for the `unselected` and pre-selections entries."""
-from typing import Dict, Iterable, Optional
+from typing import Dict, Iterable, Optional, Tuple
 
-from .util import CheckFields, InvalidConfigurationError, get_variables_from_expression
+from .util import CheckFields, CompiledExpression, InvalidConfigurationError
+
+
+class Clause:
+    """An atomic selection expression: One item of a list-style condition.
+
+    Clauses with the same `key` select the same entries.
+    They are evaluated only once per file (or chunk).
+    """
+
+    def __init__(
+        self, expression: str, tree: str, out_of_tree_variables: Dict[str, str]
+    ) -> None:
+        try:
+            self.expression = CompiledExpression(expression)
+        except SyntaxError:
+            raise InvalidConfigurationError(expression)
+        self.variables = set(self.expression.variables)
+        self.tree = tree
+        self.out_of_tree_variables = {
+            var: var_tree
+            for var, var_tree in out_of_tree_variables.items()
+            if var in self.variables
+        }
+        var_trees = sorted(
+            (var, self.out_of_tree_variables.get(var, tree)) for var in self.variables
+        )
+        self.key: Tuple = (" ".join(expression.split()), tuple(var_trees))
+        # The variable name under which the clause's mask is used in expressions.
+        self.mask_name: Optional[str] = None
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.key})"
 
 
 class Trigger:
@@ -27,16 +59,21 @@ class Trigger:
 
     def _get_condition_expression(self, condition):
         if isinstance(condition, str):
-            pass
+            clauses = [condition]
         elif isinstance(condition, list):
+            clauses = condition
             # Combine selector expression by logical_and.
             condition = "(" + ") & (".join(condition) + ")"
         else:
             raise InvalidConfigurationError(f"Category {condition=}.")
         try:
-            self.variables = set(get_variables_from_expression(condition))
+            self.expression = CompiledExpression(condition)
         except SyntaxError:
             raise InvalidConfigurationError(condition)
+        self.variables = set(self.expression.variables)
+        self.clauses = [
+            Clause(clause, self.tree, self.out_of_tree_variables) for clause in clauses
+        ]
         return condition
 
 
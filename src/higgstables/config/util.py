@@ -1,7 +1,10 @@
 """"Smaller code snippets useful within the config handling code."""
-from typing import Dict, Iterable, Iterator, Optional
+import re
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
 
+import numexpr
 import numexpr.necompiler as nec
+import numpy as np
 
 
 class ConfigFileNotFoundError(FileNotFoundError):
@@ -59,6 +62,29 @@ class CheckFields:
             )
 
 
+_memory_size_pattern = re.compile(
+    r"^\s*([0-9]+\.?[0-9]*|\.[0-9]+)\s*([kmgtpe]i?)?b\s*$", re.IGNORECASE
+)
+
+
+def is_memory_size(value: Any) -> bool:
+    """Whether this is a string like `100 MB` or `2 GiB`."""
+    return isinstance(value, str) and bool(_memory_size_pattern.match(value))
+
+
+def parse_memory_size(value: str) -> int:
+    """Number of bytes from a string like `100 MB` or `2 GiB`."""
+    match = _memory_size_pattern.match(value)
+    if match is None:
+        raise ValueError(f"{value} is not a memory size like `100 MB`.")
+    number, unit = match.groups()
+    if not unit:
+        return int(float(number))
+    base = 1024 if unit.lower().endswith("i") else 1000
+    exponent = "kmgtpe".index(unit[0].lower()) + 1
+    return int(float(number) * base**exponent)
+
+
 def get_variables_from_expression(expression: str) -> Iterator[str]:
     """Get the names of all variables found in the expression (through numexpr)."""
     # https://stackoverflow.com/questions/58585735/numexpr-how-to-get-variables-inside-expression
@@ -68,3 +94,38 @@ def get_variables_from_expression(expression: str) -> Iterator[str]:
             nec.expressionToAST(nec.stringToExpression(expression, {}, {}))
         ).allOf("variable"),
     )
+
+
+class CompiledExpression:
+    """A numexpr expression that is parsed once and compiled once per signature.
+
+    `numexpr.evaluate` parses the expression string again on every call.
+    Here, the compiled program is kept for each combination of input types.
+    Instances can be pickled (e.g. sent to worker processes):
+    The compiled programs are then rebuilt on first use.
+    """
+
+    def __init__(self, expression: str) -> None:
+        self.expression = expression
+        self.variables: List[str]
+        self.variables, self._uses_vml = nec.getExprNames(expression, {})
+        self._compiled: Dict[Tuple, numexpr.NumExpr] = {}
+
+    def __call__(self, local_arrays: Mapping[str, np.ndarray]) -> np.ndarray:
+        arrays = [np.asarray(local_arrays[name]) for name in self.variables]
+        signature = tuple(
+            (name, nec.getType(array)) for name, array in zip(self.variables, arrays)
+        )
+        compiled = self._compiled.get(signature)
+        if compiled is None:
+            compiled = numexpr.NumExpr(self.expression, signature=list(signature))
+            self._compiled[signature] = compiled
+        return compiled(*arrays, casting="safe", ex_uses_vml=self._uses_vml)
+
+    def __getstate__(self) -> Dict[str, Any]:
+        state = self.__dict__.copy()
+        state["_compiled"] = {}
+        return state
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({self.expression!r})"
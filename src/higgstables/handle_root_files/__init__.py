@@ -1,4 +1,25 @@
 """The working horse: Gets counts out of rootfiles into the .csv tables."""
-from .root_to_table import DfFromFiles, FileToCounts, TablesFromFiles
+from .in_memory import InMemoryDfs, InMemoryTables
+from .root_to_table import (
+    DfFromFiles,
+    FileToCounts,
+    ScanTablesFromFiles,
+    SweepTablesFromFiles,
+    TablesAndDfFromFiles,
+    TablesFromFiles,
+)
+from .shards import ShardMergeError, ShardTablesFromFiles, TablesFromShards
 
-__all__ = ["DfFromFiles", "FileToCounts", "TablesFromFiles"]
+__all__ = [
+    "DfFromFiles",
+    "FileToCounts",
+    "InMemoryDfs",
+    "InMemoryTables",
+    "ScanTablesFromFiles",
+    "ShardMergeError",
+    "ShardTablesFromFiles",
+    "SweepTablesFromFiles",
+    "TablesAndDfFromFiles",
+    "TablesFromFiles",
+    "TablesFromShards",
+]
@@ -0,0 +1,236 @@
+"""Reading the branches of a rootfile, independent of how they are evaluated."""
+import logging
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Set, Tuple, Union
+
+import numpy as np
+import uproot
+
+from . import profiling
+
+logger = logging.getLogger(__name__)
+EntryRange = Tuple[Optional[int], Optional[int]]
+BranchKey = Tuple[str, str]  # (tree, branch)
+
+
+def _compressed_bytes(
+    branch: uproot.TBranch,
+    entry_start: Optional[int] = None,
+    entry_stop: Optional[int] = None,
+) -> int:
+    """Size on disk of the baskets that hold the entries in the given range."""
+    offsets = np.asarray(branch.entry_offsets)
+    start = 0 if entry_start is None else entry_start
+    stop = offsets[-1] if entry_stop is None else entry_stop
+    return sum(
+        branch.basket_compressed_bytes(i)
+        for i in range(branch.num_baskets)
+        if offsets[i] < stop and offsets[i + 1] > start
+    )
+
+
+def _array_bytes(
+    branch: uproot.TBranch,
+    entry_start: Optional[int] = None,
+    entry_stop: Optional[int] = None,
+) -> int:
+    """Estimated size in memory of the branch's array for the given range."""
+    start = 0 if entry_start is None else entry_start
+    stop = branch.num_entries if entry_stop is None else entry_stop
+    dtype = getattr(branch.interpretation, "to_dtype", np.dtype(np.float64))
+    return (stop - start) * dtype.itemsize
+
+
+class BranchCache:
+    """The arrays read from a rootfile, for the current entry range.
+
+    Several consumers (e.g. the `FileToCounts` of different configs)
+    can share one instance: Each branch is then read only once per range.
+
+    With `max_memory` (bytes), the least recently used arrays are evicted
+    when the arrays exceed this budget. They are re-read if needed again.
+    """
+
+    def __init__(self, rootfile_path: Path, max_memory: Optional[int] = None) -> None:
+        self.rootfile_path = rootfile_path
+        with profiling.stage("open"):
+            self.rootfile = uproot.open(rootfile_path)
+        self.entry_range: EntryRange = (None, None)
+        self.max_memory = max_memory
+        self._arrays: "OrderedDict[BranchKey, np.ndarray]" = OrderedDict()
+        self._evicted: Set[BranchKey] = set()
+        # Usage tracking.
+        self.n_bytes = 0
+        self.peak_bytes = 0
+        self.n_evicted = 0
+        self.n_reread = 0
+
+    def tree(self, var_tree: str) -> uproot.TTree:
+        try:
+            return self.rootfile[var_tree]
+        except KeyError as e:
+            logger.error(f"tree {var_tree} not found in {self.rootfile_path}")
+            raise e
+
+    def set_entry_range(
+        self, entry_start: Optional[int] = None, entry_stop: Optional[int] = None
+    ) -> None:
+        """Arrays that were read for another range are released."""
+        if (entry_start, entry_stop) != self.entry_range:
+            self.clear()
+            self.entry_range = (entry_start, entry_stop)
+
+    def clear(self) -> None:
+        self._arrays.clear()
+        self._evicted.clear()
+        self.n_bytes = 0
+
+    def release(self, var_tree: str, var: str) -> None:
+        """Drop an array that is not needed anymore (for the current range)."""
+        array = self._arrays.pop((var_tree, var), None)
+        if array is not None:
+            self.n_bytes -= array.nbytes
+
+    def _add(self, key: BranchKey, array: np.ndarray) -> None:
+        if key in self._evicted:
+            self._evicted.remove(key)
+            self.n_reread += 1
+            logger.info(
+                f"{key[1]} from {key[0]} is re-read after its eviction "
+                f"(max_memory={self.max_memory} bytes)."
+            )
+        self._arrays[key] = array
+        self.n_bytes += array.nbytes
+        self.peak_bytes = max(self.peak_bytes, self.n_bytes)
+
+    def _enforce_budget(self, keep: Optional[BranchKey] = None) -> None:
+        """Evict the least recently used arrays until `max_memory` is respected."""
+        if self.max_memory is None:
+            return
+        for key in list(self._arrays):
+            if self.n_bytes <= self.max_memory:
+                break
+            if key == keep:
+                continue
+            self.release(*key)
+            self._evicted.add(key)
+            self.n_evicted += 1
+            logger.info(
+                f"{key[1]} from {key[0]} is evicted: "
+                f"The arrays exceeded max_memory={self.max_memory} bytes."
+            )
+
+    def _within_budget(self, tree: uproot.TTree, variables: Set[str]) -> Set[str]:
+        """The variables that can be prefetched without exceeding `max_memory`.
+
+        The others are read only when needed (see `get`).
+        """
+        if self.max_memory is None:
+            return variables
+        available = self.max_memory - self.n_bytes
+        selected = set()
+        for var in sorted(variables):
+            try:
+                n_bytes = _array_bytes(tree[var], *self.entry_range)
+            except KeyError:
+                n_bytes = 0  # Reported as missing in `prefetch`.
+            if n_bytes <= available:
+                selected.add(var)
+                available -= n_bytes
+        return selected
+
+    def prefetch(self, vars_per_tree: Dict[str, Set[str]]) -> None:
+        """Read the missing variables with one batched call per tree.
+
+        With `max_memory`, only as many variables as fit into the budget.
+        """
+        entry_start, entry_stop = self.entry_range
+        for var_tree, variables in vars_per_tree.items():
+            variables = {v for v in variables if (var_tree, v) not in self._arrays}
+            tree = self.tree(var_tree)
+            variables = self._within_budget(tree, variables)
+            if not variables:
+                continue
+            start_time = time.perf_counter()
+            with profiling.stage("read"):
+                arrays = tree.arrays(
+                    filter_name=sorted(variables),
+                    library="np",
+                    entry_start=entry_start,
+                    entry_stop=entry_stop,
+                )
+            missing = variables - set(arrays)
+            if missing:
+                logger.error(
+                    f"{missing} not found in {var_tree} of {self.rootfile_path}"
+                )
+                raise KeyError(missing)
+            for var, array in arrays.items():
+                self._add((var_tree, var), array)
+            n_bytes = sum(a.nbytes for a in arrays.values())
+            n_compressed = sum(
+                _compressed_bytes(tree[var], entry_start, entry_stop)
+                for var in variables
+            )
+            profiling.add_bytes(n_compressed, n_bytes)
+            logger.debug(
+                f"Read {len(arrays)} branches from {var_tree} "
+                f"({n_compressed / 1e6:.2f} MB compressed, {n_bytes / 1e6:.2f} MB "
+                f"in memory) in {time.perf_counter() - start_time:.3f} s."
+            )
+        self._enforce_budget()
+
+    def get(self, var_tree: str, var: str) -> np.ndarray:
+        """The array of a branch. It is read now, if it was not prefetched."""
+        key = (var_tree, var)
+        if key in self._arrays:
+            self._arrays.move_to_end(key)
+            return self._arrays[key]
+        entry_start, entry_stop = self.entry_range
+        try:
+            with profiling.stage("read"):
+                branch = self.tree(var_tree)[var]
+                array = branch.array(
+                    library="np", entry_start=entry_start, entry_stop=entry_stop
+                )
+        except KeyError as e:
+            logger.error(f"{var} not found in {var_tree} of {self.rootfile_path}")
+            raise e
+        if profiling.active():
+            n_compressed = _compressed_bytes(branch, entry_start, entry_stop)
+            profiling.add_bytes(n_compressed, array.nbytes)
+        self._add(key, array)
+        self._enforce_budget(keep=key)
+        return array
+
+    def entry_ranges(
+        self,
+        vars_per_tree: Dict[str, Set[str]],
+        step_size: Union[int, str, None],
+    ) -> Iterator[EntryRange]:
+        """Split the file into chunks of `step_size` entries (or bytes)."""
+        if step_size is None:
+            yield None, None
+            return
+        trees = {name: self.tree(name) for name in vars_per_tree}
+        n_entries = max((tree.num_entries for tree in trees.values()), default=0)
+        if isinstance(step_size, str):
+            # Such that the chunks of all trees together fit into the memory size.
+            entries_per_tree = [
+                max(
+                    tree.num_entries_for(
+                        step_size, filter_name=sorted(vars_per_tree[name])
+                    ),
+                    1,
+                )
+                for name, tree in trees.items()
+            ]
+            step_size = max(int(1 / sum(1 / n for n in entries_per_tree)), 1)
+        if n_entries <= step_size:
+            yield None, None
+            return
+        logger.debug(f"{self.rootfile_path} is read in chunks of {step_size} entries.")
+        for entry_start in range(0, n_entries, step_size):
+            yield entry_start, min(entry_start + step_size, n_entries)
@@ -0,0 +1,169 @@
+"""First-match category assignment that shrinks to the undecided entries.
+
+Late categories (e.g. `rest`) would otherwise be evaluated for all entries,
+although the preselection and the earlier categories already decided most.
+`compacted_category_index` walks the categories in order and evaluates each
+clause only for the entries that are still undecided. Once these are fewer
+than `threshold` of the entries that the current arrays hold, the needed
+arrays are compacted (gathered) to them.
+Within a category, the clauses are evaluated in the order of their measured
+pass fractions (most selective first), each only for the entries that passed
+the ones before. The index is identical to that of the fused evaluation.
+"""
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from ..config import Clause, Trigger
+from .branch_cache import BranchKey
+
+# Per clause key, the entries evaluated and the entries that passed.
+ClauseStatistics = Dict[Tuple, List[int]]
+
+
+class _Frame:
+    """The entries (`rows` of the chunk) to which the arrays are compacted."""
+
+    def __init__(self, rows: Optional[np.ndarray], n_entries: int) -> None:
+        self.rows = rows  # None: All entries of the chunk, not compacted.
+        self.n_entries = n_entries
+        self.arrays: Dict[BranchKey, np.ndarray] = {}
+        # Per clause key: The values, and for which entries they are evaluated.
+        self.masks: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}
+
+    def compact(self, keep: np.ndarray, clause_keys: Set[Tuple]) -> "_Frame":
+        """Only the entries in `keep`, and the masks of the clauses still needed.
+
+        The arrays are gathered again from the chunk's arrays, once needed.
+        """
+        positions = np.flatnonzero(keep)
+        rows = positions if self.rows is None else self.rows[positions]
+        frame = _Frame(rows, len(positions))
+        for key, (values, done) in self.masks.items():
+            if key in clause_keys:
+                frame.masks[key] = values[positions], done[positions]
+        return frame
+
+    def array(
+        self, key: BranchKey, get_array: Callable[[str, str], np.ndarray]
+    ) -> np.ndarray:
+        if key in self.arrays:
+            return self.arrays[key]
+        array = get_array(*key)
+        if self.rows is None:
+            return array
+        self.arrays[key] = array[self.rows]
+        return self.arrays[key]
+
+
+def _by_pass_fraction(
+    clauses: Iterable[Clause], statistics: ClauseStatistics
+) -> List[Clause]:
+    """Most selective first. Clauses without statistics yet keep their order."""
+
+    def pass_fraction(clause: Clause) -> float:
+        n_evaluated, n_passed = statistics.get(clause.key, (0, 0))
+        return n_passed / n_evaluated if n_evaluated else -1.0
+
+    return sorted(clauses, key=pass_fraction)
+
+
+def _clause_values(
+    clause: Clause,
+    candidates: np.ndarray,
+    frame: _Frame,
+    get_array: Callable[[str, str], np.ndarray],
+    full_masks: Dict[Tuple, np.ndarray],
+    threshold: float,
+) -> np.ndarray:
+    """The clause's mask for the `candidates` (positions within the frame)."""
+    if clause.key not in frame.masks:
+        full_mask = full_masks.get(clause.key)
+        if full_mask is None:
+            values = np.zeros(frame.n_entries, dtype=bool)
+            done = np.zeros(frame.n_entries, dtype=bool)
+        else:  # Already evaluated for all entries, e.g. as part of a trigger.
+            values = full_mask if frame.rows is None else full_mask[frame.rows]
+            done = np.ones(frame.n_entries, dtype=bool)
+        frame.masks[clause.key] = values, done
+    values, done = frame.masks[clause.key]
+    todo = candidates[~done[candidates]]
+    if len(todo) == 0:
+        return values[candidates]
+    keys = {
+        var: (clause.out_of_tree_variables.get(var, clause.tree), var)
+        for var in clause.variables
+    }
+    if not done.any() and len(todo) >= threshold * frame.n_entries:
+        # Gathering would cost more than it saves.
+        local_arrays = {var: frame.array(key, get_array) for var, key in keys.items()}
+        values[:] = clause.expression(local_arrays)
+        done[:] = True
+    else:
+        local_arrays = {
+            var: frame.array(key, get_array)[todo] for var, key in keys.items()
+        }
+        values[todo] = clause.expression(local_arrays)
+        done[todo] = True
+    return values[candidates]
+
+
+def compacted_category_index(
+    categories: List[Trigger],
+    n_entries: int,
+    keep_mask: Optional[np.ndarray],
+    get_array: Callable[[str, str], np.ndarray],
+    full_masks: Dict[Tuple, np.ndarray],
+    statistics: ClauseStatistics,
+    threshold: float,
+    on_last_use: Callable[[Clause], None],
+    dtype: type,
+) -> np.ndarray:
+    """Per entry, the index of the first category that applies (else -1).
+
+    `on_last_use(clause)` is called once no later category needs the clause.
+    `statistics` is updated with the entries that each clause was evaluated
+    for and passed. It decides the clause order for the next calls.
+    """
+    last_use: Dict[Tuple, int] = {}
+    pending: Dict[Tuple, Clause] = {}
+    for i, category in enumerate(categories):
+        for clause in category.clauses:
+            last_use[clause.key] = i
+            pending[clause.key] = clause
+
+    index = np.full(n_entries, -1, dtype=dtype)
+    frame = _Frame(None, n_entries)
+    if keep_mask is None:
+        undecided = np.ones(n_entries, dtype=bool)
+    else:
+        undecided = keep_mask.copy()
+    n_undecided = int(np.sum(undecided))
+    for i, category in enumerate(categories):
+        if n_undecided == 0:
+            break
+        if n_undecided < threshold * frame.n_entries:
+            frame = frame.compact(undecided, set(pending))
+            undecided = np.ones(frame.n_entries, dtype=bool)
+        candidates = np.flatnonzero(undecided)
+        for clause in _by_pass_fraction(category.clauses, statistics):
+            passed = _clause_values(
+                clause, candidates, frame, get_array, full_masks, threshold
+            )
+            clause_statistics = statistics.setdefault(clause.key, [0, 0])
+            clause_statistics[0] += len(candidates)
+            clause_statistics[1] += int(np.sum(passed))
+            candidates = candidates[passed]
+            if len(candidates) == 0:
+                break
+        index[candidates if frame.rows is None else frame.rows[candidates]] = i
+        undecided[candidates] = False
+        n_undecided -= len(candidates)
+        for clause in category.clauses:
+            if last_use[clause.key] == i and clause.key in pending:
+                del pending[clause.key]
+                frame.masks.pop(clause.key, None)
+                on_last_use(clause)
+    for clause in pending.values():  # All entries were decided early.
+        on_last_use(clause)
+    return index
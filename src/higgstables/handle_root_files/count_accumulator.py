@@ -0,0 +1,109 @@
+"""Summing the per-file counts into the (process x category) tables."""
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Per quantity (count, sumw, sumw2), a series indexed by category,
+# named after the process.
+FileCounts = Dict[str, pd.Series]
+
+
+class CountAccumulator:
+    """The counts per process and category, summed over the files of a table.
+
+    The categories (columns) are fixed by the first counts that are added,
+    the processes (rows) are appended in the order in which they first appear.
+    Per quantity, the cells are held in one contiguous matrix,
+    int64 for integer counts and float64 for (sums of) weights.
+    The rows are allocated in blocks that double in size, and
+    the tables are only built once, by `to_tables`.
+    """
+
+    def __init__(self, columns: Optional[Iterable[str]] = None) -> None:
+        self.columns = None if columns is None else pd.Index(columns)
+        self._rows: Dict[str, int] = {}
+        self._matrices: Dict[str, np.ndarray] = {}
+        self._capacity = 0
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @property
+    def processes(self) -> List[str]:
+        return list(self._rows)
+
+    def add(self, file_counts: FileCounts) -> None:
+        """Add the counts of one file (or of a part of it) to its process's row."""
+        for quantity, series in file_counts.items():
+            if self.columns is None:
+                self.columns = series.index.copy()
+            elif not series.index.equals(self.columns):
+                if set(series.index) != set(self.columns):
+                    raise ValueError(
+                        f"The counts of {series.name} are for the categories "
+                        f"{list(series.index)}, not {list(self.columns)}."
+                    )
+                series = series.reindex(self.columns)
+            values = series.to_numpy()
+            row = self._row(str(series.name))  # Before: Adding a row might grow.
+            self._matrix(quantity, values.dtype)[row] += values
+
+    def merge(self, other: "CountAccumulator") -> None:
+        """Add the counts of `other`. Its new processes are appended in its order."""
+        if other.columns is None:
+            return
+        if self.columns is None:
+            self.columns = other.columns.copy()
+        elif not other.columns.equals(self.columns):
+            raise ValueError(
+                f"Accumulators for the categories {list(other.columns)} "
+                f"and {list(self.columns)} can not be merged."
+            )
+        rows = np.array([self._row(process) for process in other._rows], dtype=int)
+        for quantity, other_matrix in other._matrices.items():
+            matrix = self._matrix(quantity, other_matrix.dtype)
+            matrix[rows] += other_matrix[: len(other)]
+
+    def to_tables(self) -> Dict[str, pd.DataFrame]:
+        """Per quantity, a table with one row per process."""
+        index = pd.Index(self.processes)
+        return {
+            quantity: pd.DataFrame(
+                matrix[: len(self)].copy(), index=index, columns=self.columns
+            )
+            for quantity, matrix in self._matrices.items()
+        }
+
+    def _row(self, process: str) -> int:
+        row = self._rows.get(process)
+        if row is not None:
+            return row
+        row = len(self._rows)
+        if row == self._capacity:
+            self._grow(max(8, 2 * self._capacity))
+        self._rows[process] = row
+        return row
+
+    def _grow(self, capacity: int) -> None:
+        for quantity, matrix in self._matrices.items():
+            grown = np.zeros((capacity, matrix.shape[1]), dtype=matrix.dtype)
+            grown[: len(self)] = matrix[: len(self)]
+            self._matrices[quantity] = grown
+        self._capacity = capacity
+
+    def _matrix(self, quantity: str, dtype: np.dtype) -> np.ndarray:
+        """The quantity's matrix, upcast to float64 once non-integer cells arrive."""
+        assert self.columns is not None
+        is_integer = dtype.kind in "iub"
+        matrix = self._matrices.get(quantity)
+        if matrix is None:
+            matrix = np.zeros(
+                (self._capacity, len(self.columns)),
+                dtype=np.int64 if is_integer else np.float64,
+            )
+            self._matrices[quantity] = matrix
+        elif not is_integer and matrix.dtype != np.float64:
+            matrix = matrix.astype(np.float64)
+            self._matrices[quantity] = matrix
+        return matrix
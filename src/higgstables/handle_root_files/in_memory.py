@@ -0,0 +1,126 @@
+"""The tables and the selected events as Python objects, without writing files.
+
+For scripts that use the results directly, e.g. for `alldecays` fits:
+
+    config = load_config("data_source/higgstables-config.yaml")
+    tables = InMemoryTables(data_source, config).tables()
+    tables["eLpR"]["count"]  # With `weight`, also "sumw" and "sumw2".
+
+The inputs are either a data source (as for the `higgstables` command)
+or, per table name, a list of files.
+The `iter_*` methods yield the results as soon as they are finished.
+The caller may stop iterating at any time: Files that have not been started
+yet are then not processed.
+"""
+import itertools
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, Mapping, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from ..config import Config
+from .count_accumulator import FileCounts
+from .root_to_table import DfFromFiles, TablesFromFiles, VarsPerTreeType
+
+FileSelection = Union[Path, str, Mapping[str, Iterable[Path]]]
+TableFiles = Dict[str, Set[Path]]
+
+
+def _split_selection(files: FileSelection) -> Tuple[Path, Optional[TableFiles]]:
+    """The data source, or (if the files are given per table) these files."""
+    if isinstance(files, (Path, str)):
+        return Path(files), None
+    table_files = {name: set(map(Path, paths)) for name, paths in files.items()}
+    return Path(), table_files
+
+
+def _with_n_files(table_files: TableFiles) -> Tuple[int, TableFiles]:
+    return len(set(itertools.chain(*table_files.values()))), table_files
+
+
+class InMemoryTables(TablesFromFiles):
+    """The count tables of `TablesFromFiles`, returned instead of written.
+
+    Nothing is done on construction. Each call of a method processes the files.
+    """
+
+    _show_progress = False
+
+    def __init__(self, files: FileSelection, config: Config, n_jobs: int = 1) -> None:
+        data_source, self._table_files = _split_selection(files)
+        super().__init__(data_source, Path(), config, n_jobs)
+
+    def build_objects(self) -> None:
+        """Nothing is built up front."""
+
+    def _find_files(self) -> Tuple[int, TableFiles]:
+        if self._table_files is None:
+            return super()._find_files()
+        return _with_n_files(self._table_files)
+
+    def iter_file_counts(self) -> Iterator[Tuple[str, FileCounts]]:
+        """Per input, the table name and the counts (see `FileToCounts.as_quantities`).
+
+        A parquet file is streamed per row group (or per `step-size`), with one
+        input per process in each. The same process can thus be yielded
+        several times: Its counts add up.
+        """
+        n_files, table_files = self._find_files()
+        with self._running(n_files):
+            for name, files in table_files.items():
+                for file_counts in self._get_file_counts(sorted(files)):
+                    yield name, file_counts
+
+    def iter_tables(self) -> Iterator[Tuple[str, Dict[str, pd.DataFrame]]]:
+        """Per table, the name and the tables per quantity."""
+        return self.iter_objects()
+
+    def tables(self) -> Dict[str, Dict[str, pd.DataFrame]]:
+        return dict(self.iter_tables())
+
+
+class InMemoryDfs(DfFromFiles):
+    """The selected events' DataFrames of `DfFromFiles`, returned instead of written.
+
+    Nothing is done on construction. Each call of a method processes the files.
+    The DataFrames are always kept in memory, also with `partitioned` under df.
+    """
+
+    _show_progress = False
+
+    def __init__(
+        self,
+        files: FileSelection,
+        config: Config,
+        vars_per_tree: VarsPerTreeType = None,
+        n_max: Union[int, None, bool] = False,
+        n_jobs: int = 1,
+    ) -> None:
+        data_source, self._table_files = _split_selection(files)
+        super().__init__(data_source, Path(), config, vars_per_tree, n_max, n_jobs)
+
+    def build_objects(self) -> None:
+        """Nothing is built up front."""
+
+    def _find_files(self) -> Tuple[int, TableFiles]:
+        if self._table_files is None:
+            return super()._find_files()
+        return _with_n_files(self._table_files)
+
+    def _collect_df(self, dfs: Iterable[pd.DataFrame], name: str) -> pd.DataFrame:
+        return self._concat_dfs(dfs, name)
+
+    def iter_file_dfs(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Per input, the table name and its selected events."""
+        n_files, table_files = self._find_files()
+        with self._running(n_files):
+            for name, files in table_files.items():
+                for df in self._get_file_dfs(sorted(files)):
+                    yield name, self._with_cross_sections(df, name)
+
+    def iter_dfs(self) -> Iterator[Tuple[str, pd.DataFrame]]:
+        """Per table, the name and the DataFrame of all its selected events."""
+        return self.iter_objects()
+
+    def dfs(self) -> Dict[str, pd.DataFrame]:
+        return dict(self.iter_dfs())
@@ -0,0 +1,82 @@
+"""Reading the per process DataFrames from parquet files (e.g. `higgstables-df`)."""
+import logging
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Set, Union
+
+import pandas as pd
+
+from ..config import Config
+from ..config.util import parse_memory_size
+
+logger = logging.getLogger(__name__)
+
+# Besides the selection variables, always needed from a parquet input.
+required_columns = {"process", "efficiency"}
+
+
+def _rows_per_batch(parquet_file, step_size: Union[int, str]) -> int:
+    if isinstance(step_size, int):
+        return step_size
+    metadata = parquet_file.metadata
+    if metadata.num_rows == 0:
+        return 1
+    row_bytes = sum(
+        metadata.row_group(i).total_byte_size for i in range(metadata.num_row_groups)
+    )
+    return max(parse_memory_size(step_size) * metadata.num_rows // row_bytes, 1)
+
+
+def _split_processes(df: pd.DataFrame) -> Iterator[pd.DataFrame]:
+    """One pass over the rows, instead of one comparison per process."""
+    for _, process_df in df.groupby("process", sort=True, observed=True):
+        yield process_df
+
+
+def iter_process_dfs(
+    file: Path,
+    columns: Optional[Iterable[str]] = None,
+    stream: bool = False,
+    step_size: Union[int, str, None] = None,
+) -> Iterator[pd.DataFrame]:
+    """The DataFrames of the processes in a parquet file.
+
+    Only `columns` (and the `required_columns`) are read, if given.
+    With `stream`, one DataFrame per process is yielded for each row group
+    (or batch of `step_size` entries or memory size) of the file.
+    A process can then be split over several DataFrames.
+    """
+    import pyarrow.parquet as pq
+
+    if not stream:
+        if columns is not None:
+            columns = list(required_columns.union(columns))
+        df = pd.read_parquet(file, columns=columns)
+        yield from _split_processes(df)
+        return
+
+    parquet_file = pq.ParquetFile(file)
+    if columns is not None:
+        wanted = required_columns.union(columns)
+        missing = wanted - set(parquet_file.schema_arrow.names)
+        if missing:
+            logger.error(f"The columns {missing} are not found in {file}.")
+            raise KeyError(missing)
+        columns = [c for c in parquet_file.schema_arrow.names if c in wanted]
+    if step_size is None:
+        for i in range(parquet_file.num_row_groups):
+            row_group = parquet_file.read_row_group(i, columns=columns)
+            yield from _split_processes(row_group.to_pandas())
+        return
+    batch_size = _rows_per_batch(parquet_file, step_size)
+    logger.debug(f"{file} is read in batches of {batch_size} rows.")
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=columns):
+        yield from _split_processes(batch.to_pandas())
+
+
+def selection_columns(configs: Iterable[Config]) -> Set[str]:
+    """The columns needed to evaluate the selection of each of the configs."""
+    columns: Set[str] = set()
+    for config in configs:
+        for variables in config.variables_per_tree(with_weights=True).values():
+            columns.update(variables)
+    return columns
@@ -0,0 +1,113 @@
+"""Streaming the selected events into a parquet dataset, partitioned by process."""
+import logging
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Dict, List, Optional, Type
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+
+class PartitionedParquetWriter:
+    """Append DataFrames to `folder/process=<process>/part-0.parquet`.
+
+    The rows are buffered per process until a row group is full, or until
+    a `write` without that process: The inputs are sorted by path, so the
+    files of a process come one after another. Across all processes,
+    at most `max_buffered_rows` (by default `row_group_size`) are buffered,
+    beyond that the largest buffers are written out.
+    The memory usage thus does not grow with the number of written rows.
+    The dataset is read back with e.g. `pd.read_parquet(folder)`,
+    the `process` column then comes from the (hive) partitioning.
+    """
+
+    def __init__(
+        self,
+        folder: Path,
+        row_group_size: Optional[int] = None,
+        compression: Optional[str] = "snappy",
+        max_buffered_rows: Optional[int] = None,
+    ) -> None:
+        self.folder = Path(folder)
+        self.folder.mkdir(parents=True, exist_ok=False)
+        # Like pyarrow's default, if not set.
+        self.row_group_size = row_group_size or 1024**2
+        self.compression = compression
+        self.max_buffered_rows = max_buffered_rows or self.row_group_size
+        self.n_rows = 0
+        self._writers: Dict[str, Any] = {}
+        self._buffers: Dict[str, List[Any]] = {}
+        self._n_buffered: Dict[str, int] = {}
+        self._schema = None
+
+    def write(self, df: pd.DataFrame) -> None:
+        """Append the rows of `df`, which must have a `process` column."""
+        import pyarrow as pa
+
+        processes = set()
+        for process, process_df in df.groupby("process", sort=False, observed=True):
+            processes.add(process)
+            table = pa.Table.from_pandas(
+                process_df.drop(columns="process"), preserve_index=False
+            )
+            if self._schema is None:
+                self._schema = table.schema
+            elif table.schema != self._schema:
+                table = table.cast(self._schema)
+            self._buffers.setdefault(process, []).append(table)
+            self._n_buffered[process] = self._n_buffered.get(process, 0) + len(table)
+            if self._n_buffered[process] >= self.row_group_size:
+                self._flush(process, only_full_row_groups=True)
+        # The inputs of the other processes are done.
+        for process in list(self._buffers):
+            if process not in processes:
+                self._flush(process)
+        while sum(self._n_buffered.values()) > self.max_buffered_rows:
+            self._flush(max(self._n_buffered, key=self._n_buffered.__getitem__))
+
+    def _flush(self, process: str, only_full_row_groups: bool = False) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.concat_tables(self._buffers.pop(process, []))
+        self._n_buffered[process] = 0
+        n_rows = len(table)
+        if only_full_row_groups:
+            n_rows -= n_rows % self.row_group_size
+            rest = table.slice(n_rows)
+            if len(rest):
+                self._buffers[process] = [rest]
+                self._n_buffered[process] = len(rest)
+            table = table.slice(0, n_rows)
+        if n_rows == 0:
+            return
+        if process not in self._writers:
+            partition = self.folder / f"process={process}"
+            partition.mkdir()
+            self._writers[process] = pq.ParquetWriter(
+                partition / "part-0.parquet",
+                table.schema,
+                compression=self.compression,
+            )
+        self._writers[process].write_table(table, row_group_size=self.row_group_size)
+        self.n_rows += n_rows
+
+    def close(self) -> None:
+        for process in list(self._buffers):
+            self._flush(process)
+        for writer in self._writers.values():
+            writer.close()
+        self._writers.clear()
+        logger.info(f"{self.n_rows} rows were written to {self.folder}.")
+
+    def __enter__(self) -> "PartitionedParquetWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        self.close()
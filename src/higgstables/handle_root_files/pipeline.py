@@ -0,0 +1,178 @@
+"""Overlapping the reading, the evaluation and the writing of consecutive files.
+
+Without worker processes, the files are handled one after the other.
+While file k is evaluated, `prefetch_ahead` opens file k+1 and reads the
+branches of its first chunk in a background thread. `BackgroundWriter` writes
+finished outputs while the next ones are built. Both keep at most one item in
+flight (backpressure), and neither changes the order of the results:
+The outputs are identical to those of the strictly sequential processing.
+"""
+import concurrent.futures
+import logging
+from pathlib import Path
+from types import TracebackType
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    Union,
+)
+
+import pandas as pd
+
+from . import profiling
+from .branch_cache import BranchCache
+
+logger = logging.getLogger(__name__)
+FileInput = Union[Path, pd.DataFrame]
+
+
+class PrefetchPlan(NamedTuple):
+    """What to read ahead for a rootfile: The branches of its first chunk."""
+
+    vars_per_tree: Dict[str, Set[str]]
+    # As used by the reader for `BranchCache.entry_ranges`.
+    chunk_vars_per_tree: Dict[str, Set[str]]
+    step_size: Union[int, str, None] = None
+
+
+class FilePrefetcher:
+    """Reads the first chunk of the upcoming rootfiles in a background thread."""
+
+    def __init__(self, plan: PrefetchPlan) -> None:
+        self._plan = plan
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="higgstables-prefetch"
+        )
+        self._pending: Dict[Path, concurrent.futures.Future] = {}
+
+    def schedule(self, rootfile_path: Path) -> None:
+        if rootfile_path not in self._pending:
+            future = self._executor.submit(self._read, rootfile_path)
+            self._pending[rootfile_path] = future
+
+    def _read(self, rootfile_path: Path) -> Tuple[BranchCache, profiling.StageProfile]:
+        profile = profiling.StageProfile(str(rootfile_path))
+        with profiling.recording(profile):
+            arrays = BranchCache(rootfile_path)
+            chunks = arrays.entry_ranges(
+                self._plan.chunk_vars_per_tree, self._plan.step_size
+            )
+            arrays.set_entry_range(*next(chunks))
+            arrays.prefetch(self._plan.vars_per_tree)
+        return arrays, profile
+
+    def take(self, rootfile_path: Path) -> Optional[BranchCache]:
+        """The prefetched arrays, if `rootfile_path` was scheduled."""
+        future = self._pending.pop(rootfile_path, None)
+        if future is None:
+            return None
+        try:
+            arrays, profile = future.result()
+        except Exception as e:
+            # The reader reads (and reports) it again.
+            logger.debug(f"Prefetching {rootfile_path} failed: {e!r}.")
+            return None
+        current = profiling.current()
+        if current is not None:
+            current.add(profile)
+        return arrays
+
+    def close(self) -> None:
+        for future in self._pending.values():
+            future.cancel()
+        self._executor.shutdown(wait=True)
+        self._pending.clear()
+
+
+_active_prefetcher: Optional[FilePrefetcher] = None
+
+
+def take_prefetched(rootfile_path: Path) -> Optional[BranchCache]:
+    """The arrays read ahead for this rootfile, within `prefetch_ahead`."""
+    if _active_prefetcher is None:
+        return None
+    return _active_prefetcher.take(rootfile_path)
+
+
+def prefetch_ahead(
+    files: Iterable[FileInput], plan: PrefetchPlan
+) -> Iterator[FileInput]:
+    """The files in order. When one is yielded, the next rootfile is read ahead.
+
+    A reader of the yielded rootfile gets its arrays from `take_prefetched`.
+    """
+    global _active_prefetcher
+    prefetcher = FilePrefetcher(plan)
+    outer_prefetcher, _active_prefetcher = _active_prefetcher, prefetcher
+    end = object()
+    try:
+        file_iter = iter(files)
+        file = next(file_iter, end)
+        while file is not end:
+            next_file = next(file_iter, end)
+            if isinstance(next_file, Path):
+                prefetcher.schedule(next_file)
+            yield file
+            file = next_file
+    finally:
+        _active_prefetcher = outer_prefetcher
+        prefetcher.close()
+
+
+class BackgroundWriter:
+    """Run the writing of outputs in a background thread, one at a time.
+
+    `submit` waits for the previous write to finish. Errors of a write
+    are raised by the next `submit`, or when the block is left.
+    The time of a write is added to the profile it was submitted from.
+    """
+
+    def __init__(self) -> None:
+        self._executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="higgstables-writer"
+        )
+        self._pending: Optional[concurrent.futures.Future] = None
+        self._submitted_from: Optional[profiling.StageProfile] = None
+
+    def submit(self, write: Callable[..., Any], *args: Any) -> None:
+        self.wait()
+        self._submitted_from = profiling.current()
+        self._pending = self._executor.submit(self._write, write, *args)
+
+    @staticmethod
+    def _write(write: Callable[..., Any], *args: Any) -> profiling.StageProfile:
+        profile = profiling.StageProfile("write")
+        with profiling.recording(profile), profiling.stage("save"):
+            write(*args)
+        return profile
+
+    def wait(self) -> None:
+        if self._pending is None:
+            return
+        pending, self._pending = self._pending, None
+        profile = pending.result()
+        if self._submitted_from is not None:
+            self._submitted_from.add(profile)
+
+    def __enter__(self) -> "BackgroundWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            self._executor.shutdown(wait=True)
@@ -0,0 +1,296 @@
+"""Where the time goes: Per stage timing of each file, for the profiling report.
+
+The processing code marks its stages with `stage`. They are only timed
+while a file (or table) is recorded, i.e. within an active `ProfileReport`.
+The times are exclusive: While a nested stage runs (e.g. an array is read
+lazily during the trigger evaluation), the outer stage is paused.
+Each thread records on its own: A background thread (see `pipeline`) records
+into its own profile, which is then added to the profile of the file.
+"""
+import contextlib
+import csv
+import json
+import logging
+import platform
+import resource
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, TypeVar
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+FileResult = TypeVar("FileResult")
+
+stage_names = [
+    "open",
+    "read",
+    "trigger",
+    "preselection",
+    "categories",
+    "aggregation",
+    "save",
+]
+
+
+def _zero_seconds() -> Dict[str, float]:
+    return dict.fromkeys(stage_names, 0.0)
+
+
+@dataclass
+class StageProfile:
+    """The stage times of a file (or, for `kind="table"`, of the merging and saving)."""
+
+    name: str
+    kind: str = "file"
+    table: str = ""
+    n_events: int = 0
+    compressed_bytes: int = 0
+    uncompressed_bytes: int = 0
+    seconds: Dict[str, float] = field(default_factory=_zero_seconds)
+    wall_seconds: float = 0.0
+    peak_rss_bytes: int = 0
+
+    def as_row(self) -> Dict[str, Any]:
+        """A flat dict, e.g. for a CSV row."""
+        row = {k: v for k, v in asdict(self).items() if k != "seconds"}
+        for name, seconds in self.seconds.items():
+            row[f"{name}_s"] = seconds
+        row["other_s"] = max(self.wall_seconds - sum(self.seconds.values()), 0.0)
+        row["events_per_s"] = _per_second(self.n_events, self.wall_seconds)
+        row["mb_per_s"] = _per_second(self.uncompressed_bytes / 1e6, self.wall_seconds)
+        return row
+
+    def add(self, other: "StageProfile") -> None:
+        """The stage times and bytes of work done for this file elsewhere."""
+        for name, seconds in other.seconds.items():
+            self.seconds[name] += seconds
+        self.compressed_bytes += other.compressed_bytes
+        self.uncompressed_bytes += other.uncompressed_bytes
+
+
+def _per_second(amount: float, seconds: float) -> float:
+    return amount / seconds if seconds > 0 else float("nan")
+
+
+def peak_rss_bytes(with_children: bool = False) -> int:
+    """The peak resident memory of this process (or of its largest child)."""
+    scale = 1 if platform.system() == "Darwin" else 1024  # Linux: Kilobytes.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if with_children:
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    return peak * scale
+
+
+class _ThreadState(threading.local):
+    """Per thread, the profiles that are recorded (innermost last), and the stages."""
+
+    def __init__(self) -> None:
+        self.recording: List[StageProfile] = []
+        self.running: List[List[Any]] = []  # [profile, stage name, start time]
+
+
+_state = _ThreadState()
+
+
+def active() -> bool:
+    return bool(_state.recording)
+
+
+def current() -> Optional[StageProfile]:
+    """The profile that is recorded in this thread (if any)."""
+    return _state.recording[-1] if _state.recording else None
+
+
+def _pause(now: float) -> None:
+    if _state.running:
+        profile, name, start = _state.running[-1]
+        profile.seconds[name] += now - start
+
+
+def _resume(now: float) -> None:
+    if _state.running:
+        _state.running[-1][2] = now
+
+
+@contextlib.contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time this block as stage `name` of the file that is recorded (if any)."""
+    if not _state.recording:
+        yield
+        return
+    now = time.perf_counter()
+    _pause(now)
+    _state.running.append([_state.recording[-1], name, now])
+    try:
+        yield
+    finally:
+        now = time.perf_counter()
+        _pause(now)
+        _state.running.pop()
+        _resume(now)
+
+
+def add_events(n_events: int) -> None:
+    if _state.recording:
+        _state.recording[-1].n_events += int(n_events)
+
+
+def add_bytes(compressed: int, uncompressed: int) -> None:
+    if _state.recording:
+        _state.recording[-1].compressed_bytes += int(compressed)
+        _state.recording[-1].uncompressed_bytes += int(uncompressed)
+
+
+@contextlib.contextmanager
+def recording(profile: StageProfile) -> Iterator[StageProfile]:
+    """The stages within this block are attributed to `profile`."""
+    start = time.perf_counter()
+    _pause(start)
+    _state.recording.append(profile)
+    # Outside of the block's own stages, nothing of the outer profile runs.
+    outer_running, _state.running[:] = list(_state.running), []
+    try:
+        yield profile
+    finally:
+        now = time.perf_counter()
+        _state.recording.pop()
+        _state.running[:] = outer_running
+        _resume(now)
+        profile.wall_seconds += now - start
+        profile.peak_rss_bytes = max(profile.peak_rss_bytes, peak_rss_bytes())
+
+
+def _input_name(file: Any) -> str:
+    if isinstance(file, pd.DataFrame):
+        process = file["process"].iloc[0] if len(file) else "empty"
+        return f"{process} (DataFrame)"
+    return str(file)
+
+
+def profiled(
+    per_file: Callable[[Any, Any], FileResult], file: Any, shared: Any
+) -> Tuple[FileResult, StageProfile]:
+    """Module level, such that it can be sent to worker processes."""
+    with recording(StageProfile(_input_name(file))) as profile:
+        result = per_file(file, shared)
+    return result, profile
+
+
+_active_report: Optional["ProfileReport"] = None
+
+
+def active_report() -> Optional["ProfileReport"]:
+    return _active_report
+
+
+class ProfileReport:
+    """Collects the stage profiles of the files and tables built within the block.
+
+    Use as context manager, e.g. around `TablesFromFiles(...)`.
+    """
+
+    json_name = "higgstables-profile.json"
+    csv_name = "higgstables-profile.csv"
+
+    def __init__(self) -> None:
+        self.files: List[StageProfile] = []
+        self.tables: List[StageProfile] = []
+        self.wall_seconds = 0.0
+        self.peak_rss_bytes = 0
+        self._table: Optional[StageProfile] = None
+        self._start = 0.0
+
+    def __enter__(self) -> "ProfileReport":
+        global _active_report
+        _active_report = self
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        global _active_report
+        _active_report = None
+        self.wall_seconds = time.perf_counter() - self._start
+        self.peak_rss_bytes = peak_rss_bytes(with_children=True)
+
+    @contextlib.contextmanager
+    def table(self, name: str) -> Iterator[StageProfile]:
+        """The merging and saving of a table. Its files are recorded on their own."""
+        self._table = StageProfile(name, kind="table", table=name)
+        try:
+            with recording(self._table) as profile:
+                yield profile
+        finally:
+            self.tables.append(self._table)
+            self._table = None
+
+    def add_file(self, profile: StageProfile) -> None:
+        if self._table is not None:
+            profile.table = self._table.name
+        self.files.append(profile)
+
+    def rows(self) -> List[Dict[str, Any]]:
+        return [p.as_row() for p in self.files + self.tables]
+
+    def totals(self) -> Dict[str, Any]:
+        profiles = self.files + self.tables
+        seconds = _zero_seconds()
+        for profile in profiles:
+            for name, value in profile.seconds.items():
+                seconds[name] += value
+        n_events = sum(p.n_events for p in self.files)
+        uncompressed = sum(p.uncompressed_bytes for p in self.files)
+        return {
+            "n_files": len(self.files),
+            "n_events": n_events,
+            "compressed_bytes": sum(p.compressed_bytes for p in self.files),
+            "uncompressed_bytes": uncompressed,
+            "seconds": seconds,
+            "wall_seconds": self.wall_seconds,
+            "events_per_s": _per_second(n_events, self.wall_seconds),
+            "mb_per_s": _per_second(uncompressed / 1e6, self.wall_seconds),
+            "peak_rss_bytes": self.peak_rss_bytes,
+        }
+
+    def write(self, folder: Path) -> None:
+        """The report as `higgstables-profile.json` and `.csv` (one row per file)."""
+        with (folder / self.json_name).open("w") as f:
+            json.dump(
+                {
+                    "totals": self.totals(),
+                    "files": [asdict(p) for p in self.files],
+                    "tables": [asdict(p) for p in self.tables],
+                },
+                f,
+                indent=2,
+            )
+        rows = self.rows()
+        if rows:
+            with (folder / self.csv_name).open("w", newline="") as f:
+                writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+                writer.writeheader()
+                writer.writerows(rows)
+        logger.info(f"The profiling report was written to {folder / self.json_name}.")
+
+    def summary(self) -> str:
+        """A table of the time spent per stage, summed over the files and tables.
+
+        With worker processes (or the read ahead and background writing of a
+        single process), the stage times add up to more than the wall time.
+        """
+        totals = self.totals()
+        stage_sum = sum(totals["seconds"].values())
+        lines = [f"{'stage':<14}{'time [s]':>10}{'share':>8}"]
+        for name, seconds in totals["seconds"].items():
+            share = seconds / stage_sum if stage_sum else 0.0
+            lines.append(f"{name:<14}{seconds:>10.3f}{share:>8.1%}")
+        lines.append(
+            f"{totals['n_files']} files, {totals['n_events']} events "
+            f"in {totals['wall_seconds']:.2f} s: "
+            f"{totals['events_per_s']:.0f} events/s, "
+            f"{totals['mb_per_s']:.1f} MB/s (uncompressed), "
+            f"peak RSS {totals['peak_rss_bytes'] / 1e6:.0f} MB."
+        )
+        return "\n".join(lines)
@@ -0,0 +1,97 @@
+"""On-disk cache of the category counts per rootfile."""
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Optional
+
+import pandas as pd
+
+from ..config import Config
+from ..version import __version__
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Per-file `FileToCounts.as_quantities`, keyed by file and selection fingerprints.
+
+    A file's entry is reused as long as the file (path, size, modification time),
+    the selection part of the config and the higgstables version are unchanged.
+    When the cache grows beyond `max_size` bytes,
+    the least recently used entries are removed.
+    """
+
+    def __init__(
+        self, cache_dir: Path, config: Config, max_size: Optional[int] = None
+    ) -> None:
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._selection_fingerprint = config.selection_fingerprint()
+        self.n_hits = 0
+        self.n_misses = 0
+
+    def key(self, rootfile: Path) -> str:
+        rootfile = rootfile.absolute()
+        stat = rootfile.stat()
+        content = [
+            __version__,
+            self._selection_fingerprint,
+            str(rootfile),
+            stat.st_size,
+            stat.st_mtime_ns,
+        ]
+        return hashlib.sha256(json.dumps(content).encode()).hexdigest()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, rootfile: Path) -> Optional[Dict[str, pd.Series]]:
+        entry_path = self._entry_path(self.key(rootfile))
+        try:
+            with entry_path.open() as f:
+                entry = json.load(f)
+            quantities = entry["quantities"]
+        except (FileNotFoundError, json.JSONDecodeError, KeyError):
+            self.n_misses += 1
+            return None
+        os.utime(entry_path)  # The modification time is used for LRU eviction.
+        self.n_hits += 1
+        return {
+            quantity: pd.Series(row_cells, name=entry["name"])
+            for quantity, row_cells in quantities.items()
+        }
+
+    def put(self, rootfile: Path, quantities: Dict[str, pd.Series]) -> None:
+        entry_path = self._entry_path(self.key(rootfile))
+        entry_path.parent.mkdir(exist_ok=True)
+        entry = {
+            "file": str(rootfile.absolute()),
+            "name": quantities["count"].name,
+            "quantities": {
+                quantity: dict(zip(series.index, series.tolist()))
+                for quantity, series in quantities.items()
+            },
+        }
+        tmp_path = entry_path.with_suffix(f".tmp{os.getpid()}")
+        with tmp_path.open("w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, entry_path)  # Atomic: No partial entries are read.
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until `max_size` is respected."""
+        if self.max_size is None:
+            return
+        entries = [(p, p.stat()) for p in self.cache_dir.glob("*/*.json")]
+        total_size = sum(stat.st_size for _, stat in entries)
+        n_evicted = 0
+        for entry_path, stat in sorted(entries, key=lambda e: e[1].st_mtime_ns):
+            if total_size <= self.max_size:
+                break
+            entry_path.unlink()
+            total_size -= stat.st_size
+            n_evicted += 1
+        if n_evicted:
+            logger.info(f"{n_evicted} entries were evicted from {self.cache_dir}.")
@@ -1,22 +1,46 @@
 """The working horse: Gets counts out of rootfiles into the .csv tables."""
+import collections
+import concurrent.futures
+import contextlib
+import functools
 import itertools
 import logging
 import warnings
-from collections import defaultdict
+import zlib
 from pathlib import Path
-from typing import DefaultDict, Dict, Iterator, List, Optional, Set, Tuple, Union
+from typing import (
+    Any,
+    Callable,
+    ContextManager,
+    Deque,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+    Union,
+)
 
-import numexpr
 import numpy as np
 import pandas as pd
 import tqdm
-import uproot
 from tqdm.contrib.logging import logging_redirect_tqdm
 
-from ..config import Config, Trigger
+from ..config import Clause, Config, Trigger
+from . import compaction, pipeline, profiling
+from .branch_cache import BranchCache, EntryRange, _compressed_bytes
+from .count_accumulator import CountAccumulator, FileCounts
+from .parquet_input import iter_process_dfs, selection_columns
+from .parquet_output import PartitionedParquetWriter
+from .result_cache import ResultCache
 
 logger = logging.getLogger(__name__)
 KeepMaskType = Optional["np.ndarray[np.bool_]"]
+FileResult = TypeVar("FileResult")
 
 
 def _get_process_name(path: Path) -> str:
@@ -30,12 +54,27 @@ class FileToSelected:
         self,
         rootfile_path: Union[Path, pd.DataFrame],
         config: Config,
+        arrays: Optional[BranchCache] = None,
+        entry_range: Optional[EntryRange] = None,
     ) -> None:
+        """Select the entries of a rootfile (or of a single process DataFrame).
+
+        Providing `arrays` allows to share the read branches with other objects.
+        With `entry_range`, only these entries are considered,
+        instead of the whole file (possibly in chunks of `config.step_size`).
+        """
         self._rootfile_path = rootfile_path
         self._config = config
+        self._entry_range = entry_range
 
         if isinstance(self._rootfile_path, Path):
-            self._rootfile = uproot.open(self._rootfile_path)
+            self._owns_arrays = arrays is None
+            if arrays is None:
+                arrays = pipeline.take_prefetched(self._rootfile_path)
+            if arrays is None:
+                arrays = BranchCache(self._rootfile_path, config.max_memory)
+            self._arrays = arrays
+            self._rootfile = arrays.rootfile
             self.name = _get_process_name(self._rootfile_path)
         elif isinstance(self._rootfile_path, pd.DataFrame):
             df = self._rootfile_path
@@ -46,51 +85,224 @@ class FileToSelected:
         else:
             raise NotImplementedError(type(self._rootfile_path))
 
-        self._loaded_arrays: DefaultDict = defaultdict(dict)
-        self.row_cells: Dict[str, int] = {}
+        self._clause_masks: Dict[Tuple, np.ndarray] = {}
+        # Per branch, the clauses that still need it (for the current range).
+        self._pending_users: Dict[Tuple[str, str], Set] = {}
+        self.row_cells: Dict[str, int] = {"unselected": 0}
+        # The sums of weights (and of squared weights), if `config.weight` is used.
+        self.sumw: Optional[Dict[str, float]] = None
+        self.sumw2: Optional[Dict[str, float]] = None
+        if self._needs_weights():
+            self.sumw = {"unselected": 0.0}
+            self.sumw2 = {"unselected": 0.0}
+
+        self._evaluate_file()
+
+    def _evaluate_file(self) -> None:
+        self._keep_mask = self.select(*(self._entry_range or (None, None)))
+
+    def select(
+        self, entry_start: Optional[int] = None, entry_stop: Optional[int] = None
+    ) -> KeepMaskType:
+        """Run the triggers and preselections on the entries in the given range.
+
+        Without a range, the whole file is used.
+        Arrays loaded for a previous range are released.
+        """
+        self._clause_masks.clear()
+        if not isinstance(self._rootfile_path, pd.DataFrame):
+            self._arrays.set_entry_range(entry_start, entry_stop)
+            self._arrays.prefetch(
+                self._config.variables_per_tree(
+                    self._needs_categories(), self._needs_weights()
+                )
+            )
+            self._pending_users = self._get_pending_users()
+        if isinstance(self._rootfile_path, pd.DataFrame) or self._owns_arrays:
+            # Shared arrays: The events are counted by the owner.
+            profiling.add_events(self._n_entries(entry_start, entry_stop))
+        # Histograms hold file level information: Only count them once.
+        with profiling.stage("trigger"):
+            n_not_triggered = self.run_triggers(with_histograms=not entry_start)
+        with profiling.stage("preselection"):
+            n_not_preselected, keep_mask = self.run_preselections()
+        self.row_cells["unselected"] += n_not_triggered + n_not_preselected
+        if self.sumw is not None:
+            self._add_unselected_weights(not entry_start, keep_mask)
+        return keep_mask
+
+    def _n_entries(
+        self, entry_start: Optional[int] = None, entry_stop: Optional[int] = None
+    ) -> int:
+        """The number of entries (of the categories tree) in the range."""
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            n_entries = len(self._rootfile_path)
+        else:
+            n_entries = self._arrays.tree(self._config.categories_tree).num_entries
+        stop = n_entries if entry_stop is None else min(entry_stop, n_entries)
+        return max(stop - (entry_start or 0), 0)
+
+    def _entry_ranges(self) -> Iterator[EntryRange]:
+        """Split the file into chunks of `config.step_size` entries (or bytes)."""
+        if self._entry_range is not None:
+            yield self._entry_range
+        elif isinstance(self._rootfile_path, pd.DataFrame):
+            yield None, None
+        else:
+            yield from self._arrays.entry_ranges(
+                self._config.variables_per_tree(), self._config.step_size
+            )
+
+    def _get_pending_users(self) -> Dict[Tuple[str, str], Set]:
+        """The branches to release after their last clause, if the arrays are ours.
+
+        Shared arrays might still be needed by others. The weights are kept.
+        """
+        if not self._owns_arrays:
+            return {}
+        users = self._config.branch_users(self._needs_categories())
+        if self._needs_weights():
+            for var_tree in self._config._weighted_trees():
+                users.pop((var_tree, self._config.weight_branch(var_tree)), None)
+        return users
 
-        n_not_triggered = self.run_triggers()
-        n_not_preselected, self._keep_mask = self.run_preselections()
-        self.row_cells["unselected"] = n_not_triggered + n_not_preselected
+    def _release_arrays(self) -> None:
+        self._clause_masks.clear()
+        self._pending_users = {}
+        if not isinstance(self._rootfile_path, pd.DataFrame) and self._owns_arrays:
+            arrays = self._arrays
+            logger.debug(
+                f"{self.name}: At most {arrays.peak_bytes / 1e6:.2f} MB of arrays "
+                f"were held, with {arrays.n_evicted} evictions "
+                f"and {arrays.n_reread} re-reads."
+            )
+            arrays.clear()
+
+    def _needs_categories(self) -> bool:
+        return False
+
+    def _needs_weights(self) -> bool:
+        return False
+
+    def _reset_category_counts(self) -> None:
+        for name in self._config.categories:
+            self.row_cells[name] = 0
+            if self.sumw is not None and self.sumw2 is not None:
+                self.sumw[name] = 0.0
+                self.sumw2[name] = 0.0
+
+    def _add_category_counts(self, index: np.ndarray) -> None:
+        """Count the current entries per category (-1 in `index`: in none)."""
+        n_categories = len(self._config.categories)
+        # Shift by one: The first bin collects the entries without a category.
+        counts = np.bincount(index + 1, minlength=n_categories + 1)[1:]
+        for name, count in zip(self._config.categories, counts):
+            self.row_cells[name] += count
+        if self.sumw is None or self.sumw2 is None:
+            return
+        w = self._get_weights(self._config.categories_tree).astype(np.float64)
+        sumw = np.bincount(index + 1, weights=w, minlength=n_categories + 1)[1:]
+        sumw2 = np.bincount(index + 1, weights=w**2, minlength=n_categories + 1)[1:]
+        for name, w_sum, w2_sum in zip(self._config.categories, sumw, sumw2):
+            self.sumw[name] += w_sum
+            self.sumw2[name] += w2_sum
+
+    def as_quantities(self) -> Dict[str, pd.Series]:
+        """The counts, and with `config.weight` also the sums of (squared) weights."""
+        quantities = {"count": pd.Series(self.row_cells, name=self.name)}
+        if self.sumw is not None and self.sumw2 is not None:
+            quantities["sumw"] = pd.Series(self.sumw, name=self.name)
+            quantities["sumw2"] = pd.Series(self.sumw2, name=self.name)
+        return quantities
+
+    def _get_weights(self, var_tree: str) -> np.ndarray:
+        branch = self._config.weight_branch(var_tree)
+        assert branch is not None, f"No weight branch for {var_tree}."
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            return self._rootfile_path[branch].values
+        return self._arrays.get(var_tree, branch)
+
+    def _add_unselected_weights(
+        self, with_histograms: bool, keep_mask: KeepMaskType
+    ) -> None:
+        """The weighted counterpart of `run_triggers` and `run_preselections`.
+
+        Histogram triggers contribute their bin contents, both to sumw and sumw2.
+        """
+        assert self.sumw is not None and self.sumw2 is not None
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            # The entries that did not pass are not part of the DataFrame.
+            self.sumw["unselected"] = self.sumw2["unselected"] = float("nan")
+            return
+        not_selected: List[Tuple[np.ndarray, str]] = []
+        if with_histograms:
+            n_not_selected = self._n_not_triggered_histograms()
+            self.sumw["unselected"] += n_not_selected
+            self.sumw2["unselected"] += n_not_selected
+        for trigger in self._config.triggers:
+            if trigger.type == Trigger._default_type:
+                mask = self._get_condition_mask(trigger)
+                not_selected.append((~mask, trigger.tree))
+        if keep_mask is not None:
+            # The preselections act on the entries of the categories tree.
+            not_selected.append((~keep_mask, self._config.categories_tree))
+        for mask, var_tree in not_selected:
+            w = self._get_weights(var_tree)[mask].astype(np.float64)
+            self.sumw["unselected"] += np.sum(w)
+            self.sumw2["unselected"] += np.sum(w**2)
 
-    def _get_array_dict(self, selector: Trigger) -> Dict["str", np.ndarray]:
+    def _get_array_dict(
+        self, selector: Union[Trigger, Clause]
+    ) -> Dict["str", np.ndarray]:
         local_arrays = {}
         for var in selector.variables:
             if isinstance(self._rootfile_path, pd.DataFrame):
                 local_arrays[var] = self._rootfile_path[var].values
                 continue
             var_tree = selector.out_of_tree_variables.get(var, selector.tree)
-            if var not in self._loaded_arrays[var_tree]:
-                try:
-                    array = self._rootfile[var_tree][var].array(library="np")
-                except KeyError as e:
-                    logger.error(
-                        f"{var} not found in {var_tree} of {self._rootfile_path}"
-                    )
-                    raise e
-                self._loaded_arrays[var_tree][var] = array
-            local_arrays[var] = self._loaded_arrays[var_tree][var]
+            local_arrays[var] = self._arrays.get(var_tree, var)
         return local_arrays
 
-    def run_triggers(self) -> int:
+    def run_triggers(
+        self, with_histograms: bool = True, n_entries: Optional[int] = None
+    ) -> float:
+        """The number of entries that did not pass the triggers.
+
+        With `n_entries`, only the first entries of the current range are considered.
+        """
         if isinstance(self._rootfile_path, pd.DataFrame):
+            # Estimated from the efficiency: Not an integer for a part of the process.
             c = self._rootfile_path["efficiency"]
             assert np.std(c) < 1e-10, f"{np.std(c)}\n{c}"
             trigger_efficiency = np.mean(c)
-            return int(len(self._rootfile_path) / trigger_efficiency)
+            n_selected = len(self._rootfile_path)
+            return n_selected / trigger_efficiency - n_selected
+        n_not_selected = self._n_not_triggered_histograms() if with_histograms else 0
+        for trigger in self._config.triggers:
+            if trigger.type == Trigger._default_type:
+                mask = self._get_condition_mask(trigger)[:n_entries]
+                n_not_selected += mask.shape[0] - np.sum(mask)
+            elif trigger.type != "histogram":
+                raise NotImplementedError(trigger.type)
+        return n_not_selected
+
+    def _n_not_triggered_histograms(self) -> Union[int, float]:
+        """The file level part of `run_triggers`.
+
+        Histograms store their bin contents as floats. Whole numbers are
+        counted as integers, such that the count table stays int64.
+        """
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            return 0
         n_not_selected = 0
         for trigger in self._config.triggers:
             if trigger.type == "histogram":
                 bin_counts = self._rootfile[trigger.tree].to_numpy()[0]
+                if np.all(bin_counts == np.round(bin_counts)):
+                    bin_counts = bin_counts.astype(np.int64)
                 n_before_trigger = np.sum(bin_counts)
                 n_after_trigger = np.sum(bin_counts[trigger.condition])
-                n_not_selected_in_step = n_before_trigger - n_after_trigger
-                n_not_selected += n_not_selected_in_step
-            elif trigger.type == Trigger._default_type:
-                mask = self._get_condition_mask(trigger)
-                n_not_selected += mask.shape[0] - np.sum(mask)
-            else:
-                raise NotImplementedError(trigger.type)
+                n_not_selected += n_before_trigger - n_after_trigger
         return n_not_selected
 
     def run_preselections(self) -> Tuple[int, KeepMaskType]:
@@ -106,11 +318,94 @@ class FileToSelected:
             n_not_preselected = 0
         return n_not_preselected, keep_mask
 
-    def _get_condition_mask(self, selector: Trigger) -> "np.ndarray[np.bool_]":
-        local_arrays = self._get_array_dict(selector)
-        mask = numexpr.evaluate(selector.condition, local_arrays)
+    def _get_clause_mask(self, clause: Clause) -> "np.ndarray[np.bool_]":
+        """Each unique clause is evaluated only once for the current entries.
+
+        The returned mask is shared: It must not be modified in place.
+        """
+        mask = self._clause_masks.get(clause.key)
+        if mask is None:
+            mask = clause.expression(self._get_array_dict(clause))
+            self._clause_masks[clause.key] = mask
+            self._release_unused_branches(clause)
         return mask
 
+    def _release_unused_branches(self, clause: Clause) -> None:
+        """Drop the arrays of which this was the last clause to be evaluated."""
+        for var in clause.variables:
+            branch = (clause.out_of_tree_variables.get(var, clause.tree), var)
+            users = self._pending_users.get(branch)
+            if users is None:
+                continue
+            users.discard(clause.key)
+            if not users:
+                del self._pending_users[branch]
+                self._arrays.release(*branch)
+
+    def _get_condition_mask(self, selector: Trigger) -> "np.ndarray[np.bool_]":
+        masks = [self._get_clause_mask(clause) for clause in selector.clauses]
+        if len(masks) == 1:
+            return masks[0].copy()
+        return np.logical_and.reduce(masks)
+
+    def _compacts_categories(self) -> bool:
+        """Whether `category_index` may evaluate clauses for only some entries."""
+        return self._config.compaction_threshold is not None
+
+    def _get_branch(self, var_tree: str, var: str) -> np.ndarray:
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            return self._rootfile_path[var].values
+        return self._arrays.get(var_tree, var)
+
+    def _n_current_entries(self) -> int:
+        if isinstance(self._rootfile_path, pd.DataFrame):
+            return len(self._rootfile_path)
+        return self._n_entries(*self._arrays.entry_range)
+
+    def category_index(self, keep_mask: KeepMaskType = None) -> np.ndarray:
+        """Per entry, the index of the first category that applies.
+
+        Entries that are in no category or not in `keep_mask` get -1.
+        By default, the clauses are evaluated only for the undecided entries
+        (see `compaction`). Else, the categories are combined from their clause
+        masks in a single pass (or a few, for very many clauses).
+        """
+        with profiling.stage("categories"):
+            if self._compacts_categories():
+                return self._compacted_category_index(keep_mask)
+            steps = self._config.category_index_steps()
+            index = None
+            for i, step in enumerate(steps):
+                local_arrays = {
+                    c.mask_name: self._get_clause_mask(c) for c in step.clauses
+                }
+                for mask_name, trigger in step.combined.items():
+                    local_arrays[mask_name] = self._get_condition_mask(trigger)
+                if index is not None:
+                    local_arrays[self._config.previous_index_variable] = index
+                if keep_mask is not None and i == len(steps) - 1:
+                    local_arrays[self._config.keep_mask_variable] = keep_mask
+                    index = step.with_keep_mask(local_arrays)
+                else:
+                    index = step.expression(local_arrays)
+            assert index is not None, "There must be at least one category."
+            return index.astype(self._config.category_index_dtype, copy=False)
+
+    def _compacted_category_index(self, keep_mask: KeepMaskType) -> np.ndarray:
+        threshold = self._config.compaction_threshold
+        assert threshold is not None
+        return compaction.compacted_category_index(
+            [t for _, t in self._config.categories_wrapped_as_triggers()],
+            len(keep_mask) if keep_mask is not None else self._n_current_entries(),
+            keep_mask,
+            self._get_branch,
+            self._clause_masks,
+            self._config.clause_statistics,
+            threshold,
+            self._release_unused_branches,
+            self._config.category_index_dtype,
+        )
+
 
 class FileToCounts(FileToSelected):
     """From a single rootfile, extract the counts per category."""
@@ -119,32 +414,127 @@ class FileToCounts(FileToSelected):
         self,
         rootfile_path: Path,
         config: Config,
+        arrays: Optional[BranchCache] = None,
+        entry_range: Optional[EntryRange] = None,
     ) -> None:
-        super().__init__(rootfile_path, config)
-        self.fill_categories(self._keep_mask)
+        super().__init__(rootfile_path, config, arrays, entry_range)
+
+    def _needs_categories(self) -> bool:
+        return True
+
+    def _needs_weights(self) -> bool:
+        return self._config.weight is not None
+
+    def _evaluate_file(self) -> None:
+        """Stream through the file: Add up the counts chunk by chunk.
+
+        The counts are the same for any chunking (`config.step_size`).
+        """
+        self._reset_category_counts()
+        for entry_start, entry_stop in self._entry_ranges():
+            keep_mask = self.select(entry_start, entry_stop)
+            with profiling.stage("aggregation"):
+                self.fill_categories(keep_mask)
+        self._release_arrays()
 
     def fill_categories(self, keep_mask: KeepMaskType = None) -> None:
-        for name, selection in self._config.categories_wrapped_as_triggers():
-            is_in_category = self._get_condition_mask(selection)
-            if keep_mask is None:
-                keep_mask = np.ones_like(is_in_category, dtype=bool)
-            self.row_cells[name] = np.sum(keep_mask & is_in_category)
-            keep_mask = keep_mask & np.logical_not(is_in_category)
+        """Add the counts of the currently selected entries to `row_cells`."""
+        self._add_category_counts(self.category_index(keep_mask))
 
     def as_series(self) -> pd.Series:
         return pd.Series(self.row_cells, name=self.name)
 
 
+class FileToScanCounts(FileToSelected):
+    """From a single rootfile, the counts per category for each `config.scan` value.
+
+    Only the scanned category's membership depends on the threshold.
+    The counts for all thresholds are therefore obtained from the sorted values
+    of the scanned variable, without re-evaluating the categories per threshold.
+    """
+
+    def __init__(self, rootfile_path: Path, config: Config) -> None:
+        if config.scan is None:
+            raise ValueError("A `scan` entry is needed in the config.")
+        self._scan = config.scan
+        super().__init__(rootfile_path, config)
+
+    def _needs_categories(self) -> bool:
+        return True
+
+    def _compacts_categories(self) -> bool:
+        """The scan needs the (full) clause masks of its category."""
+        return False
+
+    def _evaluate_file(self) -> None:
+        n_categories = len(self._config.categories)
+        self.counts = np.zeros((len(self._scan.values), n_categories), dtype=np.int64)
+        for entry_start, entry_stop in self._entry_ranges():
+            keep_mask = self.select(entry_start, entry_stop)
+            with profiling.stage("aggregation"):
+                self.fill_scan(keep_mask)
+        self._release_arrays()
+
+    def fill_scan(self, keep_mask: KeepMaskType = None) -> None:
+        """Add the counts of the currently selected entries to `counts`."""
+        scan = self._scan
+        n_categories = len(self._config.categories)
+        x = self._get_array_dict(scan.clause)[scan.variable]
+        # The first-match index as if the scanned category never applied.
+        self._clause_masks[scan.clause.key] = np.zeros(len(x), dtype=bool)
+        index = self.category_index(keep_mask).astype(np.int64)
+        del self._clause_masks[scan.clause.key]
+
+        # Entries that fall into the scanned category if they pass the threshold.
+        if scan.other_clauses:
+            candidate = np.logical_and.reduce(
+                [self._get_clause_mask(c) for c in scan.other_clauses]
+            )
+        else:
+            candidate = np.ones(len(x), dtype=bool)
+        candidate &= (index < 0) | (index > scan.category_position)
+        if keep_mask is not None:
+            candidate &= keep_mask
+        x = x[candidate].astype(np.float64)
+        candidate[candidate] = ~np.isnan(x)  # NaN never passes a threshold.
+        x = x[~np.isnan(x)]
+
+        # Shift by one: The first bin collects the entries without a category.
+        fixed = np.bincount(index[~candidate] + 1, minlength=n_categories + 1)[1:]
+        self.counts += fixed
+        fallback = index[candidate]
+        for category in np.unique(fallback):
+            n_passing = scan.n_passing(np.sort(x[fallback == category]))
+            self.counts[:, scan.category_position] += n_passing
+            if category >= 0:
+                self.counts[:, category] += np.sum(fallback == category) - n_passing
+
+    def as_df(self) -> pd.DataFrame:
+        """One row per threshold, the columns as in `FileToCounts.as_series`."""
+        df = pd.DataFrame(
+            self.counts,
+            index=pd.Index(self._scan.values, name="threshold"),
+            columns=list(self._config.categories),
+        )
+        df.insert(0, "unselected", self.row_cells["unselected"])
+        df.name = self.name
+        return df
+
+
 def _get_entry_stop(
     keep_mask: KeepMaskType = None, n_max: Optional[int] = None
 ) -> Optional[int]:
-    entry_stop = n_max
-    if n_max is not None and n_max >= 0 and keep_mask is not None:
-        try:
-            entry_stop = np.nonzero(np.cumsum(keep_mask) == n_max)[0][0] + 1
-        except IndexError:
-            entry_stop = -1
-    return entry_stop
+    """The entries to read for `n_max` selected entries (None: all entries)."""
+    if n_max is None or n_max < 0:
+        return None
+    if keep_mask is None:
+        return n_max
+    selected = np.flatnonzero(keep_mask)
+    if n_max == 0:
+        return 0
+    if len(selected) < n_max:
+        return None
+    return int(selected[n_max - 1]) + 1
 
 
 VarsPerTreeType = Optional[Dict[str, Optional[List[str]]]]
@@ -168,7 +558,16 @@ def _validate_vars_per_tree(
 
 
 class FileToDf(FileToSelected):
-    """From a single rootfile, build the DataFrame of selected events."""
+    """From a single rootfile, build the DataFrame of selected events.
+
+    With `n_max`, the file is evaluated in growing windows of entries,
+    until `n_max` entries are selected. The efficiency is then extrapolated
+    from the evaluated part of the file.
+    With `sample-seed` under df, a reproducible random subsample
+    of `n_max` selected entries is taken instead (from the whole file).
+    """
+
+    _first_window = 10_000
 
     def __init__(
         self,
@@ -177,8 +576,113 @@ class FileToDf(FileToSelected):
         n_max: Optional[int] = None,
         vars_per_tree: VarsPerTreeType = None,
     ) -> None:
+        self._n_max = n_max
+        # Filled in `_evaluate_file`.
+        self._evaluated_fraction = 1.0
+        self._n_selected_evaluated = 0
+        self._category_index: Optional[np.ndarray] = None
         super().__init__(rootfile_path, config)
-        self._df = self.fill_df(self._keep_mask, n_max, vars_per_tree)
+        with profiling.stage("aggregation"):
+            self._df = self.fill_df(self._keep_mask, n_max, vars_per_tree)
+
+    def _needs_categories(self) -> bool:
+        return self._needs_category_column()
+
+    def _evaluate_file(self) -> None:
+        stops_early = (
+            self._n_max is not None
+            and self._n_max >= 0
+            and self._config.df_sample_seed is None
+            and isinstance(self._rootfile_path, Path)
+        )
+        if stops_early:
+            self._evaluate_windows()
+        else:
+            self._keep_mask = self.select()
+            if self._keep_mask is None:
+                self._n_selected_evaluated = self._n_entries()
+            else:
+                self._n_selected_evaluated = int(np.sum(self._keep_mask))
+            if self._needs_categories():
+                self._category_index = self.category_index()
+        self._release_arrays()
+
+    def _evaluate_windows(self) -> None:
+        """Select in windows of doubling size, until `n_max` entries are selected."""
+        assert self._n_max is not None
+        n_entries = self._n_entries()
+        keep_parts: List[np.ndarray] = []
+        index_parts: List[np.ndarray] = []
+        n_selected = 0
+        start, size = 0, max(self._n_max, self._first_window)
+        while True:
+            stop = min(start + size, n_entries)
+            n_unselected_before = self.row_cells["unselected"]
+            keep = self.select(start, stop)
+            if keep is None:
+                keep = np.ones(stop - start, dtype=bool)
+            n_missing = self._n_max - n_selected
+            if np.sum(keep) >= n_missing:
+                # Stop right after the last needed entry. Only count up to there.
+                n_evaluated = (
+                    np.flatnonzero(keep)[n_missing - 1] + 1 if n_missing else 0
+                )
+                keep = keep[:n_evaluated]
+                stop = start + n_evaluated
+                self.row_cells["unselected"] = (
+                    n_unselected_before
+                    + self.run_triggers(
+                        with_histograms=not start, n_entries=n_evaluated
+                    )
+                    + (n_evaluated - np.sum(keep))
+                )
+            keep_parts.append(keep)
+            if self._needs_categories():
+                index_parts.append(self.category_index()[: len(keep)])
+            n_selected += int(np.sum(keep))
+            if n_selected >= self._n_max or stop >= n_entries:
+                break
+            start, size = stop, 2 * size
+        logger.debug(
+            f"{stop} of {n_entries} entries evaluated for {self._n_max} selected "
+            f"entries in {self._rootfile_path}."
+        )
+        self._keep_mask = np.concatenate(keep_parts)
+        self._n_selected_evaluated = n_selected
+        self._evaluated_fraction = stop / n_entries if n_entries else 1.0
+        if self._needs_categories():
+            self._category_index = np.concatenate(index_parts)
+
+    def efficiency(self) -> float:
+        """The selected fraction of the events in the file.
+
+        If only a part of the file was evaluated, the entries of the trees
+        are extrapolated to the whole file. The file level histogram triggers
+        are scaled down to the evaluated part instead.
+        """
+        n_histograms = self._n_not_triggered_histograms()
+        n_unselected_in_trees = self.row_cells["unselected"] - n_histograms
+        n_total = (
+            self._n_selected_evaluated
+            + n_unselected_in_trees
+            + n_histograms * self._evaluated_fraction
+        )
+        if n_total == 0:
+            return float("nan")
+        return self._n_selected_evaluated / n_total
+
+    def _sample(self, keep_mask: KeepMaskType, n_max: int) -> np.ndarray:
+        """A reproducible random choice of `n_max` of the selected entries."""
+        if keep_mask is None:
+            keep_mask = np.ones(self._n_entries(), dtype=bool)
+        selected = np.flatnonzero(keep_mask)
+        if len(selected) <= n_max:
+            return keep_mask
+        seed = [self._config.df_sample_seed, zlib.crc32(self.name.encode())]
+        chosen = np.random.default_rng(seed).choice(selected, n_max, replace=False)
+        sampled = np.zeros_like(keep_mask)
+        sampled[chosen] = True
+        return sampled
 
     def fill_df(
         self,
@@ -186,6 +690,8 @@ class FileToDf(FileToSelected):
         n_max: Optional[int] = None,
         vars_per_tree: VarsPerTreeType = None,
     ) -> pd.DataFrame:
+        if self._config.df_sample_seed is not None and n_max is not None and n_max >= 0:
+            keep_mask = self._sample(keep_mask, n_max)
         entry_stop = _get_entry_stop(keep_mask, n_max)
         if entry_stop is not None and keep_mask is not None:
             keep_mask = keep_mask[:entry_stop]
@@ -211,16 +717,24 @@ class FileToDf(FileToSelected):
                 if keep_mask is not None:
                     df_parts[-1] = df_parts[-1][keep_mask]
             df = pd.concat(df_parts, axis="columns")
-        if keep_mask is None:
-            n_selected = len(df)
-        else:
-            n_selected = np.sum(keep_mask)
-        df = df.drop(columns="efficiency", errors="ignore")
-        df.insert(
-            0, "efficiency", n_selected / (self.row_cells["unselected"] + n_selected)
-        )
+        df = df.drop(columns=["efficiency", "category"], errors="ignore")
+        df.insert(0, "efficiency", self.efficiency())
+        if self._needs_category_column():
+            df.insert(1, "category", self._category_column(keep_mask, len(df)))
         return df
 
+    def _needs_category_column(self) -> bool:
+        return self._config.df_category_column
+
+    def _category_column(self, keep_mask: KeepMaskType, n_rows: int) -> pd.Categorical:
+        """The category of each selected entry, from the shared category index."""
+        index = self._category_index
+        assert index is not None
+        if keep_mask is not None:
+            index = index[: len(keep_mask)][keep_mask]
+        categories = list(self._config.categories)
+        return pd.Categorical.from_codes(index[:n_rows], categories=categories)
+
     def _get_df_part(
         self,
         var_tree: str,
@@ -228,7 +742,7 @@ class FileToDf(FileToSelected):
         entry_stop: Optional[int] = -1,
     ) -> pd.DataFrame:
         try:
-            with warnings.catch_warnings():
+            with warnings.catch_warnings(), profiling.stage("read"):
                 warnings.simplefilter(action="ignore", category=FutureWarning)
                 df_part = self._rootfile[var_tree].arrays(
                     expressions=vars, library="pd", entry_stop=entry_stop
@@ -236,6 +750,16 @@ class FileToDf(FileToSelected):
         except KeyError as e:
             logger.error(f"tree {var_tree} not found in {self._rootfile_path}")
             raise e
+        if profiling.active():
+            tree = self._rootfile[var_tree]
+            stop = None if entry_stop is None or entry_stop < 0 else entry_stop
+            n_compressed = sum(
+                _compressed_bytes(tree[column], entry_stop=stop)
+                for column in df_part.columns
+                if column in tree
+            )
+            n_bytes = df_part.memory_usage(index=False).sum()
+            profiling.add_bytes(n_compressed, n_bytes)
         return df_part
 
     def as_df(self) -> pd.Series:
@@ -243,38 +767,329 @@ class FileToDf(FileToSelected):
         return self._df
 
 
+class FileToCountsAndDf(FileToDf):
+    """From a single rootfile, both the counts per category and the selected events.
+
+    Both come from the same masks: The file is read and selected only once.
+    The whole file is evaluated (in chunks of `config.step_size`),
+    also with `n_max`. The DataFrame always has the `category` column.
+    """
+
+    def _needs_categories(self) -> bool:
+        return True
+
+    def _needs_weights(self) -> bool:
+        return self._config.weight is not None
+
+    def _needs_category_column(self) -> bool:
+        return True
+
+    def _evaluate_file(self) -> None:
+        self._reset_category_counts()
+        keep_parts: List[np.ndarray] = []
+        index_parts: List[np.ndarray] = []
+        for entry_start, entry_stop in self._entry_ranges():
+            keep_mask = self.select(entry_start, entry_stop)
+            with profiling.stage("aggregation"):
+                # Entries that are not kept get -1: Not counted, and not in the df.
+                index = self.category_index(keep_mask)
+                self._add_category_counts(index)
+            if keep_mask is None:
+                keep_mask = np.ones(len(index), dtype=bool)
+            keep_parts.append(keep_mask)
+            index_parts.append(index)
+        self._keep_mask = np.concatenate(keep_parts)
+        self._category_index = np.concatenate(index_parts)
+        self._n_selected_evaluated = int(np.sum(self._keep_mask))
+        self._release_arrays()
+
+
+# In worker processes, the config (or the configs of a sweep)
+# is set once by the pool initializer.
+_worker_config: Any = None
+
+
+def _set_worker_config(config: Any) -> None:
+    global _worker_config
+    _worker_config = config
+
+
+def _in_worker(
+    per_file: Callable[[Union[Path, pd.DataFrame], Any], FileResult],
+    file: Union[Path, pd.DataFrame],
+) -> FileResult:
+    assert _worker_config is not None, "Only to be used in an initialized worker."
+    return per_file(file, _worker_config)
+
+
+def _file_to_counts(file: Union[Path, pd.DataFrame], config: Config) -> FileCounts:
+    """Module level, such that it can be sent to worker processes."""
+    return FileToCounts(file, config).as_quantities()
+
+
+def _file_to_df(
+    file: Union[Path, pd.DataFrame],
+    config: Config,
+    n_max: Optional[int],
+    vars_per_tree: VarsPerTreeType,
+) -> pd.DataFrame:
+    """Module level, such that it can be sent to worker processes."""
+    file_df = FileToDf(file, config, n_max, vars_per_tree).as_df()
+    file_df.insert(0, "process", file_df.name)
+    return file_df
+
+
+def _file_to_counts_and_df(
+    file: Union[Path, pd.DataFrame],
+    config: Config,
+    n_max: Optional[int],
+    vars_per_tree: VarsPerTreeType,
+) -> Tuple[FileCounts, pd.DataFrame]:
+    """Module level, such that it can be sent to worker processes."""
+    file_to_both = FileToCountsAndDf(file, config, n_max, vars_per_tree)
+    file_df = file_to_both.as_df()
+    file_df.insert(0, "process", file_df.name)
+    return file_to_both.as_quantities(), file_df
+
+
+def _file_to_scan_counts(
+    file: Union[Path, pd.DataFrame], config: Config
+) -> pd.DataFrame:
+    """Module level, such that it can be sent to worker processes."""
+    return FileToScanCounts(file, config).as_df()
+
+
+class ConfigSweep(NamedTuple):
+    """Several configs that are evaluated on one read of each file.
+
+    The files are read in chunks of `base.step_size`.
+    """
+
+    base: Config
+    configs: Dict[str, Config]
+
+    def variables_per_tree(self) -> Dict[str, Set[str]]:
+        """The union of the branches needed by any of the configs."""
+        vars_per_tree: Dict[str, Set[str]] = {}
+        for config in self.configs.values():
+            vars_of_config = config.variables_per_tree(with_weights=True)
+            for tree, variables in vars_of_config.items():
+                vars_per_tree.setdefault(tree, set()).update(variables)
+        return vars_per_tree
+
+
+def _file_to_sweep_counts(
+    file: Union[Path, pd.DataFrame], sweep: ConfigSweep
+) -> Dict[str, FileCounts]:
+    """Module level, such that it can be sent to worker processes.
+
+    The configs share the arrays that are read from the file.
+    """
+    if isinstance(file, pd.DataFrame):
+        # `FileToSelected` pops the process column: Each config needs its own view.
+        return {
+            name: FileToCounts(file.copy(deep=False), config).as_quantities()
+            for name, config in sweep.configs.items()
+        }
+    arrays = pipeline.take_prefetched(file)
+    if arrays is None:
+        arrays = BranchCache(file, sweep.base.max_memory)
+    vars_per_tree = sweep.variables_per_tree()
+    counts: Dict[str, FileCounts] = {}
+    for entry_range in arrays.entry_ranges(vars_per_tree, sweep.base.step_size):
+        arrays.set_entry_range(*entry_range)
+        arrays.prefetch(vars_per_tree)
+        if profiling.active():
+            n_entries = arrays.tree(sweep.base.categories_tree).num_entries
+            entry_start, entry_stop = entry_range
+            stop = n_entries if entry_stop is None else entry_stop
+            profiling.add_events(stop - (entry_start or 0))
+        for name, config in sweep.configs.items():
+            chunk = FileToCounts(file, config, arrays, entry_range).as_quantities()
+            if name not in counts:
+                counts[name] = chunk
+                continue
+            for quantity, series in chunk.items():
+                counts[name][quantity] = counts[name][quantity] + series
+    arrays.clear()
+    return counts
+
+
+def _input_size(file: Union[Path, pd.DataFrame]) -> int:
+    """A proxy for the time needed to process this input."""
+    if isinstance(file, pd.DataFrame):
+        return int(file.memory_usage(deep=False).sum())
+    return file.stat().st_size
+
+
 class DataFromFiles:
     """Handles the combination of files into a consistent table."""
 
+    _show_progress = True
+
     def __init__(
         self,
         data_source: Path,
         data_dir: Path,
         config: Config,
         obj_type: str = "table",
+        n_jobs: int = 1,
     ) -> None:
         self._data_source = data_source
         self._data_dir = data_dir
         self._config = config
         self._obj_type = obj_type
+        if n_jobs < 1:
+            raise ValueError(f"At least one job is needed, not {n_jobs=}.")
+        self._n_jobs = n_jobs
+        self._executor: Optional[concurrent.futures.Executor] = None  # Set per run.
 
         self.build_objects()
 
     def build_objects(self) -> None:
+        # An object is written while the next one is built.
+        with pipeline.BackgroundWriter() as writer:
+            for name, obj in self.iter_objects():
+                writer.submit(self.save_obj, obj, name)
+
+    def iter_objects(self) -> Iterator[Tuple[str, Any]]:
+        """Build the objects one after the other, yielding `(name, object)`.
+
+        Nothing is written. Within a `profiling.ProfileReport`, the time until
+        the next object is requested still counts for the yielded object.
+        """
         n_files, table_files = self._find_files()
-        with logging_redirect_tqdm():
-            self._per_file_bar = tqdm.tqdm(total=n_files)
+        with self._running(n_files):
             for name, files in table_files.items():
                 self._per_file_bar.set_description(f"Building {self._obj_type} {name}")
-                df = self.build_obj(sorted(list(files)), name)
-                self._config.save_df(df, self._data_dir, name)
-            self._per_file_bar.close()
+                with self._profile_table(name):
+                    yield name, self.build_obj(sorted(list(files)), name)
+
+    @contextlib.contextmanager
+    def _running(self, n_files: int) -> Iterator[None]:
+        """The worker processes (with `n_jobs`) and the progress bar of a run."""
+        with contextlib.ExitStack() as stack:
+            stack.enter_context(logging_redirect_tqdm())
+            self._executor = stack.enter_context(self._process_pool())
+            stack.callback(setattr, self, "_executor", None)
+            self._per_file_bar = stack.enter_context(
+                tqdm.tqdm(total=n_files, disable=not self._show_progress)
+            )
+            yield
+
+    def save_obj(self, df: pd.DataFrame, name: str) -> None:
+        self._config.save_df(df, self._data_dir, name)
+
+    def _profile_table(self, name: str) -> ContextManager:
+        report = profiling.active_report()
+        if report is None:
+            return contextlib.nullcontext()
+        return report.table(name)
+
+    def _shared_with_workers(self) -> Any:
+        """The second argument to the `per_file` functions in `_map_files`."""
+        return self._config
+
+    def _process_pool(self) -> ContextManager[Optional[concurrent.futures.Executor]]:
+        if self._n_jobs == 1:
+            return contextlib.nullcontext()
+        logger.info(f"Processing the files with {self._n_jobs} worker processes.")
+        # The config, with its compiled expressions, is sent once per worker.
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=self._n_jobs,
+            initializer=_set_worker_config,
+            initargs=(self._shared_with_workers(),),
+        )
+
+    def _map_files(
+        self,
+        per_file: Callable[[Union[Path, pd.DataFrame], Any], FileResult],
+        files: Iterable[Union[Path, pd.DataFrame]],
+    ) -> Iterator[FileResult]:
+        """Apply `per_file(file, config)` to all files, yielding results in order.
+
+        With several jobs, at most `2 * n_jobs` inputs are submitted
+        but not yet yielded. Of the inputs read ahead, the largest are submitted first.
+        A result is yielded as soon as it and all results before it are finished.
+        The progress bar advances whenever a file is finished.
+        Within a `profiling.ProfileReport`, the stages of each file are recorded.
+        """
+        report = profiling.active_report()
+        if report is None:
+            yield from self._map_files_in_order(per_file, files)
+            return
+        profiled = functools.partial(profiling.profiled, per_file)
+        for result, file_profile in self._map_files_in_order(profiled, files):
+            report.add_file(file_profile)
+            yield result
+
+    def _map_files_in_order(
+        self,
+        per_file: Callable[[Union[Path, pd.DataFrame], Any], FileResult],
+        files: Iterable[Union[Path, pd.DataFrame]],
+    ) -> Iterator[FileResult]:
+        if self._executor is None:
+            shared = self._shared_with_workers()
+            for file in self._prefetch_ahead(files):
+                yield per_file(file, shared)
+                self._per_file_bar.update(1)
+            return
+
+        # Submitted, but not yet yielded: Bounds the inputs and results held.
+        window = 2 * self._n_jobs
+        inputs = enumerate(files)
+        futures: Dict[concurrent.futures.Future, int] = {}
+        results: Dict[int, FileResult] = {}
+        next_i = 0
+        try:
+            while True:
+                batch = list(
+                    itertools.islice(inputs, window - len(futures) - len(results))
+                )
+                for i, file in sorted(batch, key=lambda item: -_input_size(item[1])):
+                    futures[self._executor.submit(_in_worker, per_file, file)] = i
+                del batch
+                if not futures:
+                    break
+                done, _ = concurrent.futures.wait(
+                    futures, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    results[futures.pop(future)] = future.result()
+                    self._per_file_bar.update(1)
+                while next_i in results:
+                    yield results.pop(next_i)
+                    next_i += 1
+        except BaseException:
+            for future in futures:
+                future.cancel()
+            raise
+
+    def _prefetch_ahead(
+        self, files: Iterable[Union[Path, pd.DataFrame]]
+    ) -> Iterable[Union[Path, pd.DataFrame]]:
+        """In a single process, the next rootfile is read during the evaluation.
+
+        Not with `max-memory`: The arrays of two files would be held at once.
+        """
+        plan = self._prefetch_plan()
+        if plan is None or self._config.max_memory is not None:
+            return files
+        return pipeline.prefetch_ahead(files, plan)
+
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        """The branches that `per_file` reads first (None: no read ahead)."""
+        return None
 
     def build_obj(self, files: List[Path], name: str) -> pd.DataFrame:
         raise NotImplementedError
 
-    def _get_cross_sections(self, name: str, processes: pd.Index) -> pd.Series:
-        cross_sections = self._config.cross_sections.per_polarization()
+    def _get_cross_sections(
+        self, name: str, processes: pd.Index, config: Optional[Config] = None
+    ) -> pd.Series:
+        if config is None:
+            config = self._config
+        cross_sections = config.cross_sections.per_polarization()
         if name not in cross_sections:
             logger.warning(
                 f"The {self._obj_type} name {name} was not understood "
@@ -286,10 +1101,21 @@ class DataFromFiles:
         cs_dict = {
             process: cs_polarized.get(process, float("inf")) for process in processes
         }
-        for process in self._config.cross_section_zero:
+        for process in config.cross_section_zero:
             cs_dict[process] = 0
         return pd.Series(cs_dict)
 
+    def _to_tables(
+        self, counts: CountAccumulator, name: str, config: Config
+    ) -> Dict[str, pd.DataFrame]:
+        """The count table (per quantity), with a row per process."""
+        tables = counts.to_tables()
+        if not config.no_cs:
+            for table in tables.values():
+                cs = self._get_cross_sections(name, table.index, config)
+                table.insert(0, "cross section [fb]", cs)
+        return tables
+
     def _find_files(self) -> Tuple[int, Dict[str, Set[Path]]]:
         table_files: Dict[str, Set[Path]] = {}
         if self._data_source.is_file():
@@ -325,16 +1151,33 @@ class DataFromFiles:
         return path_set
 
     def _rootfile_or_parquet_df(
-        self, files: List[Path]
+        self,
+        files: List[Path],
+        columns: Optional[Set[str]] = None,
+        stream: bool = False,
     ) -> Iterator[Union[Path, pd.DataFrame]]:
+        """Rootfiles are passed on, parquet files are split into process DataFrames.
+
+        See `parquet_input.iter_process_dfs` for `columns` and `stream`.
+        """
         for file in files:
             if file.suffix == ".parquet":
-                df = pd.read_parquet(file)
-                for process in np.unique(df.process):
-                    yield df[df.process == process]
+                yield from iter_process_dfs(
+                    file, columns, stream, step_size=self._config.step_size
+                )
             else:
                 yield file
 
+    def _table_inputs(
+        self, files: List[Path], configs: Iterable[Config]
+    ) -> Iterator[Union[Path, pd.DataFrame]]:
+        """For counting, parquet inputs are streamed with only the needed columns.
+
+        The counts of a process that is split over several DataFrames add up.
+        """
+        columns = selection_columns(configs)
+        return self._rootfile_or_parquet_df(files, columns, stream=True)
+
 
 class TablesFromFiles(DataFromFiles):
     """Handles the combination of files into a consistent table."""
@@ -344,30 +1187,199 @@ class TablesFromFiles(DataFromFiles):
         data_source: Path,
         data_dir: Path,
         config: Config,
+        n_jobs: int = 1,
+        cache_dir: Optional[Path] = None,
+        cache_max_size: Optional[int] = None,
+    ) -> None:
+        self._cache = None
+        if cache_dir is not None:
+            self._cache = ResultCache(cache_dir, config, cache_max_size)
+        super().__init__(data_source, data_dir, config, obj_type="table", n_jobs=n_jobs)
+        if self._cache is not None:
+            logger.info(
+                f"{self._cache.n_hits} files were taken from the cache, "
+                f"{self._cache.n_misses} files were processed."
+            )
+            self._cache.evict()
+
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        config = self._config
+        return pipeline.PrefetchPlan(
+            config.variables_per_tree(with_weights=config.weight is not None),
+            config.variables_per_tree(),
+            config.step_size,
+        )
+
+    def build_obj(self, files: List[Path], name: str) -> Dict[str, pd.DataFrame]:
+        """The count table, and with `config.weight` also the weighted tables."""
+        return self._to_tables(self._get_counts(files), name, self._config)
+
+    def save_obj(self, tables: Dict[str, pd.DataFrame], name: str) -> None:
+        for quantity, table in tables.items():
+            self._config.save_df(table, self._data_dir, _table_name(name, quantity))
+
+    def _get_counts(self, files: List[Path]) -> CountAccumulator:
+        return _merge_counts(self._get_file_counts(files))
+
+    def _get_file_counts(self, files: List[Path]) -> Iterator[FileCounts]:
+        inputs = self._table_inputs(files, [self._config])
+        if self._cache is None:
+            yield from self._map_files(_file_to_counts, inputs)
+            return
+
+        # Per input in order, the rootfile to be cached, or the cached counts.
+        # Processed inputs that can not be cached (parquet parts) are not held.
+        order: Deque[Tuple[Optional[Path], Optional[FileCounts]]]
+        order = collections.deque()
+
+        def to_process() -> Iterator[Union[Path, pd.DataFrame]]:
+            assert self._cache is not None
+            for file in inputs:
+                if not isinstance(file, Path):
+                    order.append((None, None))
+                    yield file
+                    continue
+                file_counts = self._cache.get(file)
+                if file_counts is None:
+                    order.append((file, None))
+                    yield file
+                else:
+                    order.append((None, file_counts))
+                    self._per_file_bar.update(1)
+
+        def cached_before_next() -> Iterator[FileCounts]:
+            while order:
+                cached = order[0][1]
+                if cached is None:
+                    return
+                order.popleft()
+                yield cached
+
+        for file_counts in self._map_files(_file_to_counts, to_process()):
+            yield from cached_before_next()
+            file, _ = order.popleft()
+            if file is not None:
+                self._cache.put(file, file_counts)
+            yield file_counts
+        yield from cached_before_next()
+
+
+def _table_name(name: str, quantity: str) -> str:
+    """The count table keeps the plain name, e.g. `eLpR_sumw` holds the weights."""
+    return name if quantity == "count" else f"{name}_{quantity}"
+
+
+def _merge_counts(per_file_counts: Iterable[FileCounts]) -> CountAccumulator:
+    """Files of the same process are added up."""
+    merged = CountAccumulator()
+    for file_counts in per_file_counts:
+        with profiling.stage("aggregation"):
+            merged.add(file_counts)
+    return merged
+
+
+class SweepTablesFromFiles(TablesFromFiles):
+    """Count tables for several configs, reading each file only once.
+
+    The files, their grouping into tables and the chunking (`step-size`)
+    are taken from the base `config`.
+    The tables of each config are written into their own folder `data_dir/<name>`.
+    """
+
+    def __init__(
+        self,
+        data_source: Path,
+        data_dir: Path,
+        config: Config,
+        sweep_configs: Dict[str, Config],
+        n_jobs: int = 1,
+    ) -> None:
+        if len(sweep_configs) == 0:
+            raise ValueError("At least one config is needed for a sweep.")
+        self._sweep = ConfigSweep(config, sweep_configs)
+        super().__init__(data_source, data_dir, config, n_jobs=n_jobs)
+
+    def _shared_with_workers(self) -> ConfigSweep:
+        return self._sweep
+
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        vars_per_tree = self._sweep.variables_per_tree()
+        return pipeline.PrefetchPlan(
+            vars_per_tree, vars_per_tree, self._sweep.base.step_size
+        )
+
+    def build_obj(
+        self, files: List[Path], name: str
+    ) -> Dict[str, Dict[str, pd.DataFrame]]:
+        per_file_counts = list(
+            self._map_files(
+                _file_to_sweep_counts,
+                self._table_inputs(files, self._sweep.configs.values()),
+            )
+        )
+        return {
+            sweep_name: self._to_tables(
+                _merge_counts(c[sweep_name] for c in per_file_counts), name, config
+            )
+            for sweep_name, config in self._sweep.configs.items()
+        }
+
+    def save_obj(self, tables: Dict[str, Dict[str, pd.DataFrame]], name: str) -> None:
+        for sweep_name, sweep_tables in tables.items():
+            sweep_dir = self._data_dir / sweep_name
+            sweep_dir.mkdir(exist_ok=True)
+            config = self._sweep.configs[sweep_name]
+            for quantity, table in sweep_tables.items():
+                config.save_df(table, sweep_dir, _table_name(name, quantity))
+
+
+class ScanTablesFromFiles(DataFromFiles):
+    """Count tables for each threshold of the `scan` entry in the config.
+
+    Per table, the rows are indexed by (threshold, process).
+    """
+
+    def __init__(
+        self,
+        data_source: Path,
+        data_dir: Path,
+        config: Config,
+        n_jobs: int = 1,
     ) -> None:
-        super().__init__(data_source, data_dir, config, obj_type="table")
+        if config.scan is None:
+            raise ValueError("A `scan` entry is needed in the config.")
+        super().__init__(data_source, data_dir, config, obj_type="table", n_jobs=n_jobs)
+
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        config = self._config
+        return pipeline.PrefetchPlan(
+            config.variables_per_tree(), config.variables_per_tree(), config.step_size
+        )
 
     def build_obj(self, files: List[Path], name: str) -> pd.DataFrame:
-        process_columns = self._get_counts(files)
-        table = process_columns.transpose()
+        per_process: Dict[str, pd.DataFrame] = {}
+        inputs = self._table_inputs(files, [self._config])
+        for df in self._map_files(_file_to_scan_counts, inputs):
+            with profiling.stage("aggregation"):
+                if df.name in per_process:
+                    per_process[df.name] = per_process[df.name] + df
+                else:
+                    per_process[df.name] = df
+        table = pd.concat(per_process, names=["process"])
+        # From (process, threshold) to (threshold, process), keeping both orders.
+        n_thresholds, n_processes = len(self._config.scan.values), len(per_process)
+        order = [
+            j * n_thresholds + i
+            for i in range(n_thresholds)
+            for j in range(n_processes)
+        ]
+        table = table.iloc[order].swaplevel()
         if not self._config.no_cs:
-            cs = self._get_cross_sections(name, table.index)
-            table.insert(0, "cross section [fb]", cs)
+            processes = table.index.get_level_values("process")
+            cs = self._get_cross_sections(name, processes.unique())
+            table.insert(0, "cross section [fb]", processes.map(cs).values)
         return table
 
-    def _get_counts(self, files: List[Path]) -> pd.DataFrame:
-        df = None
-        for file in self._rootfile_or_parquet_df(files):
-            series: pd.Series = FileToCounts(file, self._config).as_series()
-            if df is None:
-                df = series.to_frame()
-            if series.name in df.columns:
-                df[series.name] = df[series.name] + series
-            else:
-                df[series.name] = series
-            self._per_file_bar.update(1)
-        return df
-
 
 class DfFromFiles(DataFromFiles):
     """Create a pandas DataFrame for all selected events, per polarization."""
@@ -379,25 +1391,122 @@ class DfFromFiles(DataFromFiles):
         config: Config,
         vars_per_tree: VarsPerTreeType = None,
         n_max: Union[int, None, bool] = False,
+        n_jobs: int = 1,
     ) -> None:
         if isinstance(n_max, bool) and not n_max:
             self._n_max = config.df_n_max
         else:
             self._n_max = n_max
         self._vars_per_tree = _validate_vars_per_tree(vars_per_tree, config)
-        super().__init__(data_source, data_dir, config, obj_type="df")
+        super().__init__(data_source, data_dir, config, obj_type="df", n_jobs=n_jobs)
 
-    def build_obj(self, files: List[Path], name: str) -> pd.DataFrame:
-        dfs = []
-        for file in self._rootfile_or_parquet_df(files):
-            file_df: pd.DataFrame = FileToDf(
-                file, self._config, self._n_max, self._vars_per_tree
-            ).as_df()
-            file_df.insert(0, "process", file_df.name)
-            dfs.append(file_df)
-            self._per_file_bar.update(1)
-        df = pd.concat(dfs)
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        """Not with `n_max`: The file is then read in windows, as long as needed."""
+        config = self._config
+        stops_early = (
+            self._n_max is not None
+            and self._n_max >= 0
+            and config.df_sample_seed is None
+        )
+        if stops_early:
+            return None
+        return pipeline.PrefetchPlan(
+            config.variables_per_tree(config.df_category_column),
+            config.variables_per_tree(),
+        )
+
+    def build_obj(self, files: List[Path], name: str) -> Optional[pd.DataFrame]:
+        return self._collect_df(self._get_file_dfs(files), name)
+
+    def _get_file_dfs(self, files: List[Path]) -> Iterator[pd.DataFrame]:
+        per_file = functools.partial(
+            _file_to_df,
+            n_max=self._n_max,
+            vars_per_tree=self._vars_per_tree,
+        )
+        return self._map_files(per_file, self._rootfile_or_parquet_df(files))
+
+    def _df_dir(self) -> Path:
+        return self._data_dir
+
+    def _collect_df(
+        self, dfs: Iterable[pd.DataFrame], name: str
+    ) -> Optional[pd.DataFrame]:
+        """With `partitioned` under df, the DataFrames are directly written to disk."""
+        if self._config.df_partitioned:
+            with PartitionedParquetWriter(
+                self._df_dir() / f"{name}.parquet",
+                self._config.df_row_group_size,
+                self._config.df_compression,
+            ) as writer, pipeline.BackgroundWriter() as background:
+                for df in dfs:
+                    background.submit(writer.write, self._with_cross_sections(df, name))
+            return None
+        return self._concat_dfs(dfs, name)
+
+    def _concat_dfs(self, dfs: Iterable[pd.DataFrame], name: str) -> pd.DataFrame:
+        dfs = list(dfs)
+        with profiling.stage("aggregation"):
+            return self._with_cross_sections(pd.concat(dfs), name)
+
+    def _with_cross_sections(self, df: pd.DataFrame, name: str) -> pd.DataFrame:
         if not self._config.no_cs:
             cs = self._get_cross_sections(name, df.process.unique())
-        df.insert(2, "cross section [fb]", df.process.map(cs))
+            df.insert(2, "cross section [fb]", df.process.map(cs))
         return df
+
+    def save_obj(self, df: Optional[pd.DataFrame], name: str) -> None:
+        if df is not None:
+            self._config.save_df(df, self._df_dir(), name)
+
+
+class TablesAndDfFromFiles(DfFromFiles):
+    """The count tables and the selected events' DataFrames, from one pass.
+
+    Each file is read and selected once (see `FileToCountsAndDf`).
+    The tables are written into `data_dir` (as by `TablesFromFiles`),
+    the DataFrames into `data_dir/df` (as by `DfFromFiles`).
+    """
+
+    def _prefetch_plan(self) -> Optional[pipeline.PrefetchPlan]:
+        config = self._config
+        return pipeline.PrefetchPlan(
+            config.variables_per_tree(with_weights=config.weight is not None),
+            config.variables_per_tree(),
+            config.step_size,
+        )
+
+    def _df_dir(self) -> Path:
+        df_dir = self._data_dir / "df"
+        df_dir.mkdir(exist_ok=True)
+        return df_dir
+
+    def build_obj(
+        self, files: List[Path], name: str
+    ) -> Tuple[Dict[str, pd.DataFrame], Optional[pd.DataFrame]]:
+        per_file = functools.partial(
+            _file_to_counts_and_df,
+            n_max=self._n_max,
+            vars_per_tree=self._vars_per_tree,
+        )
+        per_file_counts: List[FileCounts] = []
+
+        def dfs() -> Iterator[pd.DataFrame]:
+            inputs = self._rootfile_or_parquet_df(files)
+            for file_counts, file_df in self._map_files(per_file, inputs):
+                per_file_counts.append(file_counts)
+                yield file_df
+
+        df = self._collect_df(dfs(), name)
+        tables = self._to_tables(_merge_counts(per_file_counts), name, self._config)
+        return tables, df
+
+    def save_obj(
+        self,
+        tables_and_df: Tuple[Dict[str, pd.DataFrame], Optional[pd.DataFrame]],
+        name: str,
+    ) -> None:
+        tables, df = tables_and_df
+        for quantity, table in tables.items():
+            self._config.save_df(table, self._data_dir, _table_name(name, quantity))
+        super().save_obj(df, name)
@@ -0,0 +1,290 @@
+"""Splitting a production over several jobs (shards), and merging their outputs.
+
+`higgstables --shard i/N` processes every N-th file (see `ShardTablesFromFiles`)
+and writes the partial counts per process into `higgstables-shard-i-of-N.json`.
+`higgstables-merge` sums the partial outputs of all N shards into the tables.
+"""
+import collections
+import itertools
+import json
+import logging
+import os
+import socket
+from pathlib import Path, PurePosixPath
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from ..config import Config
+from ..version import __version__
+from .count_accumulator import CountAccumulator, FileCounts
+from .root_to_table import TablesFromFiles
+
+logger = logging.getLogger(__name__)
+PartialTable = Dict[str, Any]
+
+partial_pattern = "higgstables-shard-*-of-*.json"
+
+
+class ShardMergeError(Exception):
+    """The partial outputs can not be merged into consistent tables."""
+
+    pass
+
+
+def partial_name(shard_index: int, n_shards: int) -> str:
+    return f"higgstables-shard-{shard_index}-of-{n_shards}.json"
+
+
+def _path_order(relative_path: str) -> PurePosixPath:
+    """Sorting as `Path` objects do, such that shards and full runs agree."""
+    return PurePosixPath(relative_path)
+
+
+class ShardTablesFromFiles(TablesFromFiles):
+    """The partial counts from every `n_shards`-th file, for `higgstables-merge`.
+
+    The files of all tables are sorted by their path below the data source,
+    shard `shard_index` (counted from 0) takes the files
+    `shard_index, shard_index + n_shards, ...`.
+    Instead of tables, one json file with the counts per process
+    and the provenance (which files, from where, with which selection) is written.
+    """
+
+    def __init__(
+        self,
+        data_source: Path,
+        data_dir: Path,
+        config: Config,
+        shard: Tuple[int, int],
+        n_jobs: int = 1,
+        cache_dir: Optional[Path] = None,
+        cache_max_size: Optional[int] = None,
+    ) -> None:
+        self._shard_index, self._n_shards = shard
+        if not 0 <= self._shard_index < self._n_shards:
+            raise ValueError(f"Shard {self._shard_index} of {self._n_shards} invalid.")
+        self._all_files: Dict[str, List[str]] = {}
+        self._input_origins: List[Path] = []
+        self._partial_tables: Dict[str, PartialTable] = {}
+        super().__init__(
+            data_source, data_dir, config, n_jobs, cache_dir, cache_max_size
+        )
+
+    def _relative(self, file: Path) -> str:
+        if self._data_source.is_dir():
+            return file.relative_to(self._data_source).as_posix()
+        return file.name
+
+    def _find_files(self) -> Tuple[int, Dict[str, Set[Path]]]:
+        _, table_files = super()._find_files()
+        all_files = sorted(
+            set(itertools.chain(*table_files.values())),
+            key=lambda f: _path_order(self._relative(f)),
+        )
+        in_shard = set(all_files[self._shard_index :: self._n_shards])
+        logger.info(
+            f"Shard {self._shard_index} of {self._n_shards}: "
+            f"{len(in_shard)} of {len(all_files)} files."
+        )
+        self._all_files = {
+            name: sorted(map(self._relative, files), key=_path_order)
+            for name, files in table_files.items()
+        }
+        return len(in_shard), {
+            name: files & in_shard for name, files in table_files.items()
+        }
+
+    def _rootfile_or_parquet_df(
+        self,
+        files: List[Path],
+        columns: Optional[Set[str]] = None,
+        stream: bool = False,
+    ) -> Iterator[Union[Path, pd.DataFrame]]:
+        """Additionally, remember the file that each input comes from."""
+        for file in files:
+            for file_input in super()._rootfile_or_parquet_df([file], columns, stream):
+                self._input_origins.append(file)
+                yield file_input
+
+    def build_obj(self, files: List[Path], name: str) -> PartialTable:
+        """The counts per process, with the first input that each process is from."""
+        self._input_origins = []
+        processes: Dict[str, Dict[str, Any]] = {}
+        n_per_origin: "collections.Counter[Path]" = collections.Counter()
+        for i, file_counts in enumerate(self._get_file_counts(files)):
+            origin = self._input_origins[i]
+            _add_to_partial(
+                processes, file_counts, [self._relative(origin), n_per_origin[origin]]
+            )
+            n_per_origin[origin] += 1
+        return {
+            "all_files": self._all_files[name],
+            "files": {
+                self._relative(file): {
+                    "size": file.stat().st_size,
+                    "mtime_ns": file.stat().st_mtime_ns,
+                }
+                for file in files
+            },
+            "processes": list(processes.values()),
+        }
+
+    def save_obj(self, partial_table: PartialTable, name: str) -> None:
+        self._partial_tables[name] = partial_table
+
+    def build_objects(self) -> None:
+        super().build_objects()
+        partial = {
+            "higgstables_version": __version__,
+            "shard": {"index": self._shard_index, "count": self._n_shards},
+            "data_source": str(self._data_source.absolute()),
+            "host": socket.gethostname(),
+            "selection_fingerprint": self._config.selection_fingerprint(),
+            "categories": list(self._config.categories),
+            "tables": self._partial_tables,
+        }
+        path = self._data_dir / partial_name(self._shard_index, self._n_shards)
+        tmp_path = path.with_suffix(f".tmp{os.getpid()}")
+        with tmp_path.open("w") as f:
+            json.dump(partial, f, indent=1)
+        os.replace(tmp_path, path)
+        logger.info(f"The partial counts were written to {path}.")
+
+
+def _add_to_partial(
+    processes: Dict[str, Dict[str, Any]],
+    file_counts: FileCounts,
+    first_input: List[Any],
+) -> None:
+    process = str(file_counts["count"].name)
+    if process not in processes:
+        processes[process] = {
+            "name": process,
+            "first_input": first_input,
+            "quantities": {
+                quantity: dict(zip(series.index, series.tolist()))
+                for quantity, series in file_counts.items()
+            },
+        }
+        return
+    quantities = processes[process]["quantities"]
+    for quantity, series in file_counts.items():
+        for category, value in zip(series.index, series.tolist()):
+            quantities[quantity][category] += value
+
+
+def find_partials(paths: List[Path]) -> List[Path]:
+    """The partial outputs, given directly or as the folders they are in."""
+    partials: List[Path] = []
+    for path in paths:
+        if path.is_dir():
+            partials.extend(sorted(path.glob(partial_pattern)))
+        elif path.is_file():
+            partials.append(path)
+        else:
+            raise FileNotFoundError(path)
+    if not partials:
+        raise ShardMergeError(f"No partial output ({partial_pattern}) in {paths}.")
+    return partials
+
+
+class TablesFromShards(TablesFromFiles):
+    """The tables from the partial outputs of `ShardTablesFromFiles`.
+
+    Identical to the tables of an unsharded run.
+    All shards must be present exactly once, and together they must have
+    processed each file of each table exactly once. Else, `ShardMergeError`.
+    """
+
+    def __init__(self, partial_paths: List[Path], data_dir: Path, config: Config):
+        self._partials: Dict[Path, Dict[str, Any]] = {}
+        for path in find_partials(partial_paths):
+            with path.open() as f:
+                self._partials[path] = json.load(f)
+        self._check_shards(config)
+        self._check_coverage()
+        first_partial = next(iter(self._partials.values()))
+        super().__init__(Path(first_partial["data_source"]), data_dir, config)
+
+    def _check_shards(self, config: Config) -> None:
+        n_shards = {p["shard"]["count"] for p in self._partials.values()}
+        if len(n_shards) != 1:
+            raise ShardMergeError(f"The partial outputs are from {n_shards} shards.")
+        indices = collections.Counter(
+            p["shard"]["index"] for p in self._partials.values()
+        )
+        duplicates = sorted(i for i, n in indices.items() if n > 1)
+        missing = sorted(set(range(n_shards.pop())) - set(indices))
+        if duplicates or missing:
+            raise ShardMergeError(
+                f"Each shard is needed exactly once. Missing: {missing}, "
+                f"more than once: {duplicates}."
+            )
+        fingerprint = config.selection_fingerprint()
+        for path, partial in self._partials.items():
+            if partial["selection_fingerprint"] != fingerprint:
+                raise ShardMergeError(
+                    f"{path} was built with another selection than the config's."
+                )
+            if partial["higgstables_version"] != __version__:
+                logger.warning(
+                    f"{path} was built with higgstables "
+                    f"{partial['higgstables_version']}, not {__version__}."
+                )
+
+    def _check_coverage(self) -> None:
+        """Each file is counted by exactly one shard."""
+        table_names = {tuple(p["tables"]) for p in self._partials.values()}
+        if len(table_names) != 1:
+            raise ShardMergeError(f"The shards built different tables: {table_names}.")
+        for name in table_names.pop():
+            all_files = {
+                tuple(p["tables"][name]["all_files"]) for p in self._partials.values()
+            }
+            if len(all_files) != 1:
+                raise ShardMergeError(
+                    f"The shards found different files for the table {name}."
+                )
+            expected = set(all_files.pop())
+            covered = collections.Counter(
+                itertools.chain(
+                    *(p["tables"][name]["files"] for p in self._partials.values())
+                )
+            )
+            missing = sorted(expected - set(covered))
+            twice = sorted(f for f, n in covered.items() if n > 1)
+            unexpected = sorted(set(covered) - expected)
+            if missing or twice or unexpected:
+                raise ShardMergeError(
+                    f"Table {name}: Not counted: {missing}, "
+                    f"counted more than once: {twice}, not expected: {unexpected}."
+                )
+
+    def _find_files(self) -> Tuple[int, Dict[str, Set[Path]]]:
+        """Per table, the partial outputs."""
+        table_files: Dict[str, Set[Path]] = {}
+        for path, partial in self._partials.items():
+            for name in partial["tables"]:
+                table_files.setdefault(name, set()).add(path)
+        return sum(len(paths) for paths in table_files.values()), table_files
+
+    def build_obj(self, files: List[Path], name: str) -> Dict[str, pd.DataFrame]:
+        """Sum the partial counts. The processes are ordered as in a full run."""
+        all_files = self._partials[files[0]]["tables"][name]["all_files"]
+        file_rank = {file: rank for rank, file in enumerate(all_files)}
+        partial_counts: List[Tuple[Tuple[int, int], FileCounts]] = []
+        for path in files:
+            for process in self._partials[path]["tables"][name]["processes"]:
+                file, i = process["first_input"]
+                file_counts = {
+                    quantity: pd.Series(cells, name=process["name"])
+                    for quantity, cells in process["quantities"].items()
+                }
+                partial_counts.append(((file_rank[file], i), file_counts))
+            self._per_file_bar.update(1)
+        # A process's row is placed by its earliest input.
+        counts = CountAccumulator()
+        for _, file_counts in sorted(partial_counts, key=lambda p: p[0]):
+            counts.add(file_counts)
+        return self._to_tables(counts, name, self._config)
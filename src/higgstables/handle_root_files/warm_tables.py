@@ -0,0 +1,110 @@
+"""Keeping the arrays of a data source in memory, for repeated selections.
+
+Used by `higgstables-serve`: The files are found and read once.
+Further configs (e.g. with changed categories) are evaluated on the arrays
+in memory. Only the branches that no config needed before are read.
+"""
+import collections
+import logging
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple, Union
+
+import pandas as pd
+
+from ..config import Config
+from .branch_cache import BranchCache
+from .count_accumulator import FileCounts
+from .in_memory import FileSelection, InMemoryTables
+from .parquet_input import iter_process_dfs
+from .root_to_table import FileToCounts
+
+logger = logging.getLogger(__name__)
+WarmInput = Union[BranchCache, List[pd.DataFrame]]
+
+
+def _n_bytes(warm_input: WarmInput) -> int:
+    if isinstance(warm_input, BranchCache):
+        return warm_input.n_bytes
+    return int(sum(df.memory_usage(deep=True).sum() for df in warm_input))
+
+
+class WarmTables(InMemoryTables):
+    """`InMemoryTables` that keep the arrays read from the files.
+
+    The files are found once, with the config given on construction.
+    `tables(config)` evaluates another config on them: Its `tables` and
+    `ignored-processes` fields are not used, and the files are not split into
+    chunks (`step-size`). Beyond `max_memory` (bytes), the arrays of the least
+    recently used files are dropped (and read again when needed).
+    """
+
+    def __init__(
+        self, files: FileSelection, config: Config, max_memory: Optional[int] = None
+    ) -> None:
+        super().__init__(files, config)
+        self.max_memory = max_memory
+        self._found_files = super()._find_files()
+        self._warm: "collections.OrderedDict[Path, WarmInput]" = (
+            collections.OrderedDict()
+        )
+
+    @property
+    def n_bytes(self) -> int:
+        """The size of the arrays (and parquet DataFrames) held in memory."""
+        return sum(_n_bytes(warm_input) for warm_input in self._warm.values())
+
+    def _find_files(self) -> Tuple[int, Dict[str, Set[Path]]]:
+        return self._found_files
+
+    def tables(
+        self, config: Optional[Config] = None
+    ) -> Dict[str, Dict[str, pd.DataFrame]]:
+        """The tables for `config` (by default, the config of the construction)."""
+        base_config = self._config
+        if config is not None:
+            self._config = config
+        try:
+            return super().tables()
+        finally:
+            self._config = base_config
+
+    def _get_file_counts(self, files: List[Path]) -> Iterator[FileCounts]:
+        for file in files:
+            warm_input = self._warm_input(file)
+            if isinstance(warm_input, BranchCache):
+                counts = FileToCounts(file, self._config, warm_input, (None, None))
+                yield counts.as_quantities()
+            else:
+                for df in warm_input:
+                    # `FileToSelected` pops the process column: Only from a view.
+                    yield FileToCounts(
+                        df.copy(deep=False), self._config
+                    ).as_quantities()
+            self._enforce_budget(keep=file)
+            self._per_file_bar.update(1)
+
+    def _warm_input(self, file: Path) -> WarmInput:
+        if file in self._warm:
+            self._warm.move_to_end(file)
+            return self._warm[file]
+        warm_input: WarmInput
+        if file.suffix == ".parquet":
+            warm_input = list(iter_process_dfs(file))
+        else:
+            warm_input = BranchCache(file)
+        self._warm[file] = warm_input
+        return warm_input
+
+    def _enforce_budget(self, keep: Path) -> None:
+        if self.max_memory is None:
+            return
+        n_bytes = self.n_bytes
+        for file in list(self._warm):
+            if n_bytes <= self.max_memory:
+                break
+            if file == keep:
+                continue
+            n_bytes -= _n_bytes(self._warm.pop(file))
+            logger.info(
+                f"The arrays of {file} are dropped (max_memory={self.max_memory})."
+            )
@@ -3,14 +3,18 @@
 Based on the implementation at:
 https://github.com/LLR-ILD/Ztau-identification/blob/4e92760a1204e0fe3a309ed2daa1f3688b8218ac/utils_llroot.py
 """
+import functools
+import hashlib
 import json
 import logging
-import urllib.request
+import os
 from collections import defaultdict
 from pathlib import Path
-from typing import DefaultDict, Dict
+from typing import Any, DefaultDict, Dict, Iterator, Optional, Tuple
 
 logger = logging.getLogger(__name__)
+CrossSectionsPerMachine = Dict[str, Dict[str, Dict[str, float]]]
+_standard_polarizations = {"eLpL", "eLpR", "eRpL", "eRpR"}
 
 
 class CrossSectionException(Exception):
@@ -42,22 +46,170 @@ def get_polarization_weights(pol=(0.8, -0.3)):
     return polarization_weights
 
 
+def iter_meta_entries(
+    meta_path: Path, chunk_size: int = 1 << 20
+) -> Iterator[Tuple[str, Any]]:
+    """The (key, value) pairs of the top level object of a JSON file.
+
+    The file is read in chunks: Only the current entry is held in memory,
+    not the whole (large) meta data file.
+    """
+    decoder = json.JSONDecoder()
+    with meta_path.open() as f:
+        buffer, pos, at_eof = "", 0, False
+
+        def next_char() -> str:
+            nonlocal buffer, pos, at_eof
+            while True:
+                while pos < len(buffer) and buffer[pos] in " \t\n\r":
+                    pos += 1
+                if pos < len(buffer):
+                    return buffer[pos]
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    at_eof = True
+                    raise CrossSectionException(f"{meta_path} ended unexpectedly.")
+                buffer, pos = chunk, 0
+
+        def decode() -> Any:
+            nonlocal buffer, pos, at_eof
+            next_char()
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, pos)
+                    # A number could continue in the next chunk.
+                    if end < len(buffer) or at_eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError as e:
+                    if at_eof:
+                        raise CrossSectionException(f"{meta_path}: {e}") from e
+                chunk = f.read(chunk_size)
+                at_eof = not chunk
+                buffer, pos = buffer[pos:] + chunk, 0
+
+        def expect(allowed: str) -> str:
+            nonlocal pos
+            char = next_char()
+            if char not in allowed:
+                raise CrossSectionException(
+                    f"{meta_path}: Expected one of {allowed!r}, found {char!r}."
+                )
+            pos += 1
+            return char
+
+        expect("{")
+        if next_char() == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            yield key, decode()
+            if expect(",}") == "}":
+                return
+
+
+def _as_float(cross_section: Any) -> float:
+    return float("inf") if cross_section == "" else float(cross_section)
+
+
+def build_cross_section_store(meta_path: Path, store_path: Path) -> None:
+    """Index the cross sections of all machines, in one pass over the meta file."""
+    machines: DefaultDict[str, DefaultDict[str, Dict]] = defaultdict(
+        lambda: defaultdict(dict)
+    )
+    for key, process_dict in iter_meta_entries(meta_path):
+        fields = key.split(".")
+        machine, process = fields[:2]
+        polarization = "".join(fields[-4:-2])
+        cross_section = _as_float(process_dict["cross_section_in_fb"])
+        machines[machine][polarization][process] = cross_section
+    stat = meta_path.stat()
+    store = {
+        "source": {
+            "path": str(meta_path.resolve()),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+        },
+        "machines": machines,
+    }
+    # Written to a temporary file first: Other processes might read the store.
+    tmp_path = store_path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("w") as f:
+        json.dump(store, f, sort_keys=True)
+    tmp_path.replace(store_path)
+    logger.info(
+        f"The cross sections of {len(machines)} machines from {meta_path} "
+        f"were indexed into {store_path}."
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _load_store(store_path: Path, mtime_ns: int) -> Dict[str, Any]:
+    """Memoized: The store is read once per process (and modification)."""
+    with store_path.open() as f:
+        return json.load(f)
+
+
+def load_cross_section_store(store_path: Path) -> Dict[str, Any]:
+    return _load_store(store_path, store_path.stat().st_mtime_ns)
+
+
 class CrossSections:
-    """Get process cross sections for an ILC machine scenario."""
+    """Get process cross sections for an ILC machine scenario.
+
+    The cross sections of all machines are indexed into a local store
+    (in `machine_dir`), built once from the meta data file.
+    For offline use, point `meta_json` (or the environment variable
+    `HIGGSTABLES_META_JSON`) to a local copy or stand-in of the meta data file.
+    """
 
     machine_dir = Path(__file__).parent / ".machines"
     meta_json = "genmetaByFile.json"
+    meta_json_env_var = "HIGGSTABLES_META_JSON"
     get_polarization_weights = get_polarization_weights
 
-    def __init__(self, machine: str) -> None:
+    def __init__(self, machine: str, meta_json: Optional[Path] = None) -> None:
         """Get process cross sections for an ILC machine scenario."""
         self._machine = machine
-        self.machine_path = self.machine_dir / f"{machine}.json"
+        if meta_json is None and os.environ.get(self.meta_json_env_var):
+            meta_json = Path(os.environ[self.meta_json_env_var])
+        self._is_default_meta = meta_json is None
+        self.meta_path = Path(meta_json or self.machine_dir / self.meta_json)
+        # The cross sections of this machine, also sent along to worker processes.
+        self._cross_sections = self._load_machine(machine)
+
+    def _store_path(self) -> Path:
+        if self._is_default_meta:
+            return self.machine_dir / "cross-sections.json"
+        digest = hashlib.sha1(str(self.meta_path.resolve()).encode()).hexdigest()
+        return self.machine_dir / f"cross-sections-{digest[:12]}.json"
 
-        if not self.machine_path.exists():
-            if not (self.machine_dir / self.meta_json).exists():
+    def _is_up_to_date(self, store_path: Path) -> bool:
+        if not store_path.exists():
+            return False
+        if not self.meta_path.exists():
+            return True  # Offline: The store is all we have.
+        source = load_cross_section_store(store_path)["source"]
+        stat = self.meta_path.stat()
+        return (source["size"], source["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns)
+
+    def _load_machine(self, machine: str) -> CrossSectionsPerMachine:
+        store_path = self._store_path()
+        if not self._is_up_to_date(store_path):
+            if not self.meta_path.exists():
+                if not self._is_default_meta:
+                    raise CrossSectionException(f"{self.meta_path} does not exist.")
                 self._download_meta_from_web()
-            self._extract_machine_cross_sections(machine)
+            self.machine_dir.mkdir(exist_ok=True)
+            build_cross_section_store(self.meta_path, store_path)
+        machines = load_cross_section_store(store_path)["machines"]
+        if machine not in machines:
+            raise CrossSectionException(
+                f"The machine specification `{machine}` "
+                "was not found in the lookup file. Maybe a spelling error?"
+            )
+        return machines[machine]
 
     def per_polarization(
         self, include_exotic: bool = False
@@ -66,20 +218,11 @@ class CrossSections:
 
         The form is cs[pol][process] = cs_in_fb.
         """
-        assert self.machine_path.exists()
-        with self.machine_path.open() as f:
-            machine_meta_data_str = json.load(f)
-
-        machine_meta_data: DefaultDict[str, Dict] = defaultdict(dict)
-        for polarization in machine_meta_data_str:
-            if not include_exotic:
-                if polarization not in {"eLpL", "eLpR", "eRpL", "eRpR"}:
-                    continue
-            for process, cs_string in machine_meta_data_str[polarization].items():
-                if cs_string == "":
-                    cs_string = "inf"
-                machine_meta_data[polarization][process] = float(cs_string)
-        return machine_meta_data
+        return {
+            polarization: dict(process_cs)
+            for polarization, process_cs in self._cross_sections.items()
+            if include_exotic or polarization in _standard_polarizations
+        }
 
     def polarization_weighted(self, polarization) -> Dict[str, Dict[str, float]]:
         weights = get_polarization_weights(polarization)
@@ -103,29 +246,16 @@ class CrossSections:
                 f"ILD simulation meta data not found at {all_meta_path}. "
                 "Downloading it can take a moment..."
             )
-            url = f"https://ild.ngt.ndu.ac.jp/CDS/files/{self.meta_json}"
-            urllib.request.urlretrieve(url, all_meta_path)
-
-    def _extract_machine_cross_sections(self, machine: str) -> None:
-        with (self.machine_dir / self.meta_json).open() as f:
-            meta_dict = json.load(f)
-        machine_cs_dict: DefaultDict[str, Dict] = defaultdict(dict)
-        for key, process_dict in meta_dict.items():
-            entry_machine, process = key.split(".")[:2]
-            if entry_machine != machine:
-                continue
-            polarization = "".join(key.split(".")[-4:-2])
-            cross_section = process_dict["cross_section_in_fb"]
-            machine_cs_dict[polarization][process] = cross_section
-
-        if len(machine_cs_dict) == 0:
-            raise CrossSectionException(
-                f"The machine specification `{machine}`"
-                "was not found in the lookup file. Maybe a spelling error?"
-            )
+            import urllib.request
 
-        with self.machine_path.open("w") as f:
-            json.dump(machine_cs_dict, f, indent=4, sort_keys=True)
+            url = f"https://ild.ngt.ndu.ac.jp/CDS/files/{self.meta_json}"
+            try:
+                urllib.request.urlretrieve(url, all_meta_path)
+            except OSError as e:
+                raise CrossSectionException(
+                    f"{url} could not be downloaded. To work offline, set "
+                    f"{self.meta_json_env_var} to a local copy of {self.meta_json}."
+                ) from e
 
 
 if __name__ == "__main__":
@@ -0,0 +1,102 @@
+"""Synthetic `simple_event_vector.root` files, e.g. for tests and benchmarks.
+
+The trees and branches are the ones used by the default configuration.
+The values are random, such that every category gets some entries.
+"""
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import uproot
+
+polarizations = ["eLpL", "eLpR", "eRpL", "eRpR"]
+# Not among the `ignored-processes` of the default configuration.
+default_processes = ["Pn1n1h", "Pqqh", "P2f_z_h", "P4f_zz_sl"]
+entries_per_basket = 100_000
+
+_category_branches = {
+    "n_iso_leptons": np.int32,
+    "n_iso_photons": np.int32,
+    "n_pfos": np.int32,
+    "b_tag1": np.float32,
+    "b_tag2": np.float32,
+    "c_tag1": np.float32,
+    "c_tag2": np.float32,
+    "m_h": np.float32,
+    "e_h": np.float32,
+    "e2e2_mass": np.float32,
+    "aZ_a_energy": np.float32,
+    "aZ_other_mass": np.float32,
+    "aZ_a_cos_theta": np.float32,
+    "weight": np.float32,
+}
+_z_branches = {
+    "m_z": np.float32,
+    "m_recoil": np.float32,
+    "cos_theta_miss": np.float32,
+    "weight": np.float32,
+}
+
+
+def write_synthetic_rootfile(path: Path, n_events: int, seed: int) -> None:
+    """Mimic the trees of a `simple_event_vector.root` file from `make_event_vector`."""
+    rng = np.random.default_rng(seed)
+    n_before_preselection = n_events + rng.integers(0, n_events // 2 + 1)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with uproot.recreate(path) as f:
+        f["preselection_passed_"] = (
+            np.array([n_events, n_before_preselection - n_events], dtype=float),
+            np.array([0.0, 1.0, 2.0]),
+        )
+        z_variables = {
+            "m_z": rng.normal(91.19, 6, n_events).astype(np.float32),
+            "m_recoil": rng.normal(126, 4, n_events).astype(np.float32),
+            "cos_theta_miss": rng.uniform(-1, 1, n_events).astype(np.float32),
+        }
+        event_vector = {
+            "n_iso_leptons": rng.poisson(0.5, n_events).astype(np.int32),
+            "n_iso_photons": rng.poisson(0.3, n_events).astype(np.int32),
+            "n_pfos": rng.integers(0, 60, n_events).astype(np.int32),
+            "b_tag1": rng.uniform(0, 1, n_events).astype(np.float32),
+            "b_tag2": rng.uniform(0, 1, n_events).astype(np.float32),
+            "c_tag1": rng.uniform(0, 1, n_events).astype(np.float32),
+            "c_tag2": rng.uniform(0, 1, n_events).astype(np.float32),
+            "m_h": rng.normal(125, 15, n_events).astype(np.float32),
+            "e_h": rng.normal(125, 15, n_events).astype(np.float32),
+            "e2e2_mass": rng.normal(110, 20, n_events).astype(np.float32),
+            "aZ_a_energy": rng.uniform(0, 80, n_events).astype(np.float32),
+            "aZ_other_mass": rng.normal(90, 10, n_events).astype(np.float32),
+            "aZ_a_cos_theta": rng.uniform(-1, 1, n_events).astype(np.float32),
+        }
+        # An event weight, shared by both trees.
+        weight = rng.gamma(4, 0.25, n_events).astype(np.float32)
+        z_variables["weight"] = event_vector["weight"] = weight
+        f.mktree("z_variables", _z_branches)
+        f.mktree("simple_event_vector", _category_branches)
+        # Several baskets for large files, as in a real production.
+        for start in range(0, n_events, entries_per_basket):
+            stop = start + entries_per_basket
+            f["z_variables"].extend({k: v[start:stop] for k, v in z_variables.items()})
+            f["simple_event_vector"].extend(
+                {k: v[start:stop] for k, v in event_vector.items()}
+            )
+
+
+def write_synthetic_production(
+    folder: Path, n_events: int, n_processes: int = 4, seed: int = 0
+) -> List[Path]:
+    """A file per process and polarization, in the folders of the default config."""
+    processes = default_processes[:n_processes]
+    processes += [f"Pprocess{i}" for i in range(len(processes), n_processes)]
+    rootfiles = []
+    for i_pol, polarization in enumerate(polarizations):
+        for i_proc, process in enumerate(processes):
+            rootfile = (
+                Path(folder) / polarization / process / "simple_event_vector.root"
+            )
+            write_synthetic_rootfile(
+                rootfile, n_events, seed + n_processes * i_pol + i_proc
+            )
+            rootfiles.append(rootfile)
+    return rootfiles
@@ -0,0 +1,28 @@
+from pathlib import Path
+
+import pytest
+
+from higgstables.config.load_config import _load_config_dict
+from higgstables.synthetic import (
+    default_processes,
+    polarizations,
+    write_synthetic_rootfile,
+)
+
+
+@pytest.fixture(scope="session")
+def data_source(tmp_path_factory) -> Path:
+    """A small production with the folder structure expected by the default config."""
+    source = tmp_path_factory.mktemp("data_source")
+    for i_pol, polarization in enumerate(polarizations):
+        for i_proc, process in enumerate(default_processes):
+            seed = 10 * i_pol + i_proc
+            n_events = 500 + 400 * i_proc
+            rootfile = source / polarization / process / "simple_event_vector.root"
+            write_synthetic_rootfile(rootfile, n_events, seed)
+    return source
+
+
+@pytest.fixture
+def config_dict():
+    return _load_config_dict(None)
@@ -0,0 +1,87 @@
+import logging
+import re
+
+import pytest
+import uproot
+
+from higgstables.config import Config
+from higgstables.handle_root_files import FileToCounts
+from higgstables.handle_root_files.branch_cache import BranchCache
+from higgstables.handle_root_files.root_to_table import FileToDf
+
+
+@pytest.fixture
+def rootfile(data_source):
+    return data_source / "eLpR" / "P4f_zz_sl" / "simple_event_vector.root"
+
+
+@pytest.fixture
+def arrays_calls(monkeypatch):
+    """Per call of `TTree.arrays`, the tree name and the branches read."""
+    calls = []
+    arrays = uproot.behaviors.TTree.TTree.arrays
+
+    def spy(tree, *args, **kwargs):
+        result = arrays(tree, *args, **kwargs)
+        calls.append((tree.name, set(result)))
+        return result
+
+    monkeypatch.setattr(uproot.behaviors.TTree.TTree, "arrays", spy)
+    return calls
+
+
+@pytest.fixture
+def prefetched(monkeypatch):
+    """Per tree, the variables requested through `BranchCache.prefetch`."""
+    requested = {}
+    prefetch = BranchCache.prefetch
+
+    def spy(self, vars_per_tree):
+        for var_tree, variables in vars_per_tree.items():
+            requested.setdefault(var_tree, set()).update(variables)
+        return prefetch(self, vars_per_tree)
+
+    monkeypatch.setattr(BranchCache, "prefetch", spy)
+    return requested
+
+
+def test_one_read_per_tree(rootfile, config_dict, arrays_calls, monkeypatch):
+    config = Config(config_dict, no_cs=True)
+    monkeypatch.setattr(
+        uproot.TBranch, "array", lambda *args, **kwargs: pytest.fail("Not batched.")
+    )
+    FileToCounts(rootfile, config)
+    needed = config.variables_per_tree()
+    assert sorted(tree for tree, _ in arrays_calls) == sorted(needed)
+    assert dict(arrays_calls) == needed
+
+
+def test_categories_only_when_needed(rootfile, config_dict, prefetched):
+    config = Config(config_dict, no_cs=True)
+    FileToDf(rootfile, config)
+    assert prefetched == config.variables_per_tree(with_categories=False)
+    category_only = config.category_variables - set().union(*prefetched.values())
+    assert category_only
+
+    prefetched.clear()
+    config_dict["higgstables"]["df"]["category-column"] = True
+    FileToDf(rootfile, Config(config_dict, no_cs=True))
+    assert category_only <= set().union(*prefetched.values())
+
+
+def test_read_bytes_are_logged(rootfile, config_dict, caplog):
+    config = Config(config_dict, no_cs=True)
+    with caplog.at_level(logging.DEBUG, logger=BranchCache.__module__):
+        FileToCounts(rootfile, config)
+    pattern = re.compile(
+        r"Read (\d+) branches from (\w+) "
+        r"\(([\d.]+) MB compressed, ([\d.]+) MB in memory\)"
+    )
+    matches = [pattern.match(r.getMessage()) for r in caplog.records]
+    reads = {m.group(2): m for m in matches if m is not None}
+    needed = config.variables_per_tree()
+    assert set(reads) == set(needed)
+    for var_tree, match in reads.items():
+        assert int(match.group(1)) == len(needed[var_tree])
+        assert float(match.group(3)) > 0
+        assert float(match.group(4)) > 0
@@ -1,7 +1,10 @@
+import pickle
+
+import numpy as np
 import pytest
 
 from higgstables.config import Config, _default_yaml_path
-from higgstables.config.load_config import load_config
+from higgstables.config.load_config import load_config, merge_config_dicts
 from higgstables.config.util import InvalidConfigurationError
 
 
@@ -20,3 +23,58 @@ def test_invalid_category_expression_raises_error():
     faulty_dict["higgstables"]["categories"]["new_cat"] = "this is invalid!"
     with pytest.raises(InvalidConfigurationError):
         Config(faulty_dict)
+
+
+def test_compiled_selectors_are_reused_and_picklable(config_dict):
+    config = Config(config_dict, no_cs=True)
+    first = dict(config.categories_wrapped_as_triggers())
+    second = dict(config.categories_wrapped_as_triggers())
+    assert all(first[key] is second[key] for key in config.categories)
+
+    arrays = {var: np.arange(5, dtype=np.float32) for var in first["bb"].variables}
+    unpickled = pickle.loads(pickle.dumps(config))
+    unpickled_bb = dict(unpickled.categories_wrapped_as_triggers())["bb"]
+    np.testing.assert_array_equal(
+        unpickled_bb.expression(arrays), first["bb"].expression(arrays)
+    )
+
+
+def test_identical_clauses_are_shared(config_dict):
+    config = Config(config_dict, no_cs=True)
+    categories = dict(config.categories_wrapped_as_triggers())
+    no_iso = categories["cc"].clauses[0]
+    assert all(categories[k].clauses[0] is no_iso for k in ["bb_tight", "bb"])
+
+    z_trigger = [t for t in config.triggers if t.tree == "z_variables"][0]
+    z_preselection = list(config.preselections)[0]
+    assert all(a is b for a, b in zip(z_trigger.clauses, z_preselection.clauses))
+
+
+def test_sweep_overrides_replace_whole_fields(config_dict):
+    overrides = {"higgstables": {"categories": {"all": ["n_pfos >= 0"]}}}
+    merged = merge_config_dicts(config_dict, overrides)
+    assert list(merged["higgstables"]["categories"]) == ["all"]
+    assert merged["higgstables"]["triggers"] == config_dict["higgstables"]["triggers"]
+    assert len(config_dict["higgstables"]["categories"]) > 1
+
+
+@pytest.mark.parametrize(
+    "scan",
+    [
+        dict(category="no_such_category", clause="b_tag1 > 0.8", values=[0.5]),
+        dict(category="bb", clause="b_tag2 > 0.8", values=[0.5]),
+        dict(category="light_quark", clause="b_tag1 + c_tag1 < 0.5", values=[0.5]),
+        dict(category="bb", clause="b_tag1 > 0.8", values="many"),
+        dict(category="bb", clause="b_tag1 > 0.8"),
+    ],
+)
+def test_invalid_scan_raises_error(config_dict, scan):
+    config_dict["higgstables"]["scan"] = scan
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
+
+
+def test_weight_needed_for_every_counted_tree(config_dict):
+    config_dict["higgstables"]["weight"] = {"simple_event_vector": "weight"}
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from higgstables.handle_root_files.count_accumulator import CountAccumulator
+
+categories = ["unselected", "bb", "rest"]
+
+
+def file_counts(process, counts, sumw=None):
+    quantities = {"count": pd.Series(counts, index=categories, name=process)}
+    if sumw is not None:
+        quantities["sumw"] = pd.Series(sumw, index=categories, name=process)
+    return quantities
+
+
+def test_add_sums_per_process():
+    accumulator = CountAccumulator()
+    for i in range(20):  # Beyond the first block of rows.
+        accumulator.add(file_counts(f"P{i % 10}", [i, 1, 2], [0.5, 1.0, i]))
+    tables = accumulator.to_tables()
+    assert list(tables["count"].index) == [f"P{i}" for i in range(10)]
+    assert list(tables["count"].columns) == categories
+    assert (tables["count"].dtypes == np.int64).all()
+    assert (tables["sumw"].dtypes == np.float64).all()
+    assert tables["count"].loc["P3"].tolist() == [3 + 13, 2, 4]
+    assert tables["sumw"].loc["P3"].tolist() == [1.0, 2.0, 16.0]
+
+
+def test_merge_matches_single_accumulator():
+    inputs = [file_counts(f"P{i % 3}", [i, 2 * i, 1]) for i in range(7)]
+    single = CountAccumulator()
+    for counts in inputs:
+        single.add(counts)
+    first, second = CountAccumulator(), CountAccumulator()
+    for counts in inputs[:4]:
+        first.add(counts)
+    for counts in inputs[4:]:
+        second.add(counts)
+    first.merge(second)
+    pd.testing.assert_frame_equal(
+        first.to_tables()["count"], single.to_tables()["count"]
+    )
+
+
+def test_reordered_and_other_categories():
+    accumulator = CountAccumulator(categories)
+    accumulator.add(
+        {"count": pd.Series([2, 1, 0], index=["rest", "bb", "unselected"], name="P")}
+    )
+    assert accumulator.to_tables()["count"].iloc[0].tolist() == [0, 1, 2]
+    accumulator.add({"count": pd.Series([0.5, 1, 2], index=categories, name="P")})
+    assert accumulator.to_tables()["count"].iloc[0].tolist() == [0.5, 2, 4]
+    with pytest.raises(ValueError):
+        accumulator.add({"count": pd.Series([1, 2], index=["bb", "cc"], name="P")})
@@ -1,9 +1,14 @@
+import json
+import pickle
+
 import pytest
 
+from higgstables.ild_specific import get_cross_sections
 from higgstables.ild_specific.get_cross_sections import (
     CrossSectionException,
     CrossSections,
     get_polarization_weights,
+    iter_meta_entries,
 )
 
 valid_machines = ["E250-SetA", "E250-TDR_ws"]
@@ -59,3 +64,70 @@ def test_polarization_weighted(machine):
     polarizations.update(set(by_hand_weighted.keys()))
     for pol in polarizations:
         assert evenly_weighted[pol] == pytest.approx(by_hand_weighted[pol])
+
+
+def _write_meta_stand_in(path):
+    """A small file in the format of `genmetaByFile.json`."""
+    meta = {}
+    entries = [
+        ("E250-SetA", "Pqqh", "eL", "pR", "68.4"),
+        ("E250-SetA", "Pqqh", "eR", "pL", "43.9"),
+        ("E250-SetA", "Pn1n1h", "eL", "pR", ""),
+        ("E250-SetA", "Pn1n1h", "eW", "pB", "1.5"),  # An exotic polarization.
+        ("E500-TDR_ws", "Pqqh", "eL", "pR", "31.2"),
+    ]
+    for i, (machine, process, e, p, cs) in enumerate(entries):
+        key = f"{machine}.{process}.Gwhizard-2_8_5.{e}.{p}.I{40000 + i}.001"
+        meta[key] = {"cross_section_in_fb": cs, "process_names": process}
+    path.write_text(json.dumps(meta, indent=1))
+    return meta
+
+
+@pytest.fixture
+def meta_stand_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(CrossSections, "machine_dir", tmp_path / "machines")
+    meta_path = tmp_path / "genmetaByFile.json"
+    _write_meta_stand_in(meta_path)
+    return meta_path
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1 << 20])
+def test_iter_meta_entries(tmp_path, chunk_size):
+    meta = _write_meta_stand_in(tmp_path / "meta.json")
+    entries = iter_meta_entries(tmp_path / "meta.json", chunk_size)
+    assert dict(entries) == meta
+
+
+def test_offline_cross_sections(meta_stand_in, monkeypatch):
+    monkeypatch.setenv(CrossSections.meta_json_env_var, str(meta_stand_in))
+    cs = CrossSections("E250-SetA").per_polarization()
+    assert cs == {
+        "eLpR": {"Pqqh": 68.4, "Pn1n1h": float("inf")},
+        "eRpL": {"Pqqh": 43.9},
+    }
+    exotic = CrossSections("E250-SetA").per_polarization(include_exotic=True)
+    assert exotic["eWpB"] == {"Pn1n1h": 1.5}
+    assert CrossSections("E500-TDR_ws").per_polarization() == {"eLpR": {"Pqqh": 31.2}}
+    with pytest.raises(CrossSectionException):
+        CrossSections("E350-unknown")
+
+
+def test_cross_section_store_is_built_once(meta_stand_in, monkeypatch):
+    CrossSections("E250-SetA", meta_stand_in)
+
+    def fail(*args):
+        raise AssertionError("The meta data file is parsed again.")
+
+    monkeypatch.setattr(get_cross_sections, "iter_meta_entries", fail)
+    cross_sections = CrossSections("E500-TDR_ws", meta_stand_in)
+    # Without the meta file (offline), the store is used as it is.
+    meta_stand_in.unlink()
+    unpickled = pickle.loads(pickle.dumps(CrossSections("E250-SetA", meta_stand_in)))
+    assert unpickled.per_polarization()["eRpL"] == {"Pqqh": 43.9}
+    assert cross_sections.per_polarization()["eLpR"] == {"Pqqh": 31.2}
+
+
+def test_missing_meta_stand_in(tmp_path, monkeypatch):
+    monkeypatch.setattr(CrossSections, "machine_dir", tmp_path / "machines")
+    with pytest.raises(CrossSectionException):
+        CrossSections("E250-SetA", tmp_path / "missing.json")
@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from higgstables.config import Config
+from higgstables.handle_root_files import (
+    DfFromFiles,
+    InMemoryDfs,
+    InMemoryTables,
+    TablesFromFiles,
+)
+from higgstables.handle_root_files.count_accumulator import CountAccumulator
+from higgstables.synthetic import polarizations
+
+
+@pytest.fixture
+def config(config_dict):
+    config_dict["higgstables"]["format"] = "pickle"
+    config_dict["higgstables"]["weight"] = "weight"
+    return Config(config_dict, no_cs=True)
+
+
+def test_tables_match_written_tables(data_source, config, tmp_path):
+    TablesFromFiles(data_source, tmp_path, config)
+    tables = InMemoryTables(data_source, config).tables()
+    assert list(tables) == polarizations
+    for pol in polarizations:
+        for quantity, name in [("count", pol), ("sumw", f"{pol}_sumw")]:
+            written = pd.read_pickle(tmp_path / f"{name}.pkl")
+            pd.testing.assert_frame_equal(tables[pol][quantity], written)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_file_counts_from_file_lists(data_source, config, n_jobs):
+    files = {pol: sorted(data_source.glob(f"{pol}/*/*.root")) for pol in ["eLpR"]}
+    in_memory = InMemoryTables(files, config, n_jobs=n_jobs)
+    accumulator = CountAccumulator()
+    n_files = 0
+    for name, file_counts in in_memory.iter_file_counts():
+        assert name == "eLpR"
+        accumulator.add(file_counts)
+        n_files += 1
+    assert n_files == len(files["eLpR"])
+    tables = in_memory.tables()
+    pd.testing.assert_frame_equal(
+        accumulator.to_tables()["count"], tables["eLpR"]["count"]
+    )
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_stop_early(data_source, config, n_jobs):
+    in_memory = InMemoryTables(data_source, config, n_jobs=n_jobs)
+    file_counts = in_memory.iter_file_counts()
+    name, _ = next(file_counts)
+    file_counts.close()
+    assert name == polarizations[0]
+    assert in_memory._executor is None
+    assert next(in_memory.iter_tables())[0] == polarizations[0]
+
+
+def test_dfs_match_written_dfs(data_source, config_dict, config, tmp_path, monkeypatch):
+    DfFromFiles(data_source, tmp_path, config)
+    # Nothing is written, also not with `partitioned`.
+    config_dict["higgstables"]["format"] = "parquet"
+    config_dict["higgstables"]["df"]["partitioned"] = True
+    partitioned = Config(config_dict, no_cs=True)
+    (tmp_path / "cwd").mkdir()
+    monkeypatch.chdir(tmp_path / "cwd")
+    in_memory = InMemoryDfs(data_source, partitioned)
+    dfs = in_memory.dfs()
+    for pol in polarizations:
+        pd.testing.assert_frame_equal(dfs[pol], pd.read_pickle(tmp_path / f"{pol}.pkl"))
+    per_file = [df for name, df in in_memory.iter_file_dfs() if name == "eRpL"]
+    pd.testing.assert_frame_equal(pd.concat(per_file), dfs["eRpL"])
+    assert not list((tmp_path / "cwd").iterdir())
@@ -0,0 +1,57 @@
+import pandas as pd
+
+from higgstables.config import Config
+from higgstables.handle_root_files import TablesFromFiles
+from higgstables.handle_root_files.result_cache import ResultCache
+
+
+def build_tables(data_source, data_dir, config, cache_dir, **kwargs):
+    data_dir.mkdir()
+    tables = TablesFromFiles(
+        data_source, data_dir, config, cache_dir=cache_dir, **kwargs
+    )
+    return tables._cache, pd.read_csv(data_dir / "eLpR.csv", index_col=0)
+
+
+def test_rerun_uses_cache(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    cache_dir = tmp_path / "cache"
+    first_cache, first = build_tables(data_source, tmp_path / "a", config, cache_dir)
+    assert first_cache.n_hits == 0
+    second_cache, second = build_tables(data_source, tmp_path / "b", config, cache_dir)
+    assert second_cache.n_misses == 0
+    pd.testing.assert_frame_equal(first, second)
+
+    config_dict["higgstables"]["categories"]["bb"] = "b_tag1 > 0.5"
+    changed_config = Config(config_dict, no_cs=True)
+    third_cache, third = build_tables(
+        data_source, tmp_path / "c", changed_config, cache_dir
+    )
+    assert third_cache.n_hits == 0
+    assert not third.equals(first)
+
+
+def test_partially_cached_with_jobs(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    cache_dir = tmp_path / "cache"
+    _, first = build_tables(data_source, tmp_path / "a", config, cache_dir)
+    entries = sorted(cache_dir.glob("*/*.json"))
+    for entry in entries[::2]:
+        entry.unlink()
+    cache, second = build_tables(
+        data_source, tmp_path / "b", config, cache_dir, n_jobs=2
+    )
+    assert cache.n_hits == len(entries) - len(entries[::2])
+    pd.testing.assert_frame_equal(first, second)
+
+
+def test_lru_eviction(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    cache_dir = tmp_path / "cache"
+    build_tables(data_source, tmp_path / "a", config, cache_dir, cache_max_size=1000)
+    entries = list(cache_dir.glob("*/*.json"))
+    assert 0 < sum(entry.stat().st_size for entry in entries) <= 1000
+
+    cache = ResultCache(cache_dir, config, max_size=0)
+    cache.evict()
+    assert not list(cache_dir.glob("*/*.json"))
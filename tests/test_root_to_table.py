@@ -0,0 +1,588 @@
+import copy
+
+import numexpr
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+import uproot
+
+from higgstables.config import Config
+from higgstables.config.util import InvalidConfigurationError
+from higgstables.handle_root_files import (
+    DfFromFiles,
+    FileToCounts,
+    InMemoryDfs,
+    InMemoryTables,
+    ScanTablesFromFiles,
+    SweepTablesFromFiles,
+    TablesAndDfFromFiles,
+    TablesFromFiles,
+    pipeline,
+)
+from higgstables.handle_root_files.parquet_output import PartitionedParquetWriter
+from higgstables.handle_root_files.profiling import ProfileReport, stage_names
+from higgstables.handle_root_files.root_to_table import FileToDf, _file_to_counts
+
+polarizations = ["eLpL", "eLpR", "eRpL", "eRpR"]
+
+
+def read_tables(data_dir):
+    return {
+        pol: pd.read_csv(data_dir / f"{pol}.csv", index_col=0) for pol in polarizations
+    }
+
+
+def test_counts_add_up(data_source, config_dict):
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eLpR" / "Pqqh" / "simple_event_vector.root"
+    row_cells = FileToCounts(rootfile, config).row_cells
+    assert list(row_cells) == ["unselected"] + list(config.categories)
+    n_in_tree = 900  # See the `data_source` fixture.
+    n_categorized = sum(v for k, v in row_cells.items() if k != "unselected")
+    assert 0 < n_categorized <= n_in_tree
+    assert row_cells["unselected"] > 0
+
+
+def test_files_of_a_process_add_up(data_source, config_dict, tmp_path):
+    """Each file is counted once, also the first file of a table."""
+    config_dict["higgstables"]["tables"] = {"Pqqh": "*/Pqqh/simple_event_vector.root"}
+    config = Config(config_dict, no_cs=True)
+    TablesFromFiles(data_source, tmp_path, config)
+    table = pd.read_csv(tmp_path / "Pqqh.csv", index_col=0)
+    rootfiles = sorted(data_source.glob("*/Pqqh/simple_event_vector.root"))
+    assert len(rootfiles) > 1
+    per_file = [pd.Series(FileToCounts(f, config).row_cells) for f in rootfiles]
+    pd.testing.assert_series_equal(table.loc["Pqqh"], sum(per_file), check_names=False)
+
+
+def test_parallel_tables_match_serial(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "parallel").mkdir()
+    TablesFromFiles(data_source, tmp_path / "serial", config)
+    TablesFromFiles(data_source, tmp_path / "parallel", config, n_jobs=2)
+    serial = read_tables(tmp_path / "serial")
+    parallel = read_tables(tmp_path / "parallel")
+    for pol in polarizations:
+        pd.testing.assert_frame_equal(serial[pol], parallel[pol])
+
+
+def test_parallel_dfs_match_serial(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    (tmp_path / "serial").mkdir()
+    (tmp_path / "parallel").mkdir()
+    DfFromFiles(data_source, tmp_path / "serial", config)
+    DfFromFiles(data_source, tmp_path / "parallel", config, n_jobs=2)
+    serial = read_tables(tmp_path / "serial")
+    parallel = read_tables(tmp_path / "parallel")
+    for pol in polarizations:
+        pd.testing.assert_frame_equal(serial[pol], parallel[pol])
+
+
+def test_pool_reads_inputs_lazily(data_source, config_dict):
+    """Only `2 * n_jobs` inputs are submitted, but not yet yielded."""
+    rootfiles = sorted(data_source.glob("*/*/*.root"))
+    n_read = 0
+
+    def inputs():
+        nonlocal n_read
+        for rootfile in rootfiles:
+            n_read += 1
+            yield rootfile
+
+    tables = InMemoryTables(data_source, Config(config_dict, no_cs=True), n_jobs=2)
+    processes = []
+    with tables._running(len(rootfiles)):
+        for file_counts in tables._map_files(_file_to_counts, inputs()):
+            processes.append(file_counts["count"].name)
+            assert n_read <= len(processes) - 1 + 2 * 2
+    assert processes == [rootfile.parent.name for rootfile in rootfiles]
+
+
+def test_invalid_number_of_jobs(data_source, config_dict, tmp_path):
+    with pytest.raises(ValueError):
+        TablesFromFiles(
+            data_source, tmp_path, Config(config_dict, no_cs=True), n_jobs=0
+        )
+
+
+@pytest.mark.parametrize("step_size", [13, 97, "2 kB", 10**6])
+def test_streaming_counts_match_in_memory(data_source, config_dict, step_size):
+    rootfile = data_source / "eRpL" / "P4f_zz_sl" / "simple_event_vector.root"
+    in_memory = FileToCounts(rootfile, Config(config_dict, no_cs=True)).row_cells
+    config_dict["higgstables"]["step-size"] = step_size
+    streamed = FileToCounts(rootfile, Config(config_dict, no_cs=True)).row_cells
+    assert streamed == in_memory
+
+
+@pytest.mark.parametrize("step_size", [0, -5, "many", True])
+def test_invalid_step_size(config_dict, step_size):
+    config_dict["higgstables"]["step-size"] = step_size
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
+
+
+def test_category_index_is_first_match(data_source, config_dict):
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eLpL" / "P2f_z_h" / "simple_event_vector.root"
+    file_to_counts = FileToCounts(rootfile, config)
+    _, keep_mask = file_to_counts.run_preselections()
+    index = file_to_counts.category_index(keep_mask)
+    assert index.dtype == np.int8
+
+    expected = np.full(len(index), -1)
+    remaining = keep_mask.copy()
+    for i, (_, selection) in enumerate(config.categories_wrapped_as_triggers()):
+        is_in_category = file_to_counts._get_condition_mask(selection)
+        expected[remaining & is_in_category] = i
+        remaining &= ~is_in_category
+    np.testing.assert_array_equal(index, expected)
+
+
+def test_df_category_column(data_source, config_dict):
+    config_dict["higgstables"]["df"]["category-column"] = True
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eRpR" / "Pn1n1h" / "simple_event_vector.root"
+    df = FileToDf(rootfile, config).as_df()
+    category_counts = df["category"].value_counts()
+    for category, count in FileToCounts(rootfile, config).row_cells.items():
+        if category != "unselected":
+            assert category_counts[category] == count
+
+
+@pytest.mark.parametrize("in_one_category", [False, True])
+def test_many_category_clauses(data_source, config_dict, in_one_category):
+    """More clauses than numexpr accepts as inputs in a single expression."""
+    rootfile = data_source / "eLpL" / "Pqqh" / "simple_event_vector.root"
+    config_dict["higgstables"]["compaction-threshold"] = False
+    categories = config_dict["higgstables"]["categories"]
+    rest = categories.pop("rest")
+    if in_one_category:
+        categories["many_pfos"] = [f"n_pfos > {i}" for i in range(70)]
+    else:
+        for i in range(40):
+            categories[f"m_h_above_{i}"] = [f"m_h > {150 - i}", "n_pfos > 10"]
+    categories["rest"] = rest
+    config = Config(config_dict, no_cs=True)
+    steps = config.category_index_steps()
+    if in_one_category:
+        i = list(categories).index("many_pfos")
+        assert [list(step.combined) for step in steps] == [
+            [f"_higgstables_category_{i}"]
+        ]
+    else:
+        assert len(steps) > 1
+
+    file_to_counts = FileToCounts(rootfile, config)
+    _, keep_mask = file_to_counts.run_preselections()
+    expected = np.full(len(keep_mask), -1)
+    remaining = keep_mask.copy()
+    for i, (_, selection) in enumerate(config.categories_wrapped_as_triggers()):
+        is_in_category = numexpr.evaluate(
+            selection.condition, file_to_counts._get_array_dict(selection)
+        )
+        expected[remaining & is_in_category] = i
+        remaining &= ~is_in_category
+    np.testing.assert_array_equal(file_to_counts.category_index(keep_mask), expected)
+
+
+@pytest.mark.parametrize("step_size", [None, 1000])
+def test_compacted_categories_match_fused(data_source, config_dict, step_size):
+    config_dict["higgstables"]["weight"] = "weight"
+    config_dict["higgstables"]["step-size"] = step_size
+    fused = Config(config_dict, no_cs=True)
+    fused.compaction_threshold = False
+    rootfiles = sorted(data_source.glob("*/*/simple_event_vector.root"))[:6]
+    for threshold in [0.5, 1.0, 0.01]:
+        config_dict["higgstables"]["compaction-threshold"] = threshold
+        config = Config(config_dict, no_cs=True)
+        for rootfile in rootfiles:
+            expected = FileToCounts(rootfile, fused)
+            file_to_counts = FileToCounts(rootfile, config)
+            assert file_to_counts.row_cells == expected.row_cells
+            assert file_to_counts.sumw == pytest.approx(expected.sumw)
+        assert config.clause_statistics
+
+
+@pytest.mark.parametrize("threshold", [0, 1.5, "half"])
+def test_invalid_compaction_threshold(config_dict, threshold):
+    config_dict["higgstables"]["compaction-threshold"] = threshold
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_sweep_matches_separate_runs(data_source, config_dict, tmp_path, n_jobs):
+    base = Config(config_dict, no_cs=True)
+    tight = copy.deepcopy(config_dict)
+    preselection = {"tree": "z_variables", "condition": ["m_recoil > 124"]}
+    tight["higgstables"]["preselections"] = [preselection]
+    tight["higgstables"]["step-size"] = 97
+    categories = {"bb": ["b_tag1 > 0.8", "b_tag2 > 0.8"], "rest": ["n_pfos >= 0"]}
+    tight["higgstables"]["categories"] = categories
+    sweep_configs = {"base": base, "tight": Config(tight, no_cs=True)}
+    (tmp_path / "sweep").mkdir()
+    SweepTablesFromFiles(
+        data_source, tmp_path / "sweep", base, sweep_configs, n_jobs=n_jobs
+    )
+    for name, config in sweep_configs.items():
+        (tmp_path / name).mkdir()
+        TablesFromFiles(data_source, tmp_path / name, config)
+        separate = read_tables(tmp_path / name)
+        swept = read_tables(tmp_path / "sweep" / name)
+        for pol in polarizations:
+            pd.testing.assert_frame_equal(separate[pol], swept[pol])
+
+
+@pytest.mark.parametrize(
+    "category, conditions, values",
+    [
+        # With 0.8, the scanned clause is the same as in `bb_tight`.
+        ("bb", ["n_iso_leptons == 0", "b_tag1 > {}"], [0.3, 0.95, 2.0, 0.8]),
+        ("tau", ["n_pfos < {}", "n_iso_leptons == 0"], [0, 15, 30]),
+        ("e2e2", ["e2e2_mass > 100", "{} > e2e2_mass"], [100, 120.5]),
+    ],
+)
+def test_scan_matches_separate_runs(
+    data_source, config_dict, tmp_path, category, conditions, values
+):
+    """The clause with the placeholder is scanned."""
+    i_clause = next(i for i, c in enumerate(conditions) if "{}" in c)
+    categories = config_dict["higgstables"]["categories"]
+    scan_dict = copy.deepcopy(config_dict)
+    scan_conditions = [c.format(values[-1]) for c in conditions]
+    scan_dict["higgstables"]["categories"][category] = scan_conditions
+    scan_dict["higgstables"]["scan"] = dict(
+        category=category, clause=scan_conditions[i_clause], values=values
+    )
+    (tmp_path / "scan").mkdir()
+    ScanTablesFromFiles(data_source, tmp_path / "scan", Config(scan_dict, no_cs=True))
+    scan_tables = {
+        pol: pd.read_csv(tmp_path / "scan" / f"{pol}.csv", index_col=[0, 1])
+        for pol in polarizations
+    }
+
+    for value in values:
+        categories[category] = [c.format(value) for c in conditions]
+        (tmp_path / str(value)).mkdir()
+        TablesFromFiles(data_source, tmp_path / str(value), Config(config_dict, True))
+        separate = read_tables(tmp_path / str(value))
+        for pol in polarizations:
+            scanned = scan_tables[pol].xs(float(value), level="threshold")
+            pd.testing.assert_frame_equal(
+                separate[pol], scanned, check_dtype=False, check_names=False
+            )
+
+
+def test_weighted_counts(data_source, config_dict):
+    config_dict["higgstables"]["weight"] = "weight"
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eRpL" / "Pqqh" / "simple_event_vector.root"
+    file_to_counts = FileToCounts(rootfile, config)
+    with uproot.open(rootfile) as f:
+        w = f["simple_event_vector"]["weight"].array(library="np").astype(np.float64)
+        bin_counts = f["preselection_passed_"].to_numpy()[0]
+    _, keep_mask = file_to_counts.run_preselections()
+    index = file_to_counts.category_index(keep_mask)
+    (trigger,) = [t for t in config.triggers if t.type != "histogram"]
+    not_selected = ~file_to_counts._get_condition_mask(trigger)
+    assert file_to_counts.sumw["unselected"] == pytest.approx(
+        bin_counts[1] + w[not_selected].sum() + w[~keep_mask].sum()
+    )
+    for i, category in enumerate(config.categories):
+        assert file_to_counts.sumw[category] == pytest.approx(w[index == i].sum())
+        assert file_to_counts.sumw2[category] == pytest.approx(
+            (w[index == i] ** 2).sum()
+        )
+    unweighted = FileToCounts(rootfile, Config(config_dict, no_cs=True)).row_cells
+    assert file_to_counts.row_cells == unweighted
+
+
+def test_weighted_tables(data_source, config_dict, tmp_path):
+    (tmp_path / "unweighted").mkdir()
+    TablesFromFiles(data_source, tmp_path / "unweighted", Config(config_dict, True))
+    config_dict["higgstables"]["weight"] = {
+        "z_variables": "weight",
+        "simple_event_vector": "weight",
+    }
+    (tmp_path / "weighted").mkdir()
+    TablesFromFiles(data_source, tmp_path / "weighted", Config(config_dict, True))
+    unweighted = read_tables(tmp_path / "unweighted")
+    weighted = read_tables(tmp_path / "weighted")
+    for pol in polarizations:
+        pd.testing.assert_frame_equal(unweighted[pol], weighted[pol])
+        sumw = pd.read_csv(tmp_path / "weighted" / f"{pol}_sumw.csv", index_col=0)
+        sumw2 = pd.read_csv(tmp_path / "weighted" / f"{pol}_sumw2.csv", index_col=0)
+        assert sumw.shape == sumw2.shape == weighted[pol].shape
+        assert (sumw2.values <= sumw.values * sumw.values + 1e-6).all()
+
+
+def test_unselected_from_the_efficiency(data_source, config_dict):
+    """For DataFrame inputs, only the events that failed the triggers."""
+    config_dict["higgstables"]["df"] = {
+        "simple_event_vector": None,
+        "z_variables": ["m_z", "m_recoil"],
+    }
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eLpR" / "Pqqh" / "simple_event_vector.root"
+    df = InMemoryDfs({"eLpR": [rootfile]}, config).dfs()["eLpR"]
+    n_selected = len(df)
+    from_rootfile = FileToCounts(rootfile, config).row_cells["unselected"]
+    from_df = FileToCounts(df.copy(), config).row_cells["unselected"]
+    assert from_df == pytest.approx(from_rootfile)
+
+    df["efficiency"] = 0.25
+    from_df = FileToCounts(df, config).row_cells["unselected"]
+    assert from_df == pytest.approx(3 * n_selected)
+
+
+@pytest.mark.parametrize("step_size", [None, 50, "4 kB"])
+def test_tables_from_parquet(data_source, config_dict, tmp_path, step_size):
+    """Re-tabling the selected events gives the same counts as the rootfiles."""
+    config_dict["higgstables"]["format"] = "parquet"
+    config_dict["higgstables"]["df"] = {
+        "simple_event_vector": None,
+        "z_variables": ["m_z", "m_recoil"],
+    }
+    (tmp_path / "df").mkdir()
+    DfFromFiles(data_source, tmp_path / "df", Config(config_dict, no_cs=True))
+    config_dict["higgstables"]["format"] = "csv"
+    config_dict["higgstables"]["step-size"] = step_size
+    (tmp_path / "tables").mkdir()
+    TablesFromFiles(data_source, tmp_path / "tables", Config(config_dict, True))
+    from_rootfiles = read_tables(tmp_path / "tables")
+
+    for pol in polarizations:
+        (tmp_path / pol).mkdir()
+        parquet_file = tmp_path / "df" / f"{pol}.parquet"
+        TablesFromFiles(parquet_file, tmp_path / pol, Config(config_dict, True))
+        from_parquet = pd.read_csv(tmp_path / pol / "df.csv", index_col=0)
+        # From the efficiency, `unselected` is a (float) estimate.
+        pd.testing.assert_frame_equal(
+            from_rootfiles[pol],
+            from_parquet,
+            check_dtype=False,
+            check_exact=False,
+            check_names=False,
+        )
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_partitioned_df_output(data_source, config_dict, tmp_path, n_jobs):
+    config_dict["higgstables"]["format"] = "parquet"
+    (tmp_path / "in_memory").mkdir()
+    DfFromFiles(data_source, tmp_path / "in_memory", Config(config_dict, True))
+    config_dict["higgstables"]["df"]["partitioned"] = True
+    config_dict["higgstables"]["df"]["row-group-size"] = 100
+    (tmp_path / "partitioned").mkdir()
+    DfFromFiles(
+        data_source, tmp_path / "partitioned", Config(config_dict, True), n_jobs=n_jobs
+    )
+    for pol in polarizations:
+        in_memory = pd.read_parquet(tmp_path / "in_memory" / f"{pol}.parquet")
+        dataset = tmp_path / "partitioned" / f"{pol}.parquet"
+        partitioned = pd.read_parquet(dataset)
+        partitioned["process"] = partitioned["process"].astype(str)
+        partitioned = partitioned[in_memory.columns]
+        pd.testing.assert_frame_equal(
+            in_memory.reset_index(drop=True), partitioned.reset_index(drop=True)
+        )
+        for part in dataset.glob("process=*/*.parquet"):
+            row_groups = pq.ParquetFile(part).metadata.num_row_groups
+            assert row_groups == -(-pq.ParquetFile(part).metadata.num_rows // 100)
+
+
+def test_partitioned_writer_flushes_before_close(tmp_path):
+    """Rows of finished processes, or beyond the buffer cap, are on disk early."""
+    writer = PartitionedParquetWriter(tmp_path / "sequential", row_group_size=1024**2)
+    for i in range(50):
+        writer.write(pd.DataFrame({"process": f"P{i}", "x": np.arange(20000.0)}))
+        assert writer.n_rows == i * 20000
+        assert sum(writer._n_buffered.values()) == 20000
+    writer.close()
+    assert writer.n_rows == 50 * 20000
+
+    writer = PartitionedParquetWriter(
+        tmp_path / "interleaved", row_group_size=1000, max_buffered_rows=2000
+    )
+    processes = [f"P{i % 50}" for i in range(5000)]
+    for _ in range(3):
+        writer.write(pd.DataFrame({"process": processes, "x": np.arange(5000.0)}))
+        assert sum(writer._n_buffered.values()) <= 2000
+    writer.close()
+    assert writer.n_rows == 3 * 5000
+    dataset = pd.read_parquet(tmp_path / "interleaved")
+    assert (dataset.groupby("process", observed=True).size() == 300).all()
+
+
+def test_partitioned_df_needs_parquet_format(config_dict):
+    config_dict["higgstables"]["df"]["partitioned"] = True
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
+
+
+def test_df_n_max_stops_early(data_source, config_dict, monkeypatch):
+    monkeypatch.setattr(FileToDf, "_first_window", 64)
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eLpR" / "P4f_zz_sl" / "simple_event_vector.root"
+    full = FileToDf(rootfile, config)
+    first = FileToDf(rootfile, config, n_max=50)
+    assert 0 < first._evaluated_fraction < 1
+    pd.testing.assert_frame_equal(
+        first.as_df().drop(columns="efficiency"),
+        full.as_df().drop(columns="efficiency").iloc[:50],
+    )
+    assert first.efficiency() == pytest.approx(full.efficiency(), rel=0.5)
+    # All selected entries are needed: The whole file is evaluated.
+    everything = FileToDf(rootfile, config, n_max=len(full.as_df()))
+    assert everything._evaluated_fraction == 1
+    assert everything.efficiency() == pytest.approx(full.efficiency())
+    pd.testing.assert_frame_equal(everything.as_df(), full.as_df())
+
+
+def test_df_random_subsample(data_source, config_dict):
+    config_dict["higgstables"]["df"]["sample-seed"] = 7
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eRpL" / "Pqqh" / "simple_event_vector.root"
+    full = FileToDf(rootfile, config).as_df()
+    sample = FileToDf(rootfile, config, n_max=30).as_df()
+    assert len(sample) == 30
+    pd.testing.assert_frame_equal(sample, FileToDf(rootfile, config, n_max=30).as_df())
+    assert not sample.index.equals(full.index[:30])
+    assert sample.index.isin(full.index).all()
+    assert (sample.efficiency == full.efficiency.iloc[0]).all()
+
+
+@pytest.mark.parametrize("max_memory", [None, "1 kB", "10 kB"])
+def test_memory_budget_keeps_counts(data_source, config_dict, max_memory):
+    config_dict["higgstables"]["weight"] = "weight"
+    rootfile = data_source / "eLpR" / "P4f_zz_sl" / "simple_event_vector.root"
+    unbounded = FileToCounts(rootfile, Config(config_dict, no_cs=True))
+    config_dict["higgstables"]["max-memory"] = max_memory
+    bounded = FileToCounts(rootfile, Config(config_dict, no_cs=True))
+    assert bounded.as_series().equals(unbounded.as_series())
+    assert bounded.sumw == unbounded.sumw
+    arrays = bounded._arrays
+    if max_memory is None:
+        assert arrays.n_evicted == arrays.n_reread == 0
+    elif max_memory == "1 kB":
+        # Each of the arrays (1700 entries) alone exceeds the budget.
+        assert arrays.n_evicted > 0 and arrays.n_reread > 0
+    assert arrays.peak_bytes <= unbounded._arrays.peak_bytes
+
+
+def test_branches_released_after_last_clause(data_source, config_dict):
+    config = Config(config_dict, no_cs=True)
+    rootfile = data_source / "eRpR" / "Pqqh" / "simple_event_vector.root"
+    file_to_counts = FileToCounts(rootfile, config, entry_range=(0, 100))
+    file_to_counts.select(0, 200)
+    # Only the branches of the categories are left.
+    category_branches = {
+        (selection.out_of_tree_variables.get(var, selection.tree), var)
+        for _, selection in config.categories_wrapped_as_triggers()
+        for var in selection.variables
+    }
+    assert set(file_to_counts._arrays._arrays) == category_branches
+    file_to_counts.category_index()
+    assert not file_to_counts._arrays._arrays
+
+
+@pytest.mark.parametrize("max_memory", [0, -5, "lots", True])
+def test_invalid_max_memory(config_dict, max_memory):
+    config_dict["higgstables"]["max-memory"] = max_memory
+    with pytest.raises(InvalidConfigurationError):
+        Config(config_dict, no_cs=True)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_profile_report(data_source, config_dict, tmp_path, n_jobs):
+    with ProfileReport() as report:
+        TablesFromFiles(data_source, tmp_path, Config(config_dict, True), n_jobs=n_jobs)
+    n_entries = 0
+    for rootfile in data_source.glob("*/*/simple_event_vector.root"):
+        with uproot.open(rootfile) as f:
+            n_entries += f["simple_event_vector"].num_entries
+    assert len(report.files) == 16
+    assert {p.table for p in report.files} == set(polarizations)
+    assert [p.name for p in report.tables] == polarizations
+    totals = report.totals()
+    assert totals["n_events"] == n_entries
+    assert 0 < totals["compressed_bytes"] < totals["uncompressed_bytes"]
+    for name in ["read", "trigger", "categories", "aggregation", "save"]:
+        assert totals["seconds"][name] > 0
+    assert set(totals["seconds"]) == set(stage_names)
+
+    report.write(tmp_path)
+    profile_csv = pd.read_csv(tmp_path / ProfileReport.csv_name)
+    assert len(profile_csv) == 16 + len(polarizations)
+    assert (profile_csv.drop(columns=["name", "kind", "table"]) >= 0).all().all()
+
+
+@pytest.mark.parametrize("step_size", [None, 300])
+def test_prefetch_matches_sequential(
+    data_source, config_dict, tmp_path, monkeypatch, step_size
+):
+    config_dict["higgstables"]["step-size"] = step_size
+    config = Config(config_dict, no_cs=True)
+    (tmp_path / "sequential").mkdir()
+    with monkeypatch.context() as m:
+        m.setattr(TablesFromFiles, "_prefetch_plan", lambda self: None)
+        TablesFromFiles(data_source, tmp_path / "sequential", config)
+
+    taken = []
+    take_prefetched = pipeline.take_prefetched
+
+    def spy(rootfile_path):
+        arrays = take_prefetched(rootfile_path)
+        taken.append(arrays is not None)
+        return arrays
+
+    monkeypatch.setattr(pipeline, "take_prefetched", spy)
+    (tmp_path / "pipelined").mkdir()
+    TablesFromFiles(data_source, tmp_path / "pipelined", config)
+    # Within each table, all but the first file are read ahead.
+    assert sum(taken) == 16 - len(polarizations)
+    sequential = read_tables(tmp_path / "sequential")
+    pipelined = read_tables(tmp_path / "pipelined")
+    for pol in polarizations:
+        pd.testing.assert_frame_equal(sequential[pol], pipelined[pol])
+
+
+@pytest.mark.parametrize("step_size, n_jobs", [(None, 1), (300, 1), (None, 2)])
+def test_tables_and_df_match_separate_runs(
+    data_source, config_dict, tmp_path, step_size, n_jobs
+):
+    config_dict["higgstables"]["step-size"] = step_size
+    config_dict["higgstables"]["weight"] = {
+        "z_variables": "weight",
+        "simple_event_vector": "weight",
+    }
+    config_dict["higgstables"]["df"]["category-column"] = True
+    config = Config(config_dict, no_cs=True)
+    for name in ["tables", "df", "both"]:
+        (tmp_path / name).mkdir()
+    TablesFromFiles(data_source, tmp_path / "tables", config)
+    DfFromFiles(data_source, tmp_path / "df", config)
+    TablesAndDfFromFiles(data_source, tmp_path / "both", config, n_jobs=n_jobs)
+    for pol in polarizations:
+        for name in [pol, f"{pol}_sumw", f"{pol}_sumw2"]:
+            separate = pd.read_csv(tmp_path / "tables" / f"{name}.csv", index_col=0)
+            combined = pd.read_csv(tmp_path / "both" / f"{name}.csv", index_col=0)
+            pd.testing.assert_frame_equal(separate, combined)
+        separate = pd.read_csv(tmp_path / "df" / f"{pol}.csv", index_col=0)
+        combined = pd.read_csv(tmp_path / "both" / "df" / f"{pol}.csv", index_col=0)
+        pd.testing.assert_frame_equal(separate, combined)
+
+
+def test_count_tables_are_integer(data_source, config_dict, tmp_path):
+    """Also with the (float) histogram of a histogram trigger."""
+    config = Config(config_dict, no_cs=True)
+    assert any(trigger.type == "histogram" for trigger in config.triggers)
+    rootfile = data_source / "eLpL" / "P2f_z_h" / "simple_event_vector.root"
+    row_cells = FileToCounts(rootfile, config).row_cells
+    assert all(isinstance(n, (int, np.integer)) for n in row_cells.values())
+    TablesFromFiles(data_source, tmp_path, config)
+    for pol, table in read_tables(tmp_path).items():
+        assert (table.dtypes == np.int64).all(), pol
+        assert ".0" not in (tmp_path / f"{pol}.csv").read_text()
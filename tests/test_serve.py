@@ -0,0 +1,76 @@
+import stat
+import subprocess
+import sys
+import time
+
+import pandas as pd
+import pytest
+
+from higgstables.cli.serve import request
+from higgstables.config import Config, _default_yaml_path
+from higgstables.config.load_config import merge_config_dicts
+from higgstables.handle_root_files import InMemoryTables
+from higgstables.handle_root_files.warm_tables import WarmTables
+
+query_yaml = """\
+higgstables:
+  categories:
+    many_pfos: [n_pfos > 40]
+    rest: [n_pfos >= 0]
+"""
+overrides = {
+    "higgstables": {
+        "categories": {"many_pfos": ["n_pfos > 40"], "rest": ["n_pfos >= 0"]}
+    }
+}
+
+
+@pytest.mark.parametrize("max_memory", [None, 1])
+def test_warm_tables_match_cold_runs(data_source, config_dict, max_memory):
+    config_dict["higgstables"]["weight"] = "weight"
+    warm_tables = WarmTables(data_source, Config(config_dict, True), max_memory)
+    base = warm_tables.tables()
+    n_bytes = warm_tables.n_bytes
+    other = Config(merge_config_dicts(config_dict, overrides), True)
+    for config, tables in [(other, warm_tables.tables(other)), (None, base)]:
+        expected = InMemoryTables(data_source, config or Config(config_dict, True))
+        for name, quantities in expected.tables().items():
+            for quantity, table in quantities.items():
+                pd.testing.assert_frame_equal(tables[name][quantity], table)
+    if max_memory is None:
+        assert warm_tables.n_bytes == n_bytes  # All branches were read at first.
+    else:
+        assert len(warm_tables._warm) == 1
+
+
+def test_serve_and_query(data_source, config_dict, tmp_path):
+    socket_path = tmp_path / "hs.sock"
+    code = (
+        "import sys; from higgstables.cli import cli_serve\n"
+        f"sys.argv = ['higgstables-serve', {str(data_source)!r}, '--no_cs', "
+        f"'--config', {str(_default_yaml_path)!r}, '--socket', {str(socket_path)!r}]\n"
+        "cli_serve()\n"
+    )
+    server = subprocess.Popen([sys.executable, "-c", code])
+    try:
+        for _ in range(600):
+            if socket_path.exists() or server.poll() is not None:
+                break
+            time.sleep(0.1)
+        assert stat.S_IMODE(socket_path.stat().st_mode) == 0o600
+        response = request(
+            socket_path, {"config": query_yaml, "tables": ["eLpR"], "format": "csv"}
+        )
+        assert response["ok"]
+        config = Config(merge_config_dicts(config_dict, overrides), no_cs=True)
+        expected = InMemoryTables(data_source, config).tables()["eLpR"]["count"]
+        assert response["tables"] == {"eLpR": {"count": expected.to_csv()}}
+
+        response = request(socket_path, {"config": "higgstables: {weight: no_branch}"})
+        assert not response["ok"]
+        assert request(socket_path, {"config": None})["ok"]
+        assert request(socket_path, {"command": "stop"}) == {"ok": True}
+        assert server.wait(timeout=60) == 0
+        assert not socket_path.exists()
+    finally:
+        server.kill()
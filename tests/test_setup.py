@@ -46,3 +46,40 @@ def test_module_level_docstring():
     import higgstables
 
     assert higgstables.__doc__, "This is used for the CLI as description."
+
+
+def test_lazy_imports():
+    """`higgstables --help` should not wait for the heavy dependencies.
+
+    The import time bound is generous: Each of pandas or uproot alone
+    takes longer.
+    """
+    import subprocess
+    import sys
+
+    heavy = ["awkward", "numexpr", "numpy", "pandas", "pyarrow", "tqdm", "uproot"]
+    code = (
+        "import sys, higgstables, higgstables.cli\n"
+        f"print(sorted(set({heavy!r}) & set(sys.modules)))\n"
+        "higgstables.Config\n"
+        "print('numpy' in sys.modules)\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    imported_at_start, numpy_after_access = result.stdout.split("\n")[:2]
+    assert imported_at_start == "[]"
+    assert numpy_after_access == "True"
+
+    # Lines `import time: <self> | <cumulative> | <module>`, in microseconds.
+    # The modules imported at top level are not indented.
+    import_us = 0
+    for line in result.stderr.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and fields[2].strip() in ("higgstables", "higgstables.cli"):
+            if not fields[2][1:].startswith(" "):
+                import_us += int(fields[1])
+    assert 0 < import_us < 300_000
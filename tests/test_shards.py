@@ -0,0 +1,61 @@
+import shutil
+
+import pandas as pd
+import pytest
+
+from higgstables.config import Config
+from higgstables.handle_root_files import (
+    ShardMergeError,
+    ShardTablesFromFiles,
+    TablesFromFiles,
+    TablesFromShards,
+)
+from higgstables.synthetic import polarizations
+
+
+def run_shards(data_source, tmp_path, config, n_shards):
+    shard_dirs = []
+    for i in range(n_shards):
+        shard_dir = tmp_path / f"shard{i}"
+        shard_dir.mkdir()
+        ShardTablesFromFiles(data_source, shard_dir, config, (i, n_shards))
+        shard_dirs.append(shard_dir)
+    return shard_dirs
+
+
+@pytest.mark.parametrize("n_shards", [1, 3, 50])
+def test_merged_shards_match_full_run(data_source, config_dict, tmp_path, n_shards):
+    config_dict["higgstables"]["weight"] = {
+        "z_variables": "weight",
+        "simple_event_vector": "weight",
+    }
+    config = Config(config_dict, no_cs=True)
+    (tmp_path / "full").mkdir()
+    TablesFromFiles(data_source, tmp_path / "full", config)
+    shard_dirs = run_shards(data_source, tmp_path, config, n_shards)
+    (tmp_path / "merged").mkdir()
+    TablesFromShards(shard_dirs, tmp_path / "merged", config)
+    for pol in polarizations:
+        for name in [pol, f"{pol}_sumw", f"{pol}_sumw2"]:
+            full = pd.read_csv(tmp_path / "full" / f"{name}.csv", index_col=0)
+            merged = pd.read_csv(tmp_path / "merged" / f"{name}.csv", index_col=0)
+            pd.testing.assert_frame_equal(full, merged)
+
+
+def test_merge_checks_coverage(data_source, config_dict, tmp_path):
+    config = Config(config_dict, no_cs=True)
+    shard0, shard1 = run_shards(data_source, tmp_path, config, 2)
+    (tmp_path / "out").mkdir()
+    with pytest.raises(ShardMergeError, match="Missing: \\[1\\]"):
+        TablesFromShards([shard0], tmp_path / "out", config)
+
+    partial0 = next(shard0.glob("*.json"))
+    partial1 = next(shard1.glob("*.json"))
+    shutil.copy(partial1, shard0)
+    with pytest.raises(ShardMergeError, match="more than once: \\[1\\]"):
+        TablesFromShards([shard0, shard1], tmp_path / "out", config)
+
+    config_dict["higgstables"]["categories"] = {"rest": ["n_pfos >= 0"]}
+    other_selection = Config(config_dict, no_cs=True)
+    with pytest.raises(ShardMergeError, match="another selection"):
+        TablesFromShards([partial0, partial1], tmp_path / "out", other_selection)
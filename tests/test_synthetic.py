@@ -0,0 +1,17 @@
+import pandas as pd
+
+from higgstables.config import Config
+from higgstables.handle_root_files import TablesFromFiles
+from higgstables.synthetic import polarizations, write_synthetic_production
+
+
+def test_synthetic_production_with_default_config(config_dict, tmp_path):
+    rootfiles = write_synthetic_production(tmp_path / "source", 300, n_processes=6)
+    assert len(rootfiles) == 6 * len(polarizations)
+    (tmp_path / "tables").mkdir()
+    TablesFromFiles(tmp_path / "source", tmp_path / "tables", Config(config_dict, True))
+    for pol in polarizations:
+        table = pd.read_csv(tmp_path / "tables" / f"{pol}.csv", index_col=0)
+        assert len(table) == 6
+        n_categorized = table.drop(columns="unselected").sum(axis=1)
+        assert ((0 < n_categorized) & (n_categorized <= 300)).all()